@@ -38,7 +38,9 @@ module mem_command_port(
     
     // output reg out_fsm_enc_type,
     // output reg [1:0] fsm_opcode,
-    output reg [23:0] out_address
+    output reg [23:0] out_address,
+    output reg [7:0] out_burst_len, // burst read: blocks - 1, beat after the address
+    output reg [3:0] out_sclk_divider // mem_spi_controller SCLK divider, set by a config write
 );
 
     localparam MEM_ID = 2'b00;
@@ -48,12 +50,30 @@ module mem_command_port(
     localparam WR_RES = 2'b10;
     localparam OTHER = 2'b11;
 
+    localparam SCLK_DIVIDER = 4'd3; // reset SCLK divider, SCLK = clk / (2 * divider)
+    localparam SCLK_DIVIDER_MIN = 4'd2; // shifting needs a clk between SCLK edges
+
+    localparam AES_ID = 2'b10;
+
+    // read cache (test/read_cache.py, runner.py --read-cache / make RC=yes):
+    //   READ_CACHE  two 32B lines of RD_KEY data, tagged with the read address. A RD_KEY at
+    //               a valid tag is served from the line without the FSM, a miss fills the
+    //               least recently used line while its bytes pass to the bus. A WR_RES
+    //               invalidates every line it overlaps.
+    `ifdef READ_CACHE
+        localparam rc_en = 1'b1;
+    `else
+        localparam rc_en = 1'b0;
+    `endif
+    localparam [7:0] LINE_BYTES = 8'd32;
+
     localparam IDLE = 4'h0;
     localparam PASS_CMD = 4'h1;
     localparam PASS_CMD_WAIT_READY = 4'h2;
     localparam PERFORM_TRANSFER = 4'h3;
     localparam TRY_ACK = 4'h4;
     localparam ACK_RECEIVED = 4'h5;
+    localparam SERVE_CACHE = 4'h6;
 
     reg [1:0] fsm_opcode = 0;
 
@@ -69,12 +89,40 @@ module mem_command_port(
     wire [1:0] dest_id = in_bus_data[5:4];
     wire [1:0] src_id = in_bus_data[3:2];
     wire [1:0] opcode;
+    // config write: OTHER from and to MEM, the 24 bit address field is the config word,
+    // [3:0] SCLK divider (values below SCLK_DIVIDER_MIN are ignored). No FSM work, no ack
+    wire config_hdr = (dest_id == MEM_ID) && (src_id == MEM_ID);
+    // burst read (header bit 6 on RD_KEY / RD_TEXT): one more header beat with the length
+    wire burst = internal_opcode[6] && !internal_opcode[1];
+    wire [7:0] cmd_bits = burst ? 8'd32 : 8'd24;
+    // read cache lines {way, byte}, tags and valid bits
+    reg [7:0] line_data [0:63];
+    reg [23:0] line_tag [0:1];
+    reg [1:0] line_valid = 0;
+    reg lru = 0; // way filled by the next miss
+    reg way = 0; // way hit or being filled
+    reg cache_fill = 0; // RD_KEY miss: bytes from the fsm also go into line way
+    wire cacheable = rc_en && (fsm_opcode == RD_KEY) && !burst;
+    wire [1:0] hit = {line_valid[1] && line_tag[1] == out_address, line_valid[0] && line_tag[0] == out_address};
+    // WR_RES bytes against line [tag, tag + 32). The page program wraps inside its page, so
+    // the write covers [out_address, wr_end) and, past the page end, [wr_page, wr_wrap_end)
+    wire [8:0] wr_off_end = {1'b0, out_address[7:0]} + ((internal_opcode[5:4] == AES_ID) ? 9'd16 : 9'd32);
+    wire [24:0] wr_page = {1'b0, out_address[23:8], 8'd0};
+    wire [24:0] wr_end = wr_off_end[8] ? wr_page + 25'd256 : wr_page + {16'd0, wr_off_end};
+    wire [24:0] wr_wrap_end = wr_off_end[8] ? wr_page + {17'd0, wr_off_end[7:0]} : wr_page;
+    function line_written(input [23:0] tag, input [24:0] start, input [24:0] stop, input [24:0] wrap_stop);
+        line_written = (({1'b0, tag} < stop) && (start < {1'b0, tag} + {17'd0, LINE_BYTES}))
+            || (({1'b0, tag} < wrap_stop) && (wr_page < {1'b0, tag} + {17'd0, LINE_BYTES}));
+    endfunction
+    wire [1:0] wr_overlap = {
+        line_written(line_tag[1], {1'b0, out_address}, wr_end, wr_wrap_end),
+        line_written(line_tag[0], {1'b0, out_address}, wr_end, wr_wrap_end)};
     // mode
     wire wr = (state == PERFORM_TRANSFER) && (fsm_opcode[1]);
     wire rd = (state == PERFORM_TRANSFER) && ((!fsm_opcode[1]));
     assign opcode  = (state == IDLE && in_bus_valid) ? in_bus_data[1:0] : 2'b00 ;
     // combinational drive ready
-    assign out_bus_ready = (state == IDLE) || (state == PASS_CMD && counter < 23) || 
+    assign out_bus_ready = (state == IDLE) || (state == PASS_CMD && counter < cmd_bits - 1) || 
     (wr && (!out_fsm_valid || in_fsm_ready) && ( !fsm_done_latch ) );
 
     assign out_fsm_ready = rd && (!out_bus_valid || in_bus_ready);
@@ -87,6 +135,10 @@ module mem_command_port(
 
     wire fsm_fr_rd = rd && in_fsm_valid && out_fsm_ready;
     wire bus_fr_rd = rd && out_bus_valid && in_bus_ready;
+    // cache line writes, no reset needed behind the valid bits
+    always @(posedge clk) begin
+        if (cache_fill && fsm_fr_rd) line_data[{way, counter[4:0]}] <= in_fsm_data;
+    end
     always @(posedge clk or negedge rst_n) begin
         if(!rst_n) begin
             out_bus_data <= 0;
@@ -98,9 +150,17 @@ module mem_command_port(
             counter <= 0;
             state <= IDLE;
             out_address <= 0;
+            out_burst_len <= 0;
+            out_sclk_divider <= SCLK_DIVIDER;
             fsm_opcode<=0;
             // out_fsm_enc_type <= 0;
             internal_opcode <= 0;
+            line_valid <= 0;
+            line_tag[0] <= 0;
+            line_tag[1] <= 0;
+            lru <= 0;
+            way <= 0;
+            cache_fill <= 0;
         end else begin
             case(state)
                 IDLE: begin
@@ -109,7 +169,7 @@ module mem_command_port(
                     out_fsm_valid <= 0;
                     out_ack_bus_request <= 0;
                     internal_opcode <= 0;
-                    if(out_bus_ready &&  in_bus_valid && (opcode != OTHER)) begin
+                    if(out_bus_ready &&  in_bus_valid && (opcode != OTHER || config_hdr)) begin
                         case(opcode)
                             RD_KEY, RD_TEXT: begin
                                 if(dest_id == MEM_ID) state <= PASS_CMD;
@@ -117,6 +177,7 @@ module mem_command_port(
                             WR_RES: begin
                                 if(src_id == MEM_ID) state <= PASS_CMD;
                             end
+                            OTHER: state <= PASS_CMD; // config write
                         default: state <= IDLE;
                         endcase
                         fsm_opcode <= opcode;
@@ -127,13 +188,35 @@ module mem_command_port(
 
                 PASS_CMD: begin
                     if(in_bus_valid && out_bus_ready) begin
-                        out_address[counter + 7 -: 8] <= in_bus_data;
+                        if (counter < 24) out_address[counter + 7 -: 8] <= in_bus_data;
+                        else out_burst_len <= in_bus_data;
                         counter <= counter + 8;
                         out_fsm_data <= internal_opcode;
                     end
-                    if(counter >= 23) begin
-                        out_fsm_valid <= 1;
-                        state <= PASS_CMD_WAIT_READY;
+                    if(counter >= cmd_bits - 1) begin
+                        if (fsm_opcode == OTHER) begin
+                            // mem_spi_controller picks the divider up between frames
+                            if (out_address[3:0] >= SCLK_DIVIDER_MIN) out_sclk_divider <= out_address[3:0];
+                            state <= IDLE;
+                        end else if (cacheable && hit != 2'b00) begin
+                            // cache hit: the fsm is not involved
+                            way <= hit[1];
+                            lru <= !hit[1];
+                            counter <= 0;
+                            state <= SERVE_CACHE;
+                        end else begin
+                            if (cacheable) begin
+                                // miss: refill the least recently used line
+                                way <= lru;
+                                line_valid[lru] <= 1'b0;
+                                line_tag[lru] <= out_address;
+                                cache_fill <= 1'b1;
+                            end
+                            if (fsm_opcode == WR_RES) line_valid <= line_valid & ~wr_overlap;
+                            counter <= 0;
+                            out_fsm_valid <= 1;
+                            state <= PASS_CMD_WAIT_READY;
+                        end
                     end
                 end
                 PASS_CMD_WAIT_READY: begin
@@ -171,10 +254,16 @@ module mem_command_port(
                         if (fsm_fr_rd) begin
                             out_bus_valid <= 1;
                             out_bus_data <= in_fsm_data;
+                            counter <= counter + 1;
                         end
                         // proceed when there is no byte waiting on databus and no byte pending transfer from fsm
                         if (fsm_done_latch && out_bus_empty_next && !in_fsm_valid) begin
                             state <= TRY_ACK;
+                            if (cache_fill) begin
+                                line_valid[way] <= 1'b1;
+                                lru <= !way;
+                                cache_fill <= 1'b0;
+                            end
                         end
                     end
                 end
@@ -191,6 +280,17 @@ module mem_command_port(
                      state <= IDLE;                   
                 end
 
+                // read cache hit: line way to the bus, then the same ack as a read
+                SERVE_CACHE: begin
+                    if (out_bus_valid && in_bus_ready) out_bus_valid <= 0;
+                    if (out_bus_empty_next && counter < LINE_BYTES) begin
+                        out_bus_valid <= 1;
+                        out_bus_data <= line_data[{way, counter[4:0]}];
+                        counter <= counter + 1;
+                    end
+                    if (out_bus_empty_next && counter == LINE_BYTES) state <= TRY_ACK;
+                end
+
                 default:;
             endcase
         end
@@ -21,9 +21,10 @@ module mem_spi_controller (
     //---- Transaction FSM connections ----
     input wire in_start, //start the transaction
     input wire r_w, //1 is read, 0 is write
-    input wire quad_enable, //0 use di/do only, 1 use 4 pins for input/output, even in qspi mode sending opcdode and addr is still 1 pins
+    input wire quad_enable, //0 use di/do only, 1 use 4 pins for input/output, per byte: opcode always 1 pin, addr 1 pin (6Bh/32h) or 4 pins (EBh)
     output reg out_done, //tell the fsm we are done
     input wire qed, // 1 means qspi mode, 0 means standard spi
+    input wire [3:0] in_divider, // SCLK = clk / (2 * divider), >= 2, taken while CS is high
 
     //Send, MOSI side 
     // for write text commands
@@ -44,7 +45,7 @@ module mem_spi_controller (
     output reg [3:0] io_ena
 );
 
-    localparam DIVIDER = 3; //divider == 1 means half frequency, divider == 2 means quarter frequency 
+    localparam DIVIDER = 3; // reset divider, in_divider takes over between frames
     localparam T_SETUP_HOLD_CYC = 1; // setup/hold time cycle constant
 
     reg n_out_done = 1'b0;
@@ -58,9 +59,10 @@ module mem_spi_controller (
     reg [3:0] n_io_ena;
 
     reg [3:0] bit_count = 4'b0, n_bit_count = 4'b0;
-    reg [1:0] sclk_cnt = 2'b0,n_sclk_cnt = 2'b0;
+    reg [3:0] sclk_cnt = 4'b0,n_sclk_cnt = 4'b0;
+    reg [3:0] divider = DIVIDER; // latched in_divider, constant while CS is low
 
-    wire sclk_toggle = (sclk_cnt == DIVIDER -1); //pulse when sclk toggle
+    wire sclk_toggle = (sclk_cnt == divider - 4'd1); //pulse when sclk toggle
     wire sclk_fall = sclk_toggle && (out_sclk == 1'b1); // f edge detection
     wire sclk_rise = sclk_toggle && (out_sclk == 1'b0); // r edge detection
 
@@ -104,7 +106,8 @@ module mem_spi_controller (
             // internal state
             active       <= 1'b0;
             bit_count    <= 4'd0;
-            sclk_cnt     <= 2'd0;
+            sclk_cnt     <= 4'd0;
+            divider      <= DIVIDER;
 
             t_cnt        <= 2'd0;
             t_met        <= 1'b0;
@@ -134,6 +137,8 @@ module mem_spi_controller (
 
             bit_count    <= n_bit_count;
             sclk_cnt     <= n_sclk_cnt;
+            if (!active)
+                divider  <= in_divider;
 
             t_cnt        <= n_t_cnt;
             t_met        <= n_t_met;
@@ -215,7 +220,7 @@ module mem_spi_controller (
                 n_sclk_cnt  = 0;
                 n_bit_count = 0;
             end else begin
-                if (sclk_cnt == DIVIDER - 1) begin
+                if (sclk_toggle) begin
                     n_sclk_cnt = 0;
                     n_out_sclk = ~out_sclk;
 
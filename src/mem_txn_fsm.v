@@ -20,6 +20,7 @@ module mem_txn_fsm(
     // input wire out_fsm_enc_type,
     // input wire [1:0] out_fsm_opcode,
     input wire [23:0] out_address,
+    input wire [7:0] out_burst_len, // burst read: blocks - 1
 
     // QSPI
 
@@ -55,11 +56,38 @@ module mem_txn_fsm(
     localparam [7:0] OPC_GLOBAL_UNLOCK = 8'h98; 
     localparam [7:0] OPC_QE = 8'h31; // write sr2
     localparam [7:0] FLASH_RDSR2 = 8'h35; // read sr2
-    localparam [7:0] FLASH_READ = 8'h6B; //fast read quad output (needs 8 dummy)
+    localparam [7:0] FLASH_READ_QO = 8'h6B; //fast read quad output (needs 8 dummy)
+    localparam [7:0] FLASH_READ_QIO = 8'hEB; //fast read quad i/o (quad address + mode, 4 dummy)
+    localparam [7:0] XIP_MODE = 8'hA0; // 0xEB mode bits M5-4 = 10: next read skips the opcode
+    localparam [7:0] OPC_MODE_RESET = 8'hFF; // exits continuous read mode (M4 = 1 on IO0)
     localparam [7:0] FLASH_PP = 8'h32; //quad input page program (no dummy)
     localparam [7:0] FLASH_RDSR = 8'h05; //read sr1
     localparam [7:0] OPC_CHIP_ERASE = 8'h60; //chip erase
 
+    // read opcode (test/read_mode.py, runner.py --read / make READ=):
+    //   default        0x6B, opcode and address on IO0, 8 dummy clocks
+    //   READ_QUAD_IO   0xEB in continuous read mode: the first read after a write sends
+    //                  opcode + quad address + mode bits, following reads only address + mode.
+    //                  A write first leaves continuous read mode with OPC_MODE_RESET.
+    `ifdef READ_QUAD_IO
+        localparam [7:0] FLASH_READ = FLASH_READ_QIO;
+        localparam xip_en = 1'b1;
+    `else
+        localparam [7:0] FLASH_READ = FLASH_READ_QO;
+        localparam xip_en = 1'b0;
+    `endif
+
+    // write combining (test/write_combine.py, runner.py --write-combine / make WC=yes):
+    //   WRITE_COMBINE  a page program stays open (CS low, SCLK stopped) for wc_hold clocks
+    //                  after its last byte. A WR_RES that continues it (next address, same
+    //                  page) streams its data into the same program, anything else or the
+    //                  timeout raises CS first and the flash programs all of it at once.
+    `ifdef WRITE_COMBINE
+        localparam wc_en = 1'b1;
+    `else
+        localparam wc_en = 1'b0;
+    `endif
+
     // startup sequence
     localparam start = 6'd0, rst_ena = 6'd1, rst = 6'd2,
     global_unlock = 6'd3, chip_erase = 6'd4,
@@ -76,15 +104,22 @@ module mem_txn_fsm(
     wip_poll_send = 6'd26, wip_poll_rd = 6'd27, wip_poll_wait = 6'd28,
     wip_poll_send_wait_done = 6'd29, wip_poll_rd_wait_done = 6'd30, err = 6'd31;
 
+    // quad i/o read (READ_QUAD_IO)
+    localparam opcode_wait_done = 6'd32, send_mode = 6'd33, mode_reset = 6'd34;
+
+    // write combining (WRITE_COMBINE)
+    localparam pp_hold = 6'd35;
+
     //waiting time constant 
     // gap
     // localparam [26:0] power_on = 27'd2000000; // 4 times of minimum
     localparam [26:0] opcode_gap = 27'd5; //opcode gap 
+    localparam [26:0] wc_hold = 27'd64; // open page program waits this long for the next WR_RES
 
     // wip poll
     // localparam [26:0] page_program = 27'd40000; // page program max 3ms typ 0.4ms
     localparam [7:0] pp_max = 8'd8;
-    localparam [26:0] rst_t = 27'd100; //30us max poll per 10 us
+    // rst_t is per timing profile below, 30us max poll per 10 us
     localparam [7:0] rst_t_max = 8'd3;  
     // localparam [26:0] write_sr = 27'd1000000; // write sr typ 10ms max 15ms
     localparam [7:0] wrsr_max = 8'd2;  
@@ -93,17 +128,39 @@ module mem_txn_fsm(
     // localparam [26:0] chip_erase_t = 27'd20_000_000; // 200ms will be comment out later this is just for simulation
     localparam [7:0] cpe_max = 8'd150;    
 
-    `ifdef SIMULATION
+    // timing profiles (test/timing_profiles.py, runner.py --timing / make TIMING=):
+    //   TIMING_ZERO_LATENCY  no power on wait, polls back to back
+    //   TIMING_DATASHEET     synthesis values, for the datasheet-typ/-max flash timings, except
+    //                        rst_t: 3 polls x 1000 clocks cover tRST 30us, the synthesis 100 do not
+    //   SIMULATION           "fast" profile, short waits but every poll path taken
+    // chip erase (startup only, typ 40s) keeps the fast interval in every simulation profile
+    `ifdef TIMING_ZERO_LATENCY
+        localparam [26:0] power_on      = 27'd0;
+        localparam [26:0] page_program  = 27'd0;
+        localparam [26:0] write_sr      = 27'd0;
+        localparam [26:0] chip_erase_t  = 27'd0;
+        localparam [26:0] rst_t         = 27'd0;
+        initial $display("SIMULATION is ON in %m, zero-latency timing");
+    `elsif TIMING_DATASHEET
+        localparam [26:0] power_on      = 27'd2000000;
+        localparam [26:0] page_program  = 27'd40000;
+        localparam [26:0] write_sr      = 27'd1000000;
+        localparam [26:0] chip_erase_t  = 27'd2000;
+        localparam [26:0] rst_t         = 27'd1000;
+        initial $display("SIMULATION is ON in %m, datasheet timing");
+    `elsif SIMULATION
         localparam [26:0] power_on      = 27'd200;      // 2,000 cycles  (20 µs)
         localparam [26:0] page_program  = 27'd400;       // etc.
         localparam [26:0] write_sr      = 27'd1000;
         localparam [26:0] chip_erase_t  = 27'd2000;
+        localparam [26:0] rst_t         = 27'd100;
         initial $display("SIMULATION is ON in %m");
     `else
         localparam [26:0] power_on      = 27'd2000000;   // real values
         localparam [26:0] page_program  = 27'd40000;
         localparam [26:0] write_sr      = 27'd1000000;
         localparam [26:0] chip_erase_t  = 27'd20000000;
+        localparam [26:0] rst_t         = 27'd100;
         // localparam [26:0] power_on      = 27'd20000;      // 2,000 cycles  (20 µs)
         // localparam [26:0] page_program  = 27'd4000;       // etc.
         // localparam [26:0] write_sr      = 27'd100000;
@@ -111,7 +168,6 @@ module mem_txn_fsm(
         initial $display("SIMULATION is OFF in %m");
     `endif
 
-    
     // wip poll type
     localparam [2:0] none = 3'd0;  // no polling operation 
     localparam [2:0] pp = 3'd1;   // page program
@@ -139,7 +195,7 @@ module mem_txn_fsm(
     // counter
     reg [26:0] counter = 27'd0, n_counter = 27'd0;
     reg [7:0] timeout_counts = 8'd0, n_timeout_counts = 8'd0;
-    reg [5:0] total_bytes_left = 6'd0, n_total_bytes_left = 6'd0; // count down to 0 
+    reg [8:0] total_bytes_left = 9'd0, n_total_bytes_left = 9'd0; // count down to 0 
 
     // cmd latched
     reg [7:0] opcode_q = 8'd0, n_opcode_q = 8'd0;
@@ -151,17 +207,36 @@ module mem_txn_fsm(
     reg n_out_spi_valid = 1'd0,n_out_cu_valid = 1'd0;
     // keep track type of poll
     reg [2:0] wip_poll_type = 3'd0, n_wip_poll_type = 3'd0;
+    // flash is in continuous read mode (last read sent XIP_MODE)
+    reg xip = 1'b0, n_xip = 1'b0;
+    // address, mode and dummy of the current command go on 4 lanes
+    wire quad_addr = (opcode_q == FLASH_READ_QIO);
+    // page offset after the last byte of the page program, 256 when the page is full
+    reg [8:0] pp_end = 9'd0, n_pp_end = 9'd0;
+    wire wc_merge; // WR_RES header continues the open page program
     
     reg n_err_flag = 1'b0, n_qed = 1'b0;
 
     // to be changed for back pressure
     // cu to fsm only high when idle or send data when spi is ready or the buffer is empty
-    assign out_cu_ready  = (state == idle) || (state == send_data && ((!out_spi_valid) || in_spi_ready) && total_bytes_left != 0);
+    assign out_cu_ready  = (state == idle) || (state == send_data && ((!out_spi_valid) || in_spi_ready) && total_bytes_left != 0)
+    || (state == pp_hold && wc_merge);
     // spi to fsm only high when receiving data of single handshake state during start up or
     // receive data sates when cu is ready or buffer to cu is empty
     assign out_spi_ready = (state == rd_sr2_rd) || (state == wip_poll_rd) || (state == dummy)
     || (state == receive_data && (!out_cu_valid || in_cu_ready));
      
+    // read length: one 16B / 32B block, or with header bit 6 (burst) out_burst_len + 1
+    // consecutive blocks under one CS, capped at a page
+    localparam [8:0] page_bytes = 9'd256;
+    wire [8:0] rd_block = (in_cu_data[1:0] == RD_TEXT && in_cu_data[3:2] == aes_id) ? 9'd16 : 9'd32;
+    wire [17:0] rd_burst = {9'd0, rd_block} * ({10'd0, out_burst_len} + 18'd1);
+    wire [8:0] rd_bytes = !in_cu_data[6] ? rd_block : (rd_burst > {9'd0, page_bytes}) ? page_bytes : rd_burst[8:0];
+    // write length, and whether a WR_RES continues the open page program within its page
+    wire [8:0] wr_bytes = (in_cu_data[5:4] == aes_id) ? 9'd16 : 9'd32;
+    assign wc_merge = (in_cu_data[1:0] == WR_RES) && (out_address[23:8] == addr_q[23:8])
+        && ({1'b0, out_address[7:0]} == pp_end) && (pp_end + wr_bytes <= page_bytes);
+
     wire cu_empty_next; // output to cu will be empty after this cycle in read flow
     assign cu_empty_next = !out_cu_valid || (out_cu_valid && in_cu_ready);
     always @(posedge clk or negedge rst_n) begin
@@ -186,6 +261,8 @@ module mem_txn_fsm(
             opcode_q <= 0;
             addr_q <= 0;
             wip_poll_type <= 0;
+            xip <= 0;
+            pp_end <= 0;
             // only for testing
             err_flag <= 0;
             // quad enabled signal
@@ -208,6 +285,8 @@ module mem_txn_fsm(
             total_bytes_left <= n_total_bytes_left;
 
             wip_poll_type <= n_wip_poll_type; 
+            xip <= n_xip;
+            pp_end <= n_pp_end;
             data <= n_data;
 
             // opcode/data latch
@@ -231,6 +310,8 @@ module mem_txn_fsm(
         n_opaddr_return_state = opaddr_return_state;
         // 
         n_wip_poll_type  = wip_poll_type;
+        n_xip = xip;
+        n_pp_end = pp_end;
         // counter
         n_counter = counter;
         n_timeout_counts = timeout_counts;
@@ -391,16 +472,25 @@ module mem_txn_fsm(
                 end
 
                 // handshake -> consume this byte
+                // quad address: the opcode has to be out before the lanes switch
                 if (out_spi_valid && in_spi_ready) begin
                     n_out_spi_valid = 1'b0;
-                    next_state = send_a1;
+                    next_state = quad_addr ? opcode_wait_done : send_a1;
                 end             
             end
+            // wait send opcode done (quad address only)
+            opcode_wait_done: begin
+                in_start = 1'b1;
+                r_w = 1'b0;
+                quad_enable = 1'b0;
+                n_out_spi_valid = 1'b0;
+                next_state = in_spi_done ? send_a1 : opcode_wait_done;
+            end
             // send addr 23:16
             send_a1: begin
                 in_start = 1'b1;
                 r_w = 1'b0;
-                quad_enable = 1'b0;
+                quad_enable = quad_addr;
                 // launch byte if not currently valid
                 if (!out_spi_valid) begin
                     n_out_spi_data  = addr_q[23:16];
@@ -417,7 +507,7 @@ module mem_txn_fsm(
             send_a2: begin
                 in_start  = 1'b1;
                 r_w = 1'b0;
-                quad_enable = 1'b0;
+                quad_enable = quad_addr;
                 // launch byte if not currently valid
                 if (!out_spi_valid) begin
                     n_out_spi_data  = addr_q[15:8];
@@ -434,7 +524,7 @@ module mem_txn_fsm(
             send_a3: begin
                 in_start = 1'b1;
                 r_w = 1'b0;
-                quad_enable = 1'b0;
+                quad_enable = quad_addr;
                 // launch byte if not currently valid
                 if (!out_spi_valid) begin
                     n_out_spi_data  = addr_q[7:0];
@@ -444,16 +534,46 @@ module mem_txn_fsm(
                 // handshake -> consume this byte
                 if (out_spi_valid && in_spi_ready) begin
                     n_out_spi_valid = 1'b0;
-                    next_state = addr_wait_done;
+                    next_state = quad_addr ? send_mode : addr_wait_done;
                 end 
             end
-            // wait send addr 7:0 done
+            // send mode bits after a quad address, stay in continuous read mode
+            send_mode: begin
+                in_start = 1'b1;
+                r_w = 1'b0;
+                quad_enable = 1'b1;
+                if (!out_spi_valid) begin
+                    n_out_spi_data  = XIP_MODE;
+                    n_out_spi_valid = 1'b1;
+                end
+
+                if (out_spi_valid && in_spi_ready) begin
+                    n_out_spi_valid = 1'b0;
+                    n_xip = 1'b1;
+                    next_state = addr_wait_done;
+                end
+            end
+            // wait send addr 7:0 (or mode) done
             addr_wait_done: begin
                 in_start = 1'b1;
                 r_w = 1'b0;
-                quad_enable = 1'b0;     
+                quad_enable = quad_addr;     
                 n_out_spi_valid = 1'b0;
                 next_state = in_spi_done ? opaddr_return_state : addr_wait_done;                       
+                // dummy bytes - 1: one single lane byte (0x6B), two quad bytes (0xEB)
+                n_counter = quad_addr ? 1 : 0;
+            end
+            // leave continuous read mode: 0xFF on IO0, the flash sees M4 = 1
+            mode_reset: begin
+                in_start = 1'b1;
+                r_w = 1'b0;
+                quad_enable = 1'b0;
+                n_out_spi_data = OPC_MODE_RESET;
+                n_out_spi_valid = 1;
+                next_state = in_spi_ready ? spi_wait : mode_reset;
+                // before a write: poll + wren as usual, at startup: on to wren
+                n_gap_return_state = xip ? wip_poll_send : wren;
+                n_xip = 1'b0;
             end
             // start up flow
             // power on
@@ -463,7 +583,8 @@ module mem_txn_fsm(
                 r_w         = 1'b0;
                 quad_enable = 1'b0;
                 next_state = gap;
-                n_gap_return_state = wren;
+                // the flash may still be in continuous read mode from before the reset
+                n_gap_return_state = xip_en ? mode_reset : wren;
                 n_wren_return_state = rst_ena; // must send wren before send reset ena
                 n_counter = power_on;
             end 
@@ -603,29 +724,34 @@ module mem_txn_fsm(
                 if(in_cu_valid && out_cu_ready) begin
                     case (in_cu_data[1:0])
                         RD_KEY: begin
-                            n_total_bytes_left = 32;
+                            n_total_bytes_left = rd_bytes;
                             n_opcode_q = FLASH_READ;
                             n_addr_q = out_address;
-                            next_state = wip_poll_send; // ppll wip until not busy 
+                            // continuous read mode: no write since the last read, no poll
+                            // and no opcode
+                            next_state = xip ? send_a1 : wip_poll_send; // ppll wip until not busy 
                             n_wip_poll_type = pp; // page programm 
                             n_wip_return_state = send_opcode;
                             n_opaddr_return_state = dummy;
                         end 
 
                         RD_TEXT:begin
-                            n_total_bytes_left = (in_cu_data[3:2] == aes_id) ? 16 : 32; // aes rd txt 16B sha rd txt 32B
+                            n_total_bytes_left = rd_bytes; // aes rd txt 16B sha rd txt 32B, times burst blocks
                             n_opcode_q = FLASH_READ;
                             n_addr_q = out_address;
-                            next_state = wip_poll_send; // ppll wip until not busy 
+                            // continuous read mode: no write since the last read, no poll
+                            // and no opcode
+                            next_state = xip ? send_a1 : wip_poll_send; // ppll wip until not busy 
                             n_wip_poll_type = pp; // page programm 
                             n_wip_return_state = send_opcode;
                             n_opaddr_return_state = dummy;                            
                         end
                         WR_RES: begin
-                            n_total_bytes_left = (in_cu_data[5:4] == aes_id) ? 16 : 32; // aes wr txt 16B sha wr txt 32B
+                            n_total_bytes_left = wr_bytes; // aes wr txt 16B sha wr txt 32B
                             n_opcode_q = FLASH_PP;
                             n_addr_q = out_address;
-                            next_state = wip_poll_send; // ppll wip until not busy 
+                            n_pp_end = {1'b0, out_address[7:0]};
+                            next_state = xip ? mode_reset : wip_poll_send; // ppll wip until not busy 
                             n_wip_poll_type = pp; // page programm 
                             n_wip_return_state = wren; // send wren before writing
                             n_wren_return_state = send_opcode;
@@ -639,9 +765,12 @@ module mem_txn_fsm(
             // dummy set spi to read mode but dont give shit to data, only for quad output read
             dummy: begin
                 in_start = 1'b1;
-                r_w = 1'b1; //dummy dont care 1 byte for quad output read
-                quad_enable = 1'b0;
-                next_state = (in_spi_valid && out_spi_ready) ? receive_data : dummy;
+                r_w = 1'b1; //dummy dont care 1 byte for quad output read, 2 quad bytes for quad i/o
+                quad_enable = quad_addr;
+                if (in_spi_valid && out_spi_ready) begin
+                    n_counter = (counter == 0) ? 0 : counter - 1;
+                    next_state = (counter == 0) ? receive_data : dummy;
+                end
             end
             // receive data from spi: handshake to both cu and spi
             receive_data:begin
@@ -693,6 +822,7 @@ module mem_txn_fsm(
                     n_out_spi_data = in_cu_data;
                     n_out_spi_valid = 1'b1;
                     n_total_bytes_left = total_bytes_left - 1;
+                    n_pp_end = pp_end + 1;
                 end
             end
             // wait done signal during write after last byte sent 
@@ -700,11 +830,29 @@ module mem_txn_fsm(
                 in_start = 1'b1;
                 r_w = 1'b0; // write
                 quad_enable = 1'b1;   // quad output
-                next_state = in_spi_done ? gap : wait_done;
-                n_counter = in_spi_done ? opcode_gap : counter;
+                // write combining: keep CS low for a following WR_RES in the same page
+                next_state = in_spi_done ? (wc_en ? pp_hold : gap) : wait_done;
+                n_counter = in_spi_done ? (wc_en ? wc_hold : opcode_gap) : counter;
                 n_gap_return_state = idle;
 
             end
+            // open page program: CS low, SCLK stopped until the next WR_RES continues it
+            pp_hold: begin
+                in_start = 1'b1;
+                r_w = 1'b0; // write
+                quad_enable = 1'b1;   // quad output
+                if (in_cu_valid && wc_merge) begin
+                    // header taken (out_cu_ready), data goes on in the same frame
+                    n_total_bytes_left = wr_bytes;
+                    next_state = send_data;
+                end else if (in_cu_valid || counter == 0) begin
+                    // anything else or timeout: CS high, the flash programs the page
+                    next_state = gap;
+                    n_counter = opcode_gap;
+                end else begin
+                    n_counter = counter - 1;
+                end
+            end
             default: ;
         endcase
     end
@@ -26,12 +26,28 @@ module mem_vendor_test (
     inout wire IO3,
     output wire [3:0] uio_oe,
 
+    // flash model pins: driven by the cocotb flash model (test/flash_model.py),
+    // unused when the vendor verilog model is compiled in
+    input wire [3:0] flash_io,
+
     // test only
     output wire err
 );
-    // waveform dump
+`ifdef TRACE
+    // waveform dump, trace builds only (make TRACE=fst|vcd, runner.py --trace).
+    // Nothing is written before test/trace_control.py raises trace_en; under verilator
+    // the dumped scope is set at build time (TRACE_SCOPE control file).
+    reg trace_en = 1'b0;
+
     initial begin
+    `ifdef TRACE_FST
+        $dumpfile("mem_vendor_test.fst");
+    `else
         $dumpfile("mem_vendor_test.vcd");
+    `endif
+    end
+
+    always @(posedge trace_en) begin
         $dumpvars(1, mem_vendor_test.clk);
         $dumpvars(1, mem_vendor_test.SCLK);
         $dumpvars(1, mem_vendor_test.CS);
@@ -81,12 +97,19 @@ module mem_vendor_test (
         $dumpvars(1, mem_vendor_test.top.spi_fsm_done);
         $dumpvars(1, mem_vendor_test.top.fsm_spi_in_start);
 
+    `ifdef VENDOR_FLASH_MODEL
         $dumpvars(1, mem_vendor_test.flash.status_reg);
         $dumpvars(1, mem_vendor_test.flash.in_byte);
         $dumpvars(1, mem_vendor_test.flash.out_byte);
+    `else
+        $dumpvars(1, mem_vendor_test.flash_io);
+        $dumpvars(1, mem_vendor_test.status_echo);
+        $dumpvars(1, mem_vendor_test.echo_do);
+    `endif
         // $dumpvars(1, mem_vendor_test.top.);
         // $dumpvars(1, mem_vendor_test.top.);
     end
+`endif
 
     wire [3:0] dut_io_out;
     wire [3:0] dut_io_oe;   // assume 1=drive, 0=Z (invert below if opposite)
@@ -94,6 +117,7 @@ module mem_vendor_test (
 
     assign uio_oe = dut_io_oe;
 
+`ifdef VENDOR_FLASH_MODEL
     // Build the bidirectional “physical wires” seen by the flash model
     // Bit order: [0]=IO0, [1]=IO1, [2]=IO2, [3]=IO3
     assign IO0 = dut_io_oe[0] ? dut_io_out[0] : 1'bz;
@@ -117,6 +141,57 @@ module mem_vendor_test (
     .WPn   (IO2),   // IO2 / WP# (active low)
     .HOLDn (IO3)    // IO3 / HOLD# (active low)
     );
+`else
+    // cocotb flash model: each pin carries the dut value when the dut drives it,
+    // otherwise whatever the model puts on flash_io (model idles at 4'b1100,
+    // i.e. IO2/IO3 pulled up)
+    //
+    // Busy fast path of the model: while it holds status_echo high (WIP set) the status
+    // reads (05h/35h/15h) are answered here from status_regs = {SR3, SR2, SR1}, and
+    // echo_opcode tells it at CS rise what the frame was. A WIP poll loop then costs
+    // python two CS edges per poll instead of a trigger per SCLK edge.
+    reg        status_echo = 1'b0;
+    reg [23:0] status_regs = 24'h0;
+    reg [7:0]  echo_opcode = 8'h00;
+    reg [3:0]  echo_clocks = 4'd0;
+    reg [2:0]  echo_bit = 3'd7;
+    reg        echo_do = 1'b0;
+
+    // opcode in on SCLK rise, status out on SCLK fall, same edges as the model
+    always @(posedge SCLK or posedge CS) begin
+        if (CS) begin
+            echo_clocks <= 4'd0;
+        end else if (echo_clocks != 4'd8) begin
+            echo_opcode <= {echo_opcode[6:0], IO0};
+            echo_clocks <= echo_clocks + 4'd1;
+        end
+    end
+
+    wire [7:0] echo_sr = (echo_opcode == 8'h35) ? status_regs[15:8] :
+                         (echo_opcode == 8'h15) ? status_regs[23:16] : status_regs[7:0];
+    wire echo_status_read = (echo_opcode == 8'h05) || (echo_opcode == 8'h35) ||
+                            (echo_opcode == 8'h15);
+
+    always @(negedge SCLK or posedge CS) begin
+        if (CS) begin
+            echo_bit <= 3'd7;
+            echo_do <= 1'b0;
+        end else if (echo_clocks == 4'd8) begin
+            echo_do <= status_echo & echo_status_read & echo_sr[echo_bit];
+            echo_bit <= echo_bit - 3'd1;
+        end
+    end
+
+    wire [3:0] flash_out = flash_io | {2'b00, echo_do, 1'b0};
+    wire [3:0] io_bus = (dut_io_oe & dut_io_out) | (~dut_io_oe & flash_out);
+
+    assign IO0 = io_bus[0];
+    assign IO1 = io_bus[1];
+    assign IO2 = io_bus[2];
+    assign IO3 = io_bus[3];
+
+    assign dut_io_in = io_bus;
+`endif
 
     mem_top top (
         .clk   (clk),
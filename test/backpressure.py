@@ -0,0 +1,144 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Ready/valid stall patterns for the testbench drivers.
+#
+# A throttle is called once per clock and returns 1 (drive VALID / READY) or 0 (stall this
+# cycle), the same contract as the throttle argument of HostBusDriver.send() and
+# HostBusReceiver.recv(). Every throttle has its own random.Random, seeded from the global
+# one unless a seed is given, so a cocotb RANDOM_SEED reproduces all patterns of a run, and
+# records what it returned (trace) so a stall sequence can be replayed bit for bit.
+#
+#   AlwaysOn()                  never stalls
+#   Bernoulli(p)                stalls each cycle with probability p
+#   Bursty(on=(1, 8), off=...)  alternating go/stall runs, lengths uniform in the ranges
+#   Alternating()               1, 0, 1, 0, ... (worst case for one deep skid buffers)
+#   Replay(trace)               plays a recorded trace, then never stalls (or loops)
+#
+# make_throttle() builds one from a spec string, e.g. from an environment variable:
+#   none | always | bernoulli:0.3 | bursty:4-16:1-4 | alternate | replay:0110... | replay:@file
+
+import random
+
+
+class Throttle:
+    """Base class, subclasses implement _next()."""
+
+    def __init__(self, seed=None):
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.trace = []
+
+    def __call__(self):
+        bit = self._next()
+        self.trace.append(bit)
+        return bit
+
+    def _next(self):
+        raise NotImplementedError
+
+    @property
+    def stall_rate(self):
+        return self.trace.count(0) / len(self.trace) if self.trace else 0.0
+
+    def trace_str(self):
+        return "".join(map(str, self.trace))
+
+
+class AlwaysOn(Throttle):
+    def _next(self):
+        return 1
+
+
+class Bernoulli(Throttle):
+    def __init__(self, p=0.5, seed=None):
+        super().__init__(seed)
+        if not 0 <= p <= 1:
+            raise ValueError(f"stall probability {p} not in [0, 1]")
+        self.p = p
+
+    def _next(self):
+        return 0 if self.rng.random() < self.p else 1
+
+
+class Bursty(Throttle):
+    def __init__(self, on=(1, 8), off=(1, 4), seed=None):
+        super().__init__(seed)
+        self.on = on
+        self.off = off
+        self._bit = 1
+        self._left = self.rng.randint(*on)
+
+    def _next(self):
+        while self._left == 0:
+            self._bit ^= 1
+            self._left = self.rng.randint(*(self.on if self._bit else self.off))
+        self._left -= 1
+        return self._bit
+
+
+class Alternating(Throttle):
+    def __init__(self, first=1, seed=None):
+        super().__init__(seed)
+        self._bit = first
+
+    def _next(self):
+        bit = self._bit
+        self._bit ^= 1
+        return bit
+
+
+class Replay(Throttle):
+    def __init__(self, trace, loop=False):
+        super().__init__(0)
+        if isinstance(trace, str):
+            trace = [int(c) for c in trace.strip()]
+        self.pattern = list(trace)
+        self.loop = loop
+        self._pos = 0
+
+    def _next(self):
+        if self._pos >= len(self.pattern):
+            if not self.loop or not self.pattern:
+                return 1
+            self._pos = 0
+        bit = self.pattern[self._pos]
+        self._pos += 1
+        return bit
+
+
+def _run_length(text):
+    lo, _, hi = text.partition("-")
+    return int(lo), int(hi or lo)
+
+
+def make_throttle(spec, seed=None):
+    """Throttle from a spec string, None for "none" (drivers then never stall)."""
+    kind, _, args = spec.strip().partition(":")
+    if kind in ("", "none"):
+        return None
+    if kind == "always":
+        return AlwaysOn(seed)
+    if kind == "bernoulli":
+        return Bernoulli(float(args or 0.5), seed)
+    if kind == "bursty":
+        on, _, off = args.partition(":")
+        return Bursty(_run_length(on or "1-8"), _run_length(off or "1-4"), seed)
+    if kind == "alternate":
+        return Alternating(seed=seed)
+    if kind == "replay":
+        if args.startswith("@"):
+            with open(args[1:]) as f:
+                args = f.read()
+        return Replay(args)
+    raise ValueError(f"unknown backpressure spec {spec!r}")
+
+
+def as_throttle(backpressure):
+    """Throttle for a backpressure argument: a throttle, a spec string, or a flag
+    (true: Bernoulli(0.5), false/None: no stalls)."""
+    if isinstance(backpressure, str):
+        return make_throttle(backpressure)
+    if callable(backpressure):
+        return backpressure
+    return Bernoulli(0.5) if backpressure else None
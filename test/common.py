@@ -1,28 +1,450 @@
+import json
+import random
 
 import cocotb
 from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles
+from cocotb.triggers import ClockCycles, RisingEdge, FallingEdge, First, ValueChange, ReadOnly
+from cocotb.simtime import get_sim_time
+
+# Shared stimulus and bus functional models for the mem testbenches.
+#
+# Header byte on the host bus: {enc, 1'b0, dest[1:0], src[1:0], opcode[1:0]},
+# followed by the 24-bit address LSB first.
+#
+# HASH_OP from and to MEM is a mem_command_port config write: the address field is the
+# config word, bits [3:0] the mem_spi_controller SCLK divider. No QSPI traffic, no ack.
+#
+# The BFMs resolve their signal handles and edge triggers once in __init__; the default
+# signal names are the mem_top (mem_vendor_test) host bus.
 
 RD_KEY = 0b00
 RD_TEXT = 0b01
 WR_RES = 0b10
 HASH_OP = 0b11
 
-async def wait_signal_high(dut, sig_name, timeout_cycles=1000):
-    for _ in range(timeout_cycles):
-        if int(getattr(dut, sig_name).value) == 1:
+# module ids used in the header src/dest fields and on MODULE_SOURCE_ID
+MEM = 0b00
+SHA = 0b01
+AES = 0b10
+
+RD_KEY_AES_BYTES = 32
+RD_TEXT_AES_BYTES = 16
+RD_TEXT_SHA_BYTES = 32
+
+WR_AES_BYTES = 16
+WR_SHA_BYTES = 32
+
+# header bit 6 on RD_KEY / RD_TEXT: burst read, a fifth header beat holds blocks - 1 and
+# mem_txn_fsm streams that many consecutive blocks under one CS, at most a page
+BURST = 1 << 6
+BURST_MAX_BYTES = 256
+
+# every header byte, keyed by (opcode, src, dest, enc)
+HEADERS = {
+    (opcode, src, dest, enc): (enc << 7) | (dest << 4) | (src << 2) | opcode
+    for opcode in range(4) for src in range(4) for dest in range(4) for enc in range(2)
+}
+
+def encode_header(opcode, src, dest, enc=0):
+    return HEADERS[(opcode, src, dest, enc)]
+
+# config write header, see config_sclk_divider()
+CONFIG = encode_header(HASH_OP, MEM, MEM)
+# SCLK = clk / (2 * divider); mem_command_port ignores dividers below the minimum
+SCLK_DIVIDER_RESET = 3
+SCLK_DIVIDER_MIN = 2
+SCLK_DIVIDER_MAX = 15
+
+def config_sclk_divider(divider):
+    # header beats of the config write setting the SCLK divider
+    return header_bytes(CONFIG, divider & 0xF)
+
+def decode_header(header):
+    # (opcode, src, dest, enc) of a header byte
+    return header & 0b11, (header >> 2) & 0b11, (header >> 4) & 0b11, header >> 7
+
+def is_config_header(header):
+    # mem_command_port takes any OTHER header from and to MEM as a config write, enc ignored
+    opcode, src, dest, _ = decode_header(header)
+    return opcode == HASH_OP and src == MEM and dest == MEM
+
+def header_flow(header, burst_len=0):
+    """(flow name, payload bytes) of a header mem_command_port accepts, None for config
+    writes and for the ones it ignores (it then stays idle and takes the next byte as a new
+    header). burst_len is the fifth beat of a burst read."""
+    opcode, src, dest, _ = decode_header(header)
+    if opcode in (RD_KEY, RD_TEXT) and dest == MEM:
+        peer = src
+    elif opcode == WR_RES and src == MEM:
+        peer = dest
+    else:
+        return None
+    name = f"{('RD_KEY', 'RD_TEXT', 'WR_RES')[opcode]}_{('MEM', 'SHA', 'AES', 'ID3')[peer]}"
+    if opcode == WR_RES:
+        return name, WR_AES_BYTES if peer == AES else WR_SHA_BYTES
+    if opcode == RD_KEY:
+        block = RD_KEY_AES_BYTES
+    else:
+        block = RD_TEXT_AES_BYTES if peer == AES else RD_TEXT_SHA_BYTES
+    if header_beats(header) == 5:
+        return name + "_BURST", min(block * (burst_len + 1), BURST_MAX_BYTES)
+    return name, block
+
+def header_bytes(header, addr):
+    # header byte followed by the 24-bit address, LSB first
+    return [header, addr & 0xff, (addr >> 8) & 0xff, (addr >> 16) & 0xff]
+
+def burst_header_bytes(header, addr, blocks):
+    # burst read of blocks (1-256) blocks: header with BURST set, address, blocks - 1;
+    # mem_txn_fsm stops at a page (BURST_MAX_BYTES)
+    return header_bytes(header | BURST, addr) + [blocks - 1]
+
+def header_beats(header):
+    # 5 for a burst read, BURST is ignored on WR_RES
+    return 5 if header & BURST and not header & 0b10 else 4
+
+def rd_key_aes_256b():
+    return encode_header(RD_KEY, AES, MEM, random.randint(0, 1))
+
+def rd_text_aes_128b():
+    return encode_header(RD_TEXT, AES, MEM, random.randint(0, 1))
+
+def rd_text_sha_256b():
+    # SHA ignores enc/dec
+    return encode_header(RD_TEXT, SHA, MEM, 0)
+
+def wr_aes_generate_128b():
+    return encode_header(WR_RES, MEM, AES, random.randint(0, 1))
+
+def wr_sha_generate_256b():
+    return encode_header(WR_RES, MEM, SHA, random.randint(0, 1))
+
+def invalid():
+    # HASH_OP is never valid for the memory module
+    return encode_header(HASH_OP, random.choice([0b10, 0b11]),
+                         random.choice([0b01, 0b10, 0b11]), random.randint(0, 1))
+
+def randomized_data():
+    return random.randint(0, 255)
+
+def _handle(dut, sig):
+    # accept either a signal name or an already resolved handle
+    return getattr(dut, sig) if isinstance(sig, str) else sig
+
+def _is_value(sig, value):
+    v = sig.value
+    return v.is_resolvable and int(v) == value
+
+async def _until_value(sig, value):
+    change = ValueChange(sig)
+    while True:
+        await change
+        if _is_value(sig, value):
             return True
-        await ClockCycles(dut.clk, 1)
-    return False
+
+async def wait_signal_high(dut, sig_name, timeout_cycles=1000):
+    # wakes on the signal edge or the timeout, never per clock
+    sig = _handle(dut, sig_name)
+    if _is_value(sig, 1):
+        return True
+    timeout = ClockCycles(dut.clk, timeout_cycles)
+    return await First(RisingEdge(sig), timeout) is not timeout
 
 async def wait_signal_value(dut, sig_name, value, timeout_cycles=1000):
-    for _ in range(timeout_cycles):
-        if int(getattr(dut, sig_name).value) == value:
-            return True
-        await ClockCycles(dut.clk, 1)
-    return False
+    # wakes on each change of the signal (not each clock) until it matches or times out
+    sig = _handle(dut, sig_name)
+    if _is_value(sig, value):
+        return True
+    timeout = ClockCycles(dut.clk, timeout_cycles)
+    waiter = cocotb.start_soon(_until_value(sig, value))
+    if await First(waiter, timeout) is timeout:
+        waiter.cancel()
+        return False
+    return True
 
 async def _reset(dut, cycles=20):
     dut.rst_n.value = 0
     await ClockCycles(dut.clk, cycles)
-    dut.rst_n.value = 1
\ No newline at end of file
+    dut.rst_n.value = 1
+
+def resolve_path(dut, path):
+    # dotted hierarchy path below dut, None if the simulator does not expose it
+    handle = dut
+    try:
+        for name in path.split("."):
+            handle = getattr(handle, name)
+    except AttributeError:
+        return None
+    return handle
+
+async def err_watchdog(dut, err="err", state=None):
+    # Fails the test as soon as the dut timeout flag rises while out of reset.
+    # Sleeps on rst_n/err edges only, so there is no per-clock python work.
+    # state is the dotted path of the FSM state register reported on failure.
+    rst_n = dut.rst_n
+    err_sig = _handle(dut, err)
+    state_sig = resolve_path(dut, state) if state else None
+    rst_rise = RisingEdge(rst_n)
+    rst_fall = FallingEdge(rst_n)
+    err_rise = RisingEdge(err_sig)
+    while True:
+        if not _is_value(rst_n, 1):
+            await rst_rise
+        if not _is_value(err_sig, 1) and await First(err_rise, rst_fall) is rst_fall:
+            continue
+        where = ""
+        if state_sig is not None:
+            v = state_sig.value
+            where = f", {state} = {int(v) if v.is_resolvable else v}"
+        assert False, f"[{get_sim_time('ns')} ns] Timeout Triggered: {err} asserted{where}"
+
+
+class HostBusDriver:
+    """Host -> dut byte stream (DATA_IN/VALID_IN, dut answers on READY_IN)."""
+
+    def __init__(self, dut, data="DATA_IN", valid="VALID_IN", ready="READY_IN"):
+        self.log = dut._log
+        self.data = getattr(dut, data)
+        self.valid = getattr(dut, valid)
+        self.ready = getattr(dut, ready)
+        self._clk_rise = RisingEdge(dut.clk)
+        self._clk_fall = FallingEdge(dut.clk)
+
+    async def send_header(self, header):
+        if not header:
+            return
+
+        self.log.info(f"Header Opcode 0x{header[0]:02x}")
+
+        self.valid.value = 1
+        i = 0
+
+        # Drive data with setup time before the sampling edge
+        await self._clk_fall
+
+        while i < len(header):
+            self.data.value = header[i]
+
+            # READY sampled during the cycle BEFORE the rising edge
+            ready = int(self.ready.value)
+
+            await self._clk_rise
+
+            if ready:
+                i += 1
+                await self._clk_fall  # align next data update to falling edge
+
+        self.valid.value = 0
+
+    async def send(self, data, throttle=None):
+        # throttle() returns 0 to hold VALID low for a cycle, None means always valid
+        i = 0
+        while i < len(data):
+            valid = 1 if throttle is None else throttle()
+            self.valid.value = valid
+            if valid:
+                self.data.value = data[i]
+
+            await self._clk_rise
+            if valid and int(self.ready.value):
+                i += 1
+
+        self.valid.value = 0
+
+
+class HostBusReceiver:
+    """Dut -> host byte stream (DATA/VALID, host answers on READY)."""
+
+    def __init__(self, dut, data="DATA", valid="VALID", ready="READY"):
+        self.log = dut._log
+        self.data = getattr(dut, data)
+        self.valid = getattr(dut, valid)
+        self.ready = getattr(dut, ready)
+        self._clk_rise = RisingEdge(dut.clk)
+
+    async def recv(self, length, throttle=None):
+        # throttle() returns 0 to hold READY low for a cycle, None means always ready
+        out = []
+        while len(out) < length:
+            ready = 1 if throttle is None else throttle()
+            self.ready.value = ready
+            await self._clk_rise
+
+            if ready and int(self.valid.value) == 1:
+                out.append(int(self.data.value))
+        self.ready.value = 0
+        self.log.info(f"All {length} Bytes Captured ")
+        return out
+
+
+class AckBusResponder:
+    """Accepts ACK_VALID requests and checks the requesting module id."""
+
+    def __init__(self, dut, valid="ACK_VALID", ready="ACK_READY", source_id="MODULE_SOURCE_ID"):
+        self.valid = getattr(dut, valid)
+        self.ready = getattr(dut, ready)
+        self.source_id = getattr(dut, source_id)
+        self._valid_rise = RisingEdge(self.valid)
+        self._valid_fall = FallingEdge(self.valid)
+        self._clk_rise = RisingEdge(dut.clk)
+
+    async def expect_ack(self, source=MEM):
+        await self._valid_rise
+        got = int(self.source_id.value) & 0b11
+        assert got == source, f"MODULE_SOURCE_ID expect {source:#04b} got {got:#04b}"
+        self.ready.value = 1
+        await self._valid_fall
+        self.ready.value = 0
+
+    async def expect_no_ack(self, cycles=1000):
+        for _ in range(cycles):
+            assert self.valid.value == 0, f"ACK_VALID expect 0 got {self.valid.value}"
+            await self._clk_rise
+
+
+class HostBus:
+    """Driver, receiver and ack responder of one toplevel, built once per test.
+
+    The toplevel port names are the defaults, a submodule test passes its own parts.
+    """
+
+    def __init__(self, dut, driver=None, receiver=None, ack=None):
+        self.driver = driver or HostBusDriver(dut)
+        self.receiver = receiver or HostBusReceiver(dut)
+        self.ack = ack or AckBusResponder(dut)
+
+
+# latency points, in clocks after the header (last address byte) was accepted
+LATENCY_POINTS = ("cs_fall", "first_byte", "last_byte", "ack")
+
+def percentile(values, q):
+    # nearest rank percentile of a sorted list
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+class LatencyMonitor:
+    """Per flow latency histograms of the host transactions, pin level and passive.
+
+    For every command mem_command_port accepts it timestamps, relative to the clock the last
+    header byte is taken on READY_IN/VALID_IN: the first QSPI CS fall, the first and last
+    payload byte (DATA/VALID/READY for reads, DATA_IN/VALID_IN/READY_IN for writes) and the
+    ACK_VALID rise (reads only, writes are not acked). Sleeps on VALID_IN between commands;
+    during a command it samples once per clock, after the falling edge, the values the next
+    rising edge will see.
+    """
+
+    def __init__(self, dut, clk_ns=10, timeout_cycles=200_000):
+        self.dut = dut
+        self.clk_ns = clk_ns
+        self.timeout_cycles = timeout_cycles
+        # flow name -> point -> latencies in clocks
+        self.samples = {}
+        # transactions dropped by a reset or the timeout
+        self.dropped = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = cocotb.start_soon(self._run())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _clock(self):
+        # index of the rising edge following the current falling edge
+        return round(get_sim_time(unit="ns") / self.clk_ns + 0.5)
+
+    async def _run(self):
+        dut = self.dut
+        clk_fall = FallingEdge(dut.clk)
+        valid_in_rise = RisingEdge(dut.VALID_IN)
+        settled = ReadOnly()
+        header = []
+        while True:
+            if not _is_value(dut.VALID_IN, 1):
+                await valid_in_rise
+            await clk_fall
+            await settled
+            if not (_is_value(dut.rst_n, 1) and _is_value(dut.VALID_IN, 1)
+                    and _is_value(dut.READY_IN, 1)):
+                continue
+            header.append(int(dut.DATA_IN.value))
+            if len(header) == 1 and header_flow(header[0]) is None and not is_config_header(header[0]):
+                header = []
+            elif len(header) == header_beats(header[0]):
+                flow = header_flow(header[0], header[-1])
+                header = []
+                # config writes have no flow to time
+                if flow is not None:
+                    await self._track(*flow)
+
+    async def _track(self, flow, nbytes):
+        dut = self.dut
+        clk_fall = FallingEdge(dut.clk)
+        settled = ReadOnly()
+        write = flow.startswith("WR_")
+        if write:
+            data_valid, data_ready = dut.VALID_IN, dut.READY_IN
+        else:
+            data_valid, data_ready = dut.VALID, dut.READY
+        t0 = self._clock()
+        points = {}
+        count = 0
+        # a fall, not CS low: the previous write may still be polling WIP
+        cs_high = _is_value(dut.CS, 1)
+        for _ in range(self.timeout_cycles):
+            await clk_fall
+            await settled
+            if not _is_value(dut.rst_n, 1):
+                break
+            now = self._clock() - 1
+            if "cs_fall" not in points:
+                if cs_high and _is_value(dut.CS, 0):
+                    points["cs_fall"] = now - t0
+                cs_high = _is_value(dut.CS, 1)
+            if "ack" not in points and _is_value(dut.ACK_VALID, 1):
+                points["ack"] = now - t0
+            if count < nbytes and _is_value(data_valid, 1) and _is_value(data_ready, 1):
+                count += 1
+                if count == 1:
+                    points["first_byte"] = now + 1 - t0
+                if count == nbytes:
+                    points["last_byte"] = now + 1 - t0
+            # a write merged into an open page program (WRITE_COMBINE) or a read cache hit
+            # (READ_CACHE) has no CS fall
+            if count == nbytes and (write or "ack" in points):
+                hist = self.samples.setdefault(flow, {})
+                for point, clocks in points.items():
+                    hist.setdefault(point, []).append(clocks)
+                return
+        self.dropped += 1
+
+    def report(self):
+        """{flow: {point: {n, min, p50, p99, max}}} in clocks."""
+        out = {}
+        for flow, hist in sorted(self.samples.items()):
+            out[flow] = {}
+            for point in LATENCY_POINTS:
+                values = sorted(hist.get(point, []))
+                if values:
+                    out[flow][point] = {"n": len(values), "min": values[0],
+                                        "p50": percentile(values, 50),
+                                        "p99": percentile(values, 99), "max": values[-1]}
+        return out
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"clk_ns": self.clk_ns, "dropped": self.dropped,
+                       "latency_clocks": self.report()}, f, indent=2)
+
+    def format_table(self):
+        lines = [f"{'flow':<14}{'point':<12}{'n':>5}{'min':>8}{'p50':>8}{'p99':>8}{'max':>8}"]
+        for flow, points in self.report().items():
+            for point, st in points.items():
+                lines.append(f"{flow:<14}{point:<12}{st['n']:>5}{st['min']:>8}{st['p50']:>8}"
+                             f"{st['p99']:>8}{st['max']:>8}")
+        return "\n".join(lines)
@@ -0,0 +1,610 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Behavioral W25Q128JV flash model for the mem_vendor_test toplevel.
+#
+# Replaces the vendor verilog model (W25Q128JVxIM.v). The model watches CS/SCLK/IO0-IO3
+# and drives the flash side of the IO pins through mem_vendor_test.flash_io.
+#
+# Supported instructions (everything mem_txn_fsm issues):
+#   66h enable reset, 99h reset, 06h WREN, 98h global unlock, 60h/C7h chip erase,
+#   05h/35h/15h read SR1/2/3, 01h/31h/11h write SR1/2/3,
+#   32h quad page program, 6Bh fast read quad output (8 dummy clocks),
+#   EBh fast read quad I/O (address + mode bits on 4 lanes, 4 dummy clocks), FFh mode reset
+#
+# Continuous read mode: an EBh read with mode bits M5-4 = 10 puts the model in xip, the next
+# frame has no opcode and starts right at the quad address + mode. Other mode bits (e.g. the
+# FFh mode reset, M4 = 1 on IO0) leave it, FFh outside of xip does nothing.
+#
+# Timing: SCLK idles high (mode 3). The dut shifts out on SCLK fall and samples on SCLK rise,
+# so the model samples on SCLK rise and shifts out on SCLK fall.
+#
+# The 16 MiB array lives in a sparse mmap'ed file (see MappedFlashArray): only programmed
+# pages cost memory, chip erase just maps a fresh file. save_snapshot()/restore_snapshot()
+# checkpoint the array plus status registers, e.g. right after the startup sequence.
+# FlashBackdoor (model.backdoor) preloads/peeks whole regions in one call.
+# Region checks (is_erased()/diff()) run on a NumPy view of the mapping, so verifying all
+# 16 MiB is a handful of vectorized passes instead of a python loop.
+#
+# Busy fast path: while WIP is set (until busy_until) the model does not look at the bits of
+# a frame. mem_vendor_test answers the status reads from status_regs and captures the opcode
+# (echo_opcode), the model only waits for CS rise, counts the poll and checks the opcode. A
+# Timer at busy_until clears WIP in status_regs, also in the middle of a poll.
+
+import json
+import math
+import mmap
+import tempfile
+
+import numpy as np
+
+import cocotb
+from cocotb.triggers import RisingEdge, FallingEdge, Timer
+from cocotb.simtime import get_sim_time
+
+from timing_profiles import current_profile
+
+NUM_PAGES = 65536
+PAGESIZE  = 256
+FLASH_BYTES = NUM_PAGES * PAGESIZE  # 16,777,216
+ERASED = 0xFF
+
+# flash opcodes
+OPC_ENABLE_RESET = 0x66
+OPC_RESET = 0x99
+OPC_WREN = 0x06
+OPC_GLOBAL_UNLOCK = 0x98
+OPC_CHIP_ERASE = 0x60
+OPC_CHIP_ERASE_ALT = 0xC7
+OPC_RDSR1 = 0x05
+OPC_RDSR2 = 0x35
+OPC_RDSR3 = 0x15
+OPC_WRSR1 = 0x01
+OPC_WRSR2 = 0x31
+OPC_WRSR3 = 0x11
+OPC_QUAD_PP = 0x32
+OPC_QUAD_READ = 0x6B
+OPC_QUAD_IO_READ = 0xEB
+OPC_MODE_RESET = 0xFF
+
+QUAD_READ_DUMMY = 8
+QUAD_IO_READ_DUMMY = 4
+# EBh mode byte, M5-4 = 10 keeps continuous read mode
+XIP_MODE = 0xA0
+XIP_MODE_MASK = 0x30
+
+# SR1 / SR2 bits
+SR1_WIP = 0x01
+SR1_WEL = 0x02
+SR2_QE = 0x02
+
+# flash_io value when the model is not driving: IO0/IO1 released, IO2/IO3 pulled up
+IO_RELEASED = 0b1100
+
+# byte inversion table, the backing file stores ~data
+_INVERT = bytes(range(255, -1, -1))
+
+
+class MappedFlashArray:
+    """16 MiB flash array backed by an mmap'ed file.
+
+    The file holds the inverted image (~data) so that an erased array is an all-zero sparse
+    file: creating the array and chip erase cost O(1) and only programmed pages take memory or
+    disk. A snapshot is restored as a private (copy-on-write) mapping of the snapshot file, so
+    any number of tests/processes can start from one checkpoint without copying it.
+    """
+
+    def __init__(self, size=FLASH_BYTES, page_size=PAGESIZE, path=None):
+        self.size = size
+        self.page_size = page_size
+        self.path = path
+        self._file = None
+        self.mm = None
+        self._map_fresh()
+
+    def _map_fresh(self):
+        # new all-erased image: truncating to size leaves a sparse file of zeros
+        self.close()
+        if self.path is None:
+            self._file = tempfile.TemporaryFile()
+        else:
+            self._file = open(self.path, "w+b")
+        self._file.truncate(self.size)
+        self.mm = mmap.mmap(self._file.fileno(), self.size, access=mmap.ACCESS_WRITE)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, addr):
+        return self.mm[addr] ^ 0xFF
+
+    def __setitem__(self, addr, value):
+        self.mm[addr] = ~value & 0xFF
+
+    def read(self, addr, length):
+        # sequential read, wraps at the end of the array like the real part
+        addr %= self.size
+        end = addr + length
+        if end <= self.size:
+            raw = self.mm[addr:end]
+        else:
+            raw = self.mm[addr:] + self.mm[:end - self.size]
+        return raw.translate(_INVERT)
+
+    def write(self, addr, data):
+        # raw store (backdoor), no program semantics
+        raw = bytes(data).translate(_INVERT)
+        addr %= self.size
+        while raw:
+            n = min(len(raw), self.size - addr)
+            self.mm[addr:addr + n] = raw[:n]
+            raw = raw[n:]
+            addr = 0
+
+    def program(self, addr, data):
+        # page program: bits can only go 1 -> 0 and the address wraps inside the page
+        # (stored inverted, so programming ORs into the file). Past a page of data only the
+        # last page_size bytes stay, where the wrapped address puts them.
+        base = (addr % self.size) - (addr % self.page_size)
+        offset = (addr + max(len(data) - self.page_size, 0)) % self.page_size
+        mm = self.mm
+        for byte in data[-self.page_size:]:
+            mm[base + offset] |= ~byte & 0xFF
+            offset = (offset + 1) % self.page_size
+
+    def erase_all(self):
+        self._map_fresh()
+
+    def snapshot(self, path):
+        """Write the image to path as a sparse file (erased pages are left as holes)."""
+        self.mm.flush()
+        zero = bytes(mmap.PAGESIZE)
+        with open(path, "wb") as f:
+            for offset in range(0, self.size, mmap.PAGESIZE):
+                chunk = self.mm[offset:offset + mmap.PAGESIZE]
+                if chunk != zero:
+                    f.seek(offset)
+                    f.write(chunk)
+            f.truncate(self.size)
+
+    def restore(self, path):
+        """Map a snapshot copy-on-write: writes stay private, the snapshot file is never modified."""
+        self.close()
+        self._file = open(path, "rb")
+        self.mm = mmap.mmap(self._file.fileno(), self.size, access=mmap.ACCESS_COPY)
+
+    def _raw_view(self, addr, length):
+        # uint8 view of the (inverted) mapping, no copy. Views must not outlive the call:
+        # an exported buffer keeps mm from being closed by erase_all()/restore().
+        if length is None:
+            length = self.size - addr
+        if addr < 0 or length < 0 or addr + length > self.size:
+            raise ValueError(f"region {addr:#x}+{length:#x} outside flash array")
+        return np.frombuffer(self.mm, dtype=np.uint8, count=length, offset=addr)
+
+    def is_erased(self, addr=0, length=None):
+        """True if every byte in [addr, addr+length) reads 0xFF (whole array by default)."""
+        return not self._raw_view(addr, length).any()
+
+    def diff(self, addr, expected, length=None, max_ranges=8):
+        """Compare a region against expected data.
+
+        expected is a bytes-like object, or an int fill value (ERASED for an erase check)
+        repeated over length bytes. Returns the first max_ranges mismatching address ranges
+        as (start, end) pairs, end exclusive; an empty list means the region matches.
+        """
+        if isinstance(expected, int):
+            raw = self._raw_view(addr, length)
+            mismatch = raw != (~expected & 0xFF)
+        else:
+            want = np.frombuffer(bytes(expected), dtype=np.uint8)
+            raw = self._raw_view(addr, len(want))
+            mismatch = raw != ~want
+        bad = np.flatnonzero(mismatch)
+        if not bad.size:
+            return []
+        # split the mismatching offsets into contiguous runs
+        breaks = np.flatnonzero(np.diff(bad) != 1) + 1
+        starts = np.concatenate(([bad[0]], bad[breaks]))[:max_ranges]
+        ends = np.concatenate((bad[breaks - 1], [bad[-1]]))[:max_ranges] + 1
+        return [(addr + int(s), addr + int(e)) for s, e in zip(starts, ends)]
+
+    def describe_diff(self, ranges, expected=None, addr=0, preview=8):
+        # one line per mismatching range with the first few bytes actually stored
+        lines = []
+        for start, end in ranges:
+            got = self.read(start, min(end - start, preview)).hex(" ")
+            line = f"  [{start:#08x}, {end:#08x}) {end - start} bytes, got {got}"
+            if isinstance(expected, int):
+                line += f" expected {expected:02x}"
+            elif expected is not None:
+                line += f" expected {bytes(expected[start - addr:start - addr + preview]).hex(' ')}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    @property
+    def touched_pages(self):
+        # number of flash pages that are not fully erased
+        pages = self._raw_view(0, self.size).reshape(-1, self.page_size)
+        return int(np.count_nonzero(pages.any(axis=1)))
+
+
+class FlashBackdoor:
+    """Bulk preload/peek of the flash array, bypassing the QSPI pins.
+
+    With the python model (model given) every call is a single slice operation on its
+    MappedFlashArray. Otherwise it falls back to the vendor verilog model's
+    dut.flash.memory[] array (VENDOR_FLASH=yes); sub-handles are resolved once per address
+    and cached, and writes land through the simulator at the next write phase.
+    """
+
+    def __init__(self, dut, model=None):
+        self.model = model
+        self._memory = None if model is not None else dut.flash.memory
+        self._handles = {}
+
+    def _handle(self, addr):
+        handle = self._handles.get(addr)
+        if handle is None:
+            handle = self._handles[addr] = self._memory[addr]
+        return handle
+
+    def load(self, addr, data):
+        """Write data (bytes or list of ints) starting at addr."""
+        data = bytes(data)
+        if self.model is not None:
+            self.model.memory.write(addr, data)
+            return
+        for i, byte in enumerate(data):
+            self._handle((addr + i) % FLASH_BYTES).value = byte
+
+    def load_file(self, addr, path):
+        """Write the contents of a binary file starting at addr."""
+        with open(path, "rb") as f:
+            self.load(addr, f.read())
+
+    def dump(self, addr, n):
+        """Read n bytes starting at addr."""
+        if self.model is not None:
+            return self.model.memory.read(addr, n)
+        return bytes(int(self._handle((addr + i) % FLASH_BYTES).value) for i in range(n))
+
+    def fill(self, region, value):
+        """Set every address in region (a range with step 1) to value."""
+        if region.step != 1:
+            raise ValueError("fill() needs a contiguous range")
+        self.load(region.start, bytes([value]) * len(region))
+
+
+class W25Q128Model:
+    """cocotb flash model attached to mem_vendor_test CS/SCLK/IO0-IO3/flash_io."""
+
+    def __init__(self, dut, t_reset_ns=None, t_page_program_ns=None,
+                 t_write_sr_ns=None, t_chip_erase_ns=None):
+        self.dut = dut
+        self.log = dut._log
+        # resolve handles/triggers once
+        self._io = (dut.IO0, dut.IO1, dut.IO2, dut.IO3)
+        self._drive = dut.flash_io
+        self._sclk_rise = RisingEdge(dut.SCLK)
+        self._sclk_fall = FallingEdge(dut.SCLK)
+        self._cs_fall = FallingEdge(dut.CS)
+        self._cs_rise = RisingEdge(dut.CS)
+        # status register echo of mem_vendor_test, bit level status reads without it
+        if hasattr(dut, "status_echo"):
+            self._echo = (dut.status_echo, dut.status_regs, dut.echo_opcode)
+        else:
+            self._echo = None
+
+        # busy times (ns) for operations that set WIP, unset ones from the timing profile
+        timing = current_profile().flash
+        self.t_reset_ns = timing["t_reset_ns"] if t_reset_ns is None else t_reset_ns
+        self.t_page_program_ns = (timing["t_page_program_ns"] if t_page_program_ns is None
+                                  else t_page_program_ns)
+        self.t_write_sr_ns = timing["t_write_sr_ns"] if t_write_sr_ns is None else t_write_sr_ns
+        self.t_chip_erase_ns = (timing["t_chip_erase_ns"] if t_chip_erase_ns is None
+                                else t_chip_erase_ns)
+
+        self.memory = MappedFlashArray()
+        self.backdoor = FlashBackdoor(dut, self)
+        self._sr1 = 0x00 # WIP/WEL are kept separately
+        self.sr2 = 0x00
+        self.sr3 = 0x00
+        self.wel = False
+        self.reset_enabled = False
+        self.busy_until = 0
+        # continuous read mode (EBh with M5-4 = 10)
+        self.xip = False
+        # frames without opcode (continuous read mode)
+        self.xip_reads = 0
+        # protocol violations seen by the model (commands while busy, missing WREN, ...)
+        self.errors = []
+        self.commands = 0
+        # RDSR1 frames, and the ones answered by the busy fast path
+        self.polls = 0
+        self.busy_polls = 0
+        self._task = None
+
+        # current CS frame, filled in by _frame() and executed on CS rise
+        self._opcode = None
+        self._addr = None
+        self._data = bytearray()
+        self._was_busy = False
+
+    # status registers
+    @property
+    def wip(self):
+        return get_sim_time(unit="ns") < self.busy_until
+
+    @property
+    def sr1(self):
+        return (self._sr1 & 0xFC) | (SR1_WEL if self.wel else 0) | (SR1_WIP if self.wip else 0)
+
+    @property
+    def status_reg(self):
+        # {SR3, SR2, SR1}, same packing as the vendor model status_reg
+        return (self.sr3 << 16) | (self.sr2 << 8) | self.sr1
+
+    @property
+    def quad_enabled(self):
+        return bool(self.sr2 & SR2_QE)
+
+    def start(self):
+        self._drive.value = IO_RELEASED
+        if self._task is None:
+            self._task = cocotb.start_soon(self._run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def save_snapshot(self, path):
+        """Checkpoint array, status registers and continuous read mode (to path.json)."""
+        self.memory.snapshot(path)
+        regs = {"sr1": self._sr1, "sr2": self.sr2, "sr3": self.sr3, "xip": self.xip}
+        with open(f"{path}.json", "w") as f:
+            json.dump(regs, f)
+
+    def restore_snapshot(self, path):
+        """Restore a checkpoint, the array is mapped copy-on-write from path."""
+        self.memory.restore(path)
+        with open(f"{path}.json") as f:
+            regs = json.load(f)
+        self._sr1 = regs["sr1"]
+        self.sr2 = regs["sr2"]
+        self.sr3 = regs["sr3"]
+        self.wel = False
+        self.reset_enabled = False
+        self.busy_until = 0
+        self.xip = regs["xip"]
+
+    def _error(self, msg):
+        t = get_sim_time(unit="ns")
+        self.errors.append(f"[{t} ns] {msg}")
+        self.log.warning(f"Flash model: {msg}")
+
+    def _set_busy(self, duration_ns):
+        self.busy_until = get_sim_time(unit="ns") + duration_ns
+
+    async def _run(self):
+        # one task per CS frame, CS rise cancels it and executes the instruction,
+        # so the bit loops only ever wait on a single SCLK edge
+        while True:
+            await self._cs_fall
+            if self._echo is not None and self.wip:
+                await self._busy_frame()
+                continue
+            self._opcode = None
+            self._addr = None
+            self._data = bytearray()
+            frame = cocotb.start_soon(self._frame())
+            await self._cs_rise
+            frame.cancel()
+            self._drive.value = IO_RELEASED
+            if self._opcode is not None:
+                self._execute()
+
+    async def _busy_frame(self):
+        echo, regs, echo_opcode = self._echo
+        regs.value = self.status_reg
+        echo.value = 1
+        clear_wip = cocotb.start_soon(self._clear_wip(regs))
+        await self._cs_rise
+        clear_wip.cancel()
+        echo.value = 0
+        opcode = int(echo_opcode.value)
+        self.commands += 1
+        if opcode in (OPC_RDSR1, OPC_RDSR2, OPC_RDSR3):
+            self.polls += opcode == OPC_RDSR1
+            self.busy_polls += 1
+            return
+        # anything else is ignored while busy, _execute() records it
+        self._opcode = opcode
+        self._addr = None
+        self._data = bytearray()
+        self._was_busy = True
+        self._execute()
+
+    async def _clear_wip(self, regs):
+        await Timer(math.ceil(self.busy_until - get_sim_time(unit="ns")), unit="ns")
+        regs.value = self.status_reg
+
+    # bit level helpers
+    async def _shift_in(self, bits):
+        value = 0
+        io0 = self._io[0]
+        for _ in range(bits):
+            await self._sclk_rise
+            value = (value << 1) | int(io0.value)
+        return value
+
+    async def _shift_in_quad(self):
+        value = 0
+        for _ in range(2):
+            await self._sclk_rise
+            for io in reversed(self._io):
+                value = (value << 1) | int(io.value)
+        return value
+
+    async def _shift_out(self, byte, quad=False):
+        if quad:
+            await self._sclk_fall
+            self._drive.value = byte >> 4
+            await self._sclk_fall
+            self._drive.value = byte & 0xF
+        else:
+            for b in range(7, -1, -1):
+                await self._sclk_fall
+                self._drive.value = IO_RELEASED | (((byte >> b) & 1) << 1)
+
+    async def _frame(self):
+        if self.xip:
+            # continuous read mode: no opcode, the frame starts with the quad address
+            self._opcode = OPC_QUAD_IO_READ
+            self._was_busy = self.wip
+            self.commands += 1
+            await self._quad_io_read(continuous=True)
+            return
+
+        opcode = await self._shift_in(8)
+        self._opcode = opcode
+        self._was_busy = self.wip
+        self.commands += 1
+
+        # status register is shifted out repeatedly until CS goes high
+        if opcode == OPC_RDSR1:
+            self.polls += 1
+            while True:
+                await self._shift_out(self.sr1)
+        elif opcode == OPC_RDSR2:
+            while True:
+                await self._shift_out(self.sr2)
+        elif opcode == OPC_RDSR3:
+            while True:
+                await self._shift_out(self.sr3)
+
+        elif opcode in (OPC_WRSR1, OPC_WRSR2, OPC_WRSR3):
+            self._data.append(await self._shift_in(8))
+
+        elif opcode == OPC_QUAD_PP:
+            self._addr = await self._shift_in(24)
+            while True:
+                self._data.append(await self._shift_in_quad())
+
+        elif opcode == OPC_QUAD_READ:
+            addr = await self._shift_in(24)
+            self._addr = addr
+            await self._shift_in(QUAD_READ_DUMMY)
+            if self._was_busy or not self.quad_enabled:
+                return
+            # keep streaming sequential bytes until CS goes high
+            while True:
+                await self._shift_out(self.memory[addr], quad=True)
+                addr = (addr + 1) % FLASH_BYTES
+
+        elif opcode == OPC_QUAD_IO_READ:
+            await self._quad_io_read()
+
+    async def _quad_io_read(self, continuous=False):
+        # EBh: 24 bit address and the mode byte on 4 lanes, 4 dummy clocks, quad data out
+        addr = 0
+        for _ in range(3):
+            addr = (addr << 8) | await self._shift_in_quad()
+        self._addr = addr
+        mode = await self._shift_in_quad()
+        # only with QE set, the mode bits are don't care to a flash that ignores the read
+        self.xip = (mode & XIP_MODE_MASK) == (XIP_MODE & XIP_MODE_MASK) and self.quad_enabled
+        self.xip_reads += continuous
+        for _ in range(QUAD_IO_READ_DUMMY // 2):
+            await self._shift_in_quad()
+        if self._was_busy or not self.quad_enabled:
+            return
+        while True:
+            await self._shift_out(self.memory[addr], quad=True)
+            addr = (addr + 1) % FLASH_BYTES
+
+    def _execute(self):
+        # instruction takes effect on CS rise
+        opcode = self._opcode
+        if opcode in (OPC_RDSR1, OPC_RDSR2, OPC_RDSR3):
+            return
+
+        if self._was_busy:
+            self._error(f"opcode {opcode:#04x} while busy (WIP=1), ignored")
+            return
+
+        reset_enabled = self.reset_enabled
+        self.reset_enabled = False
+
+        if opcode == OPC_ENABLE_RESET:
+            self.reset_enabled = True
+
+        elif opcode == OPC_RESET:
+            if not reset_enabled:
+                self._error("reset (99h) without enable reset (66h)")
+                return
+            self.wel = False
+            self._set_busy(self.t_reset_ns)
+
+        elif opcode == OPC_WREN:
+            self.wel = True
+
+        elif opcode == OPC_GLOBAL_UNLOCK:
+            if self._require_wel("global unlock"):
+                self.wel = False
+
+        elif opcode in (OPC_CHIP_ERASE, OPC_CHIP_ERASE_ALT):
+            if self._require_wel("chip erase"):
+                self.wel = False
+                self.memory.erase_all()
+                self._set_busy(self.t_chip_erase_ns)
+
+        elif opcode in (OPC_WRSR1, OPC_WRSR2, OPC_WRSR3):
+            if not self._data:
+                self._error(f"write status {opcode:#04x} without data byte")
+            elif self._require_wel(f"write status {opcode:#04x}"):
+                self.wel = False
+                data = self._data[0]
+                if opcode == OPC_WRSR1:
+                    self._sr1 = data & 0xFC
+                elif opcode == OPC_WRSR2:
+                    self.sr2 = data & 0xFB # bit 2 reserved
+                else:
+                    self.sr3 = data
+                self._set_busy(self.t_write_sr_ns)
+
+        elif opcode == OPC_QUAD_PP:
+            if self._addr is None or not self._data:
+                self._error("quad page program without address/data")
+            elif not self.quad_enabled:
+                self._error("quad page program with QE=0")
+            elif self._require_wel("quad page program"):
+                self.wel = False
+                self.memory.program(self._addr, self._data)
+                self._set_busy(self.t_page_program_ns)
+
+        elif opcode in (OPC_QUAD_READ, OPC_QUAD_IO_READ):
+            if not self.quad_enabled:
+                self._error(f"quad read {opcode:#04x} with QE=0")
+
+        elif opcode == OPC_MODE_RESET:
+            # outside of continuous read mode FFh is not an instruction, nothing to do
+            pass
+
+        else:
+            self._error(f"unsupported opcode {opcode:#04x}")
+
+    def _require_wel(self, what):
+        if not self.wel:
+            self._error(f"{what} without WREN")
+        return self.wel
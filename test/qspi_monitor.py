@@ -0,0 +1,311 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Transaction level QSPI monitor.
+#
+# One always-on coroutine samples IO0-IO3 and uio_oe on every SCLK rise (the edge the flash
+# samples on) and turns each CS low period into a QspiFrame. Checkers subscribe() to get
+# their own queue of frames instead of running a bit loop each.
+#
+# Frame layout is decoded from the opcode (OPCODE_LAYOUT): 8 opcode clocks on IO0,
+# then address bytes, dummy clocks and data. Address and data go on 1 or 4 lanes, a 4-lane
+# address (EBh) is followed by the mode byte.
+#
+# Continuous read mode is tracked like the flash does it: after an EBh frame with mode bits
+# M5-4 = 10 the next frame has no opcode, it is decoded as an EBh read with continuous set
+# (opcode_clocks 0). A continuous frame that ends right after mode bits leaving the mode is
+# the mode reset, passed on as an FFh frame.
+#
+# WIP poll loops are summarised: once two back to back RDSR1 frames read the same status
+# with WIP set, following frames are only sampled for their 8 opcode clocks. An RDSR1 is
+# passed on as a summary frame (opcode checked, no data, clock count of the loop's frames);
+# any other opcode ends the loop and its frame is sampled and decoded in full.
+
+from dataclasses import dataclass, field
+
+import cocotb
+from cocotb.queue import Queue
+from cocotb.triggers import RisingEdge, FallingEdge
+from cocotb.simtime import get_sim_time
+
+from flash_model import (
+    OPC_QUAD_PP, OPC_QUAD_READ, OPC_QUAD_IO_READ, OPC_MODE_RESET, OPC_RDSR1, OPC_RDSR2,
+    OPC_RDSR3, OPC_WRSR1, OPC_WRSR2, OPC_WRSR3, QUAD_READ_DUMMY, QUAD_IO_READ_DUMMY, SR1_WIP,
+    XIP_MODE, XIP_MODE_MASK,
+)
+
+# opcode -> (address bytes, address lanes, dummy clocks, data lanes); a 4-lane address is
+# followed by the mode byte. Anything else is opcode + 1-lane data
+OPCODE_LAYOUT = {
+    OPC_QUAD_PP:      (3, 1, 0, 4),
+    OPC_QUAD_READ:    (3, 1, QUAD_READ_DUMMY, 4),
+    OPC_QUAD_IO_READ: (3, 4, QUAD_IO_READ_DUMMY, 4),
+    0x02:             (3, 1, 0, 1),   # page program
+    0x03:             (3, 1, 0, 1),   # read data
+    0x0B:             (3, 1, 8, 1),   # fast read
+    0x20:             (3, 1, 0, 1),   # sector erase
+}
+
+OPCODE_NAMES = {
+    0x06: "WREN", 0x66: "RSTEN", 0x99: "RST", 0x98: "ULBPR", 0x60: "CE", 0xC7: "CE",
+    OPC_RDSR1: "RDSR1", OPC_RDSR2: "RDSR2", OPC_RDSR3: "RDSR3",
+    OPC_WRSR1: "WRSR1", OPC_WRSR2: "WRSR2", OPC_WRSR3: "WRSR3",
+    OPC_QUAD_PP: "QPP", OPC_QUAD_READ: "QREAD", OPC_QUAD_IO_READ: "QIOREAD",
+    OPC_MODE_RESET: "MODE_RST",
+}
+
+
+def keeps_xip(mode):
+    return mode is not None and (mode & XIP_MODE_MASK) == (XIP_MODE & XIP_MODE_MASK)
+
+
+@dataclass
+class QspiFrame:
+    """One CS frame as seen on the pins."""
+    opcode: int
+    addr: int = None
+    dummy: int = 0
+    data: bytes = b""
+    lanes: int = 1
+    # IO3..IO0 and uio_oe[3:0] at every SCLK rise of the frame, opcode clocks first
+    io: list = field(default_factory=list)
+    oe: list = field(default_factory=list)
+    start: float = 0
+    end: float = 0
+    addr_clocks: int = 0
+    # opcode clocks on IO0, 0 for a read in continuous read mode
+    opcode_clocks: int = 8
+    # EBh mode byte and its clocks
+    mode: int = None
+    mode_clocks: int = 0
+    continuous: bool = False
+    # summarised WIP poll: io/oe hold the opcode clocks only, sclk the frame's clock count
+    summary: bool = False
+    sclk: int = 0
+
+    @property
+    def name(self):
+        name = OPCODE_NAMES.get(self.opcode, f"{self.opcode:#04x}")
+        return f"{name} (xip)" if self.continuous else name
+
+    @property
+    def clocks(self):
+        return self.sclk if self.summary else len(self.oe)
+
+    @property
+    def data_clocks(self):
+        return self.clocks - self.opcode_clocks - self.addr_clocks - self.mode_clocks - self.dummy
+
+    # uio_oe per phase
+    @property
+    def opcode_oe(self):
+        return self.oe[:self.opcode_clocks]
+
+    @property
+    def addr_oe(self):
+        return self.oe[self.opcode_clocks:self.opcode_clocks + self.addr_clocks]
+
+    @property
+    def mode_oe(self):
+        start = self.opcode_clocks + self.addr_clocks
+        return self.oe[start:start + self.mode_clocks]
+
+    @property
+    def dummy_oe(self):
+        start = self.opcode_clocks + self.addr_clocks + self.mode_clocks
+        return self.oe[start:start + self.dummy]
+
+    @property
+    def data_oe(self):
+        return self.oe[self.opcode_clocks + self.addr_clocks + self.mode_clocks + self.dummy:]
+
+    def __str__(self):
+        if self.summary:
+            return f"[{self.start}-{self.end} ns] {self.name} (WIP poll loop)"
+        addr = "" if self.addr is None else f" addr={self.addr:#08x}"
+        if self.mode is not None:
+            addr += f" mode={self.mode:#04x}"
+        return (f"[{self.start}-{self.end} ns] {self.name}{addr} dummy={self.dummy} "
+                f"x{self.lanes} data={self.data.hex()}")
+
+
+class QspiMonitor:
+    """Decodes CS frames on the QSPI pins and hands them to subscribed queues.
+
+    io is either one 4-bit vector or the names of the four pins, IO0 first.
+    """
+
+    def __init__(self, dut, cs="CS", sclk="SCLK", io=("IO0", "IO1", "IO2", "IO3"),
+                 oe="uio_oe", summarise_polls=True):
+        self.log = dut._log
+        self._cs_fall = FallingEdge(getattr(dut, cs))
+        self._cs_rise = RisingEdge(getattr(dut, cs))
+        self._sclk_rise = RisingEdge(getattr(dut, sclk))
+        if isinstance(io, str):
+            self._io_vec = getattr(dut, io)
+            self._io = None
+        else:
+            self._io_vec = None
+            self._io = [getattr(dut, name) for name in io]
+        self._oe = getattr(dut, oe)
+        self._subscribers = []
+        self._samples = []
+        self._task = None
+        self.frames = 0
+        # RDSR1 frames, and how many of them were summarised
+        self.polls = 0
+        self.summarised = 0
+        self._summarise = summarise_polls
+        self._last_poll = None
+        self._steady = None
+        # flash in continuous read mode, the next frame has no opcode
+        self.xip = False
+
+    def start(self):
+        if self._task is None:
+            self._task = cocotb.start_soon(self._run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def subscribe(self):
+        """New queue receiving every frame that starts from now on."""
+        queue = Queue()
+        self._subscribers.append((get_sim_time(unit="ns"), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers = [(t, q) for t, q in self._subscribers if q is not queue]
+
+    async def _run(self):
+        # same scheme as the flash model: the per-frame sampler only waits on SCLK rise
+        # and is cancelled when CS goes high
+        while True:
+            await self._cs_fall
+            start = get_sim_time(unit="ns")
+            self._samples = []
+            steady = self._steady
+            sampler = cocotb.start_soon(self._sample(steady is not None))
+            await self._cs_rise
+            end = get_sim_time(unit="ns")
+            if sampler.done():
+                # opcode only RDSR1 of a WIP poll loop
+                frame = QspiFrame(opcode=OPC_RDSR1, io=[io for io, _ in self._samples],
+                                  oe=[oe for _, oe in self._samples], start=start, end=end,
+                                  summary=True, sclk=steady.clocks)
+                self.summarised += 1
+            else:
+                sampler.cancel()
+                frame = self.decode(self._samples, start, end, continuous=self.xip)
+            if frame is None:
+                continue
+            if frame.opcode == OPC_QUAD_IO_READ and frame.mode is not None:
+                self.xip = keeps_xip(frame.mode)
+            elif frame.opcode == OPC_MODE_RESET:
+                self.xip = False
+            self._track_polls(frame)
+            self.frames += 1
+            for t, queue in self._subscribers:
+                if start >= t:
+                    queue.put_nowait(frame)
+
+    def _track_polls(self, frame):
+        if frame.opcode != OPC_RDSR1:
+            self._last_poll = self._steady = None
+            return
+        self.polls += 1
+        if not self._summarise or frame.summary:
+            return
+        last = self._last_poll
+        if (last is not None and frame.data[:1] == last.data[:1] and frame.data[:1]
+                and frame.data[0] & SR1_WIP and frame.clocks == last.clocks):
+            self._steady = frame
+        self._last_poll = frame
+
+    async def _sample(self, steady=False):
+        # returns after the opcode clocks when a WIP poll loop goes on, else runs until
+        # cancelled on CS rise
+        samples = self._samples
+        oe = self._oe
+        if self._io_vec is not None:
+            io = self._io_vec
+            read = lambda: (int(io.value) & 0xF, int(oe.value) & 0xF)
+        else:
+            io0, io1, io2, io3 = self._io
+            read = lambda: ((int(io0.value) | (int(io1.value) << 1) | (int(io2.value) << 2)
+                             | (int(io3.value) << 3)), int(oe.value) & 0xF)
+        for _ in range(8):
+            await self._sclk_rise
+            samples.append(read())
+        if steady:
+            opcode = 0
+            for nibble, _ in samples:
+                opcode = (opcode << 1) | (nibble & 1)
+            if opcode == OPC_RDSR1:
+                return
+        while True:
+            await self._sclk_rise
+            samples.append(read())
+
+    @staticmethod
+    def decode(samples, start=0, end=0, continuous=False):
+        """Build a QspiFrame from (io, oe) nibbles sampled on SCLK rise.
+
+        continuous: the flash is in continuous read mode, the frame starts at the address.
+        """
+        if len(samples) < 8:
+            return None
+        if continuous:
+            opcode, opcode_clocks = OPC_QUAD_IO_READ, 0
+        else:
+            opcode, opcode_clocks = 0, 8
+            for io, _ in samples[:8]:
+                opcode = (opcode << 1) | (io & 1)
+        addr_bytes, addr_lanes, dummy, lanes = OPCODE_LAYOUT.get(opcode, (0, 1, 0, 1))
+
+        pos = opcode_clocks
+        addr = None
+        mode = None
+        addr_clocks = 8 * addr_bytes // addr_lanes
+        if addr_bytes and addr_lanes == 4:
+            # address then mode byte, a nibble per clock
+            addr = 0
+            for io, _ in samples[pos:pos + addr_clocks]:
+                addr = (addr << 4) | io
+            pos += addr_clocks
+            if len(samples) >= pos + 2:
+                mode = (samples[pos][0] << 4) | samples[pos + 1][0]
+            pos += 2
+        elif addr_bytes:
+            addr = 0
+            for io, _ in samples[pos:pos + addr_clocks]:
+                addr = (addr << 1) | (io & 1)
+            pos += addr_clocks
+        if continuous and not keeps_xip(mode) and len(samples) <= pos:
+            # FFh on IO0 in continuous read mode: mode bits leave it, nothing else clocked
+            return QspiFrame(opcode=OPC_MODE_RESET, io=[io for io, _ in samples],
+                             oe=[oe for _, oe in samples], start=start, end=end,
+                             continuous=True)
+        pos += dummy
+
+        data = bytearray()
+        body = samples[pos:]
+        if lanes == 4:
+            for i in range(0, len(body) - 1, 2):
+                data.append((body[i][0] << 4) | body[i + 1][0])
+        else:
+            # host drives IO0 when it writes, the flash answers on IO1 (DO)
+            for i in range(0, len(body) - 7, 8):
+                byte = 0
+                for io, oe in body[i:i + 8]:
+                    byte = (byte << 1) | ((io if oe & 1 else io >> 1) & 1)
+                data.append(byte)
+
+        return QspiFrame(opcode=opcode, addr=addr, dummy=dummy, data=bytes(data), lanes=lanes,
+                         io=[io for io, _ in samples], oe=[oe for _, oe in samples],
+                         start=start, end=end, addr_clocks=addr_clocks,
+                         opcode_clocks=opcode_clocks, mode=mode,
+                         mode_clocks=2 if addr_lanes == 4 else 0, continuous=continuous)
@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Where the QSPI time goes.
+#
+# breakdown() splits a window of sim time into the categories below from the QspiMonitor
+# frames that fall into it, every clock of the window lands in exactly one of them:
+#   opcode         8 SCLK cycles of the 1-lane opcode phase, none in continuous read mode
+#   address        address phase SCLK cycles (24 on one lane), for EBh 6 + 2 mode clocks
+#   dummy          dummy SCLK cycles
+#   data           data phase SCLK cycles
+#   cs_setup_hold  CS low without SCLK cycles: setup / hold around each frame
+#   opcode_gap     CS high between the frames of one command sequence (mem_txn_fsm gap)
+#   wip_poll       RDSR1 frames and the waits between polls that read WIP set
+#   idle           CS high for longer, waiting on the host
+#
+# savings() turns one breakdown into upper bounds of the clocks a few RTL changes could win,
+# to rank them: the fastest SCLK divider a config write can set, a 4-lane address phase,
+# no opcode gaps.
+# breakdown() also returns "address_1lane", the part of address spent on one lane, which is
+# all a 4-lane address can still save.
+
+from flash_model import OPC_RDSR1, SR1_WIP
+from common import SCLK_DIVIDER_MIN, SCLK_DIVIDER_RESET
+
+CATEGORIES = ("opcode", "address", "dummy", "data", "cs_setup_hold", "opcode_gap",
+              "wip_poll", "idle")
+
+# CS high gaps up to this many clocks are inter-command gaps: opcode_gap (5) plus the
+# mem_txn_fsm / spi controller hand over, with room to spare
+GAP_CLOCKS = 16
+
+
+def _busy_poll(frame):
+    return frame.opcode == OPC_RDSR1 and (
+        frame.summary or bool(frame.data[:1]) and frame.data[0] & SR1_WIP)
+
+
+def breakdown(frames, t0, t1, clk_ns=10, divider=SCLK_DIVIDER_RESET, gap_clocks=GAP_CLOCKS):
+    """Clocks per category in [t0, t1] (ns), plus the window length as "total"."""
+    sclk_ns = 2 * divider * clk_ns
+    ns = dict.fromkeys(CATEGORIES, 0.0)
+
+    def gap(length, after_busy_poll):
+        if length <= 0:
+            return
+        if after_busy_poll:
+            ns["wip_poll"] += length
+        elif length <= gap_clocks * clk_ns:
+            ns["opcode_gap"] += length
+        else:
+            ns["idle"] += length
+
+    address_1lane = 0.0
+    prev_end = t0
+    busy = False
+    for frame in sorted(frames, key=lambda f: f.start):
+        start, end = max(frame.start, t0), min(frame.end, t1)
+        if end <= start:
+            continue
+        gap(start - prev_end, busy)
+        length = end - start
+        if frame.opcode == OPC_RDSR1:
+            ns["wip_poll"] += length
+        else:
+            address = frame.addr_clocks + frame.mode_clocks
+            if not frame.mode_clocks:
+                address_1lane += address * sclk_ns
+            phases = {"opcode": frame.opcode_clocks, "address": address,
+                      "dummy": frame.dummy, "data": max(frame.data_clocks, 0)}
+            clocked = 0
+            for name, sclk in phases.items():
+                ns[name] += sclk * sclk_ns
+                clocked += sclk * sclk_ns
+            ns["cs_setup_hold"] += max(length - clocked, 0)
+        busy = _busy_poll(frame)
+        prev_end = end
+    gap(t1 - prev_end, busy)
+
+    out = {name: value / clk_ns for name, value in ns.items()}
+    out["total"] = (t1 - t0) / clk_ns
+    out["address_1lane"] = address_1lane / clk_ns
+    return out
+
+
+def savings(clocks, divider=SCLK_DIVIDER_RESET):
+    """Upper bounds of the clocks saved per change, from a breakdown()."""
+    sclk = clocks["opcode"] + clocks["address"] + clocks["dummy"] + clocks["data"]
+    return {
+        # SCLK at clk / (2 * SCLK_DIVIDER_MIN): every SCLK phase scales with the divider
+        "divider_min": max(0.0, sclk * (1 - SCLK_DIVIDER_MIN / divider)),
+        # address on IO0-IO3: 6 instead of 24 SCLK cycles (mode bits not counted)
+        "quad_address": clocks.get("address_1lane", clocks["address"]) * 3 / 4,
+        "no_opcode_gap": clocks["opcode_gap"],
+    }
+
+
+def format_breakdown(rows):
+    """Text table of (label, breakdown) rows, clocks and share of the window."""
+    lines = [f"{'case':<18}" + "".join(f"{name:>14}" for name in CATEGORIES)]
+    for label, clocks in rows:
+        total = clocks["total"] or 1
+        lines.append(f"{label:<18}" + "".join(
+            f"{clocks[name]:>8.0f} {100 * clocks[name] / total:>3.0f}%" + " "
+            for name in CATEGORIES))
+    return "\n".join(lines)
@@ -0,0 +1,60 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Read cache of mem_command_port.
+#
+# Chosen at build time by a define, the tests read $READ_CACHE to know what to expect on
+# the QSPI pins. runner.py --read-cache and make RC=yes set both.
+#
+#   off  (default) every RD_KEY goes to the flash.
+#   on   two 32B lines of RD_KEY data tagged with the read address. A RD_KEY at a valid
+#        tag is answered from the line with no QSPI frame, a miss refills the least
+#        recently used line. A WR_RES invalidates every line it overlaps, including the
+#        bytes its page program wraps to at the page start. Burst reads and RD_TEXT bypass
+#        the cache.
+
+import os
+
+DEFINE = "READ_CACHE"
+
+LINES = 2
+LINE_BYTES = 32
+
+PAGE_BYTES = 256
+
+
+def read_cache_enabled():
+    """Read cache selected by $READ_CACHE (default off)."""
+    return os.environ.get("READ_CACHE", "").lower() not in ("", "0", "no", "off")
+
+
+class ReadCacheModel:
+    """Hit/miss reference of the mem_command_port read cache, always missing when disabled."""
+
+    def __init__(self, enabled=None):
+        self.enabled = read_cache_enabled() if enabled is None else enabled
+        self.tags = [None] * LINES
+        self.lru = 0
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, addr):
+        """RD_KEY at addr, True on a hit."""
+        if self.enabled and addr in self.tags:
+            way = self.tags.index(addr)
+            self.lru = 1 - way
+            self.hits += 1
+            return True
+        if self.enabled:
+            self.tags[self.lru] = addr
+            self.lru = 1 - self.lru
+        self.misses += 1
+        return False
+
+    def write(self, addr, length):
+        """WR_RES of length bytes at addr, wrapping inside its page like the 0x32 program."""
+        page = addr - addr % PAGE_BYTES
+        written = {page + (addr + k) % PAGE_BYTES for k in range(length)}
+        for way, tag in enumerate(self.tags):
+            if tag is not None and any(tag <= a < tag + LINE_BYTES for a in written):
+                self.tags[way] = None
@@ -0,0 +1,48 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Flash read command of mem_txn_fsm.
+#
+# Chosen at build time by a define, the tests read $READ_MODE to know what to expect on the
+# QSPI pins. runner.py --read and make READ= set both.
+#
+#   6b   fast read quad output (default): opcode + 24 bit address on IO0, 8 dummy clocks,
+#        data on 4 lanes. Every read polls WIP first.
+#   eb   fast read quad I/O in continuous read mode: the first read after startup or a write
+#        sends opcode + address + mode bits A0h on 4 lanes, 4 dummy clocks. Later reads
+#        skip the WIP poll and the opcode, a write first sends FFh to leave the mode.
+
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ReadMode:
+    # verilog define selecting the mem_txn_fsm read opcode, None for 0x6B
+    define: str
+    # flash opcode of a read frame
+    opcode: int
+    # address bytes on 4 lanes (the mode byte is sent the same way)
+    quad_address: bool
+    # dummy SCLK cycles after the address (and mode) phase
+    dummy_clocks: int
+
+
+READ_MODES = {
+    "6b": ReadMode(None, 0x6B, False, 8),
+    "eb": ReadMode("READ_QUAD_IO", 0xEB, True, 4),
+}
+
+DEFAULT_READ_MODE = "6b"
+
+
+def read_mode_name():
+    name = os.environ.get("READ_MODE") or DEFAULT_READ_MODE
+    if name not in READ_MODES:
+        raise ValueError(f"unknown READ_MODE {name!r}, expected one of {', '.join(READ_MODES)}")
+    return name
+
+
+def current_read_mode():
+    """Read mode selected by $READ_MODE (default 6b)."""
+    return READ_MODES[read_mode_name()]
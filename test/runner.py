@@ -0,0 +1,550 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Python entry point for the RTL testbenches (cocotb_tools.runner), alternative to the
+# Makefile targets.
+#
+# Each toplevel is built into sim_build/<toplevel>. The build is keyed by a hash of the
+# HDL sources, defines and build arguments (written to sim_build/<toplevel>/build.hash):
+# when nothing changed the Verilator + C++ build is skipped and the tests start right away.
+#
+#   python runner.py                      - all targets (same set as make all_tests)
+#   python runner.py mem_top fsm          - selected targets
+#   python runner.py mem_top --vendor-flash
+#   python runner.py mem_top --timing datasheet-typ
+#                                         - flash timing profile (timing_profiles.py)
+#   python runner.py mem_top --read eb    - 0xEB continuous read instead of 0x6B (read_mode.py)
+#   python runner.py mem_top --write-combine
+#                                         - adjacent WR_RES merged into one page program
+#                                           (write_combine.py)
+#   python runner.py mem_top --read-cache - RD_KEY cache in mem_command_port (read_cache.py)
+#   python runner.py fsm -t fsm_random_scoreboard
+#   python runner.py --rebuild ...        - ignore the cache
+#   python runner.py -j 4                 - at most 4 processes (default: all cores)
+#   python runner.py --stress 1000        - random_stress on seeds 1..1000, one build
+#   python runner.py mem_top --trace fst --trace-scope mem_vendor_test.top.spi
+#   python runner.py --stress 1000 --trace-window 2000
+#                                         - untraced, failing seeds replayed with the last
+#                                           2000 clocks dumped (see trace_control.py)
+#
+# Targets run in parallel processes, each in its own sim_build/<toplevel>/<target> test
+# directory (results.xml, sim.log, waves, flash snapshots). The per-target results are merged
+# into one JUnit report, test/results.xml by default.
+#
+# --stress runs mem_top_random_stress once per seed (COCOTB_RANDOM_SEED) across the process
+# pool. Each seed's pass/fail, cycles and runtime go to sim_build/mem_vendor_test/stress/
+# stress.json; failing seeds keep their directory and get a one-line reproduction command.
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import cocotb
+from cocotb_tools.runner import get_runner, get_results, VerilatorControlFile
+
+from timing_profiles import PROFILES, DEFAULT_PROFILE, current_profile, profile_name
+from read_mode import READ_MODES, DEFAULT_READ_MODE, current_read_mode, read_mode_name
+import write_combine
+import read_cache
+
+TEST_DIR = Path(__file__).resolve().parent
+SRC_DIR = TEST_DIR.parent / "src"
+SIM_BUILD = TEST_DIR / "sim_build"
+
+SIM = os.environ.get("SIM", "verilator")
+TIMESCALE = ("1ns", "1ps")
+CLK_NS = 10
+# same as the Makefile: SIMULATION timing constants, src/ on the include path
+DEFINES = {"SIMULATION": 1}
+BUILD_ARGS = []
+
+MEM_TOP_SOURCES = ["mem_command_port.v", "mem_spi_controller.v", "mem_txn_fsm.v", "mem_top.v"]
+
+
+@dataclass
+class Target:
+    """One toplevel/test module pair, mirrors a test_* target of the Makefile."""
+    toplevel: str
+    module: str
+    sources: list
+    defines: dict = field(default_factory=dict)
+    build_args: list = field(default_factory=list)
+    # toplevel has the `ifdef TRACE dump block driven by trace_control.py, otherwise the
+    # verilator main dumps the whole design
+    dump_block: bool = False
+
+    def source_paths(self):
+        return [Path(s) if os.path.isabs(s) else SRC_DIR / s for s in self.sources]
+
+
+@dataclass(frozen=True)
+class Trace:
+    """Waveform options, untraced by default.
+
+    fmt "fst" or "vcd" makes a trace build (its own sim_build/<toplevel>.<fmt> directory),
+    scope limits tracing to one hierarchy path, window N replays failing runs traced with
+    only the last N clocks before the failure dumped.
+    """
+    fmt: str = None
+    scope: str = None
+    window: int = None
+
+    @property
+    def suffix(self):
+        return f".{self.fmt}" if self.fmt else ""
+
+    def scope_vlt(self):
+        return ("`verilator_config\n"
+                "tracing_off -scope \"*\"\n"
+                f"tracing_on -scope \"{self.scope}*\"\n")
+
+
+NO_TRACE = Trace()
+
+
+TARGETS = {
+    "command_port": Target("mem_command_port", "test_mem_command_port", ["mem_command_port.v"]),
+    "spi_controller": Target("mem_spi_controller", "test_mem_spi_controller",
+                             ["mem_spi_controller.v"]),
+    "fsm": Target("mem_txn_fsm", "test_mem_transaction_fsm", ["mem_txn_fsm.v"]),
+    "mem_top": Target("mem_vendor_test", "test_mem_top", MEM_TOP_SOURCES + ["mem_vendor_test.v"],
+                      dump_block=True),
+    "tt_toplevel": Target("tb", "test_tt_um_mem_toplevel",
+                          MEM_TOP_SOURCES + ["tt_um_mem_toplevel.v",
+                                             str(TEST_DIR / "tb_tt_um_mem_toplevel.v")],
+                          build_args=["--timing"], dump_block=True),
+    "benchmark": Target("mem_vendor_test", "test_mem_benchmark",
+                        MEM_TOP_SOURCES + ["mem_vendor_test.v"], dump_block=True),
+}
+# targets run when none are given (make all_tests)
+DEFAULT_TARGETS = ["command_port", "spi_controller", "fsm", "mem_top", "tt_toplevel"]
+
+
+def build_config(target, vendor_flash=False, trace=NO_TRACE):
+    sources = target.source_paths()
+    defines = {**DEFINES, **target.defines}
+    build_args = BUILD_ARGS + target.build_args
+    # $TIMING_PROFILE is also what the tests read, main() sets it for --timing
+    if current_profile().define:
+        defines[current_profile().define] = 1
+    # same for $READ_MODE, main() sets it for --read
+    if current_read_mode().define:
+        defines[current_read_mode().define] = 1
+    # and $WRITE_COMBINE, main() sets it for --write-combine
+    if write_combine.write_combine_enabled():
+        defines[write_combine.DEFINE] = 1
+    # and $READ_CACHE, main() sets it for --read-cache
+    if read_cache.read_cache_enabled():
+        defines[read_cache.DEFINE] = 1
+    if vendor_flash and target.toplevel == "mem_vendor_test":
+        sources.append(SRC_DIR / "W25Q128JVxIM.v")
+        defines["VENDOR_FLASH_MODEL"] = 1
+    if trace.fmt:
+        defines["TRACE"] = 1
+        build_args = build_args + ["--trace-structs"]
+        if trace.fmt == "fst":
+            defines["TRACE_FST"] = 1
+            build_args.append("--trace-fst")
+    return sources, defines, build_args
+
+
+def build_hash(toplevel, sources, defines, build_args):
+    """Hash of everything that ends up in the simulator binary."""
+    h = hashlib.sha256()
+    h.update(f"{SIM} {cocotb.__version__} {toplevel} {TIMESCALE}\n".encode())
+    h.update(repr(sorted(defines.items())).encode())
+    h.update(repr(build_args).encode())
+    for path in sources:
+        h.update(str(path).encode())
+        h.update(path.read_bytes())
+    # files pulled in through `include from src/
+    for path in sorted(SRC_DIR.glob("*.vh")):
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def build(runner, target, vendor_flash=False, rebuild=False, log_file=None, trace=NO_TRACE):
+    """Build target into sim_build/<toplevel> unless an identical build is already there."""
+    sources, defines, build_args = build_config(target, vendor_flash, trace)
+    build_dir = SIM_BUILD / (target.toplevel + trace.suffix)
+    build_dir.mkdir(parents=True, exist_ok=True)
+    control_files = []
+    if trace.fmt and trace.scope:
+        vlt = build_dir / "trace_scope.vlt"
+        vlt.write_text(trace.scope_vlt())
+        control_files.append(vlt)
+    stamp = build_dir / "build.hash"
+    digest = build_hash(target.toplevel, control_files + sources, defines, build_args)
+
+    cached = (not rebuild and stamp.is_file() and stamp.read_text().strip() == digest
+              and (build_dir / target.toplevel).is_file())
+    if cached:
+        print(f"[runner] {target.toplevel}: sources unchanged, reusing {build_dir}")
+        return build_dir
+
+    # a stale stamp must not survive a failed build
+    stamp.unlink(missing_ok=True)
+    runner.build(
+        sources=[VerilatorControlFile(f) for f in control_files] + sources,
+        includes=[SRC_DIR],
+        defines=defines,
+        build_args=build_args,
+        hdl_toplevel=target.toplevel,
+        build_dir=build_dir,
+        timescale=TIMESCALE,
+        waves=bool(trace.fmt),
+        always=True,
+        log_file=log_file,
+    )
+    stamp.write_text(digest + "\n")
+    return build_dir
+
+
+def test(runner, name, build_dir, testcase=None, seed=None, log_file=None, test_dir=None,
+         extra_env=None, trace=NO_TRACE):
+    """Run the tests of target name, by default in its own sim_build/<toplevel>/<name> directory.
+
+    Returns (results xml, tests, failed); a simulator that died without writing results
+    counts as one failure.
+    """
+    target = TARGETS[name]
+    test_dir = test_dir or build_dir / name
+    results_xml = test_dir / "results.xml"
+    results_xml.unlink(missing_ok=True)
+    try:
+        runner.test(
+            test_module=target.module,
+            hdl_toplevel=target.toplevel,
+            hdl_toplevel_lang="verilog",
+            build_dir=build_dir,
+            test_dir=test_dir,
+            testcase=testcase,
+            seed=seed,
+            timescale=TIMESCALE,
+            results_xml=str(results_xml),
+            log_file=log_file,
+            extra_env=extra_env or {},
+            waves=bool(trace.fmt) and not target.dump_block,
+        )
+    except subprocess.CalledProcessError:
+        pass
+    if not results_xml.is_file():
+        return None, 1, 1
+    tests, failed = get_results(results_xml)
+    return results_xml, tests, failed
+
+
+def run(name, vendor_flash=False, rebuild=False, testcase=None, seed=None, trace=NO_TRACE):
+    """Build (if needed) and run one target, returns (results xml, tests, failed)."""
+    runner = get_runner(SIM)
+    try:
+        build_dir = build(runner, TARGETS[name], vendor_flash, rebuild, trace=trace)
+    except subprocess.CalledProcessError:
+        print(f"[runner] {TARGETS[name].toplevel}: build failed")
+        return None, 1, 1
+    return test(runner, name, build_dir, testcase, seed, trace=trace)
+
+
+def failure_time_ns(xml):
+    """(absolute sim time of the first failing test's end, random seed) from a results file."""
+    root = ET.parse(xml).getroot()
+    seed = None
+    for prop in root.iter("property"):
+        if prop.get("name") == "random_seed":
+            seed = int(prop.get("value"))
+    elapsed = 0.0
+    for case in root.iter("testcase"):
+        # tests of one module run back to back in the same simulation
+        elapsed += float(case.get("sim_time_ns", 0))
+        if case.find("failure") is not None or case.find("error") is not None:
+            return elapsed, seed
+    return None, seed
+
+
+def replay_window(name, xml, test_dir, trace, testcase=None, extra_env=None,
+                  vendor_flash=False):
+    """Re-run a failing run (same seed and tests) on a trace build, dumping only the last
+    trace.window clocks before the failure. Returns the replay directory."""
+    fail_ns, seed = failure_time_ns(xml)
+    if fail_ns is None:
+        return None
+    target = TARGETS[name]
+    trace = Trace(trace.fmt or "fst", trace.scope, trace.window)
+    runner = get_runner(SIM)
+    build_dir = build(runner, target, vendor_flash, trace=trace,
+                      log_file=SIM_BUILD / f"{target.toplevel}{trace.suffix}.build.log")
+    replay_dir = test_dir / "replay"
+    replay_dir.mkdir(parents=True, exist_ok=True)
+    start_ns = max(0, fail_ns - trace.window * CLK_NS) if trace.window else 0
+    env = {**(extra_env or {}), "TRACE_START_NS": str(int(start_ns))}
+    test(runner, name, build_dir, testcase, seed, log_file=replay_dir / "sim.log",
+         test_dir=replay_dir, extra_env=env, trace=trace)
+    what = (f"from {start_ns:.0f} ns to the failure at {fail_ns:.0f} ns" if target.dump_block
+            else "whole run (no dump block in this toplevel)")
+    print(f"[runner] {name}: replayed seed {seed} traced, {what}, waves in {replay_dir}")
+    return replay_dir
+
+
+# process pool jobs, output goes to log files so parallel runs do not interleave
+def _build_job(name, vendor_flash, rebuild, trace):
+    target = TARGETS[name]
+    log_file = SIM_BUILD / f"{target.toplevel}{trace.suffix}.build.log"
+    SIM_BUILD.mkdir(parents=True, exist_ok=True)
+    return build(get_runner(SIM), target, vendor_flash, rebuild, log_file=log_file, trace=trace)
+
+
+def _test_job(name, build_dir, testcase, seed, trace):
+    (build_dir / name).mkdir(parents=True, exist_ok=True)
+    return test(get_runner(SIM), name, build_dir, testcase, seed,
+                log_file=build_dir / name / "sim.log", trace=trace)
+
+
+def run_parallel(names, jobs, vendor_flash=False, rebuild=False, testcase=None, seed=None,
+                 trace=NO_TRACE):
+    """Run targets in up to jobs processes, returns {name: (results xml, tests, failed)}.
+
+    Targets sharing a toplevel share its build, so builds run first (one job per toplevel),
+    then every target runs in its own process and test directory.
+    """
+    by_toplevel = {}
+    for name in names:
+        by_toplevel.setdefault(TARGETS[name].toplevel, name)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        builds = {toplevel: pool.submit(_build_job, name, vendor_flash, rebuild, trace)
+                  for toplevel, name in by_toplevel.items()}
+        build_dirs = {}
+        for toplevel, future in builds.items():
+            try:
+                build_dirs[toplevel] = future.result()
+            except subprocess.CalledProcessError:
+                print(f"[runner] {toplevel}: build failed, "
+                      f"see {SIM_BUILD / toplevel}{trace.suffix}.build.log")
+
+        tests = {}
+        for name in names:
+            build_dir = build_dirs.get(TARGETS[name].toplevel)
+            if build_dir is None:
+                results[name] = (None, 1, 1)
+            else:
+                tests[name] = pool.submit(_test_job, name, build_dir, testcase, seed, trace)
+        for name, future in tests.items():
+            results[name] = future.result()
+            print(f"[runner] {name} done, log in {TARGETS[name].toplevel}/{name}/sim.log")
+    return {name: results[name] for name in names}
+
+
+STRESS_TARGET = "mem_top"
+STRESS_TEST = "mem_top_random_stress"
+
+
+def stress_repro(seed, iterations):
+    timing = profile_name()
+    timing = "" if timing == DEFAULT_PROFILE else f" --timing {timing}"
+    read = read_mode_name()
+    read = "" if read == DEFAULT_READ_MODE else f" --read {read}"
+    wc = " --write-combine" if write_combine.write_combine_enabled() else ""
+    rc = " --read-cache" if read_cache.read_cache_enabled() else ""
+    return (f"STRESS_ITERATIONS={iterations} python runner.py {STRESS_TARGET} "
+            f"-t {STRESS_TEST} --seed {seed}{timing}{read}{wc}{rc}")
+
+
+def _stress_job(seed, build_dir, stress_dir, iterations, keep):
+    """One seed of the random_stress regression, returns its summary record."""
+    test_dir = stress_dir / f"seed_{seed}"
+    test_dir.mkdir(parents=True, exist_ok=True)
+    start = time.monotonic()
+    xml, tests, failed = test(get_runner(SIM), STRESS_TARGET, build_dir, STRESS_TEST, seed,
+                              log_file=test_dir / "sim.log", test_dir=test_dir,
+                              extra_env={"STRESS_ITERATIONS": str(iterations)})
+    record = {"seed": seed, "passed": tests > 0 and not failed,
+              "runtime_s": round(time.monotonic() - start, 3), "sim_time_ns": None,
+              "cycles": None}
+    if xml is not None:
+        for case in ET.parse(xml).getroot().iter("testcase"):
+            sim_time_ns = float(case.get("sim_time_ns", 0))
+            record["sim_time_ns"] = sim_time_ns
+            record["cycles"] = int(sim_time_ns // CLK_NS)
+    if record["passed"] and not keep:
+        # only failing seeds keep their log and waves
+        shutil.rmtree(test_dir, ignore_errors=True)
+    else:
+        record["repro"] = stress_repro(seed, iterations)
+        record["log"] = str(test_dir / "sim.log")
+    return record, xml
+
+
+def run_stress(seeds, jobs, first_seed=1, iterations=8, vendor_flash=False, rebuild=False,
+               keep=False, junit=None, trace=NO_TRACE):
+    """random_stress over seeds first_seed .. first_seed+seeds-1 on one shared build.
+
+    Writes sim_build/<toplevel>/stress/stress.json and returns the per-seed records.
+    """
+    target = TARGETS[STRESS_TARGET]
+    build_dir = build(get_runner(SIM), target, vendor_flash, rebuild)
+    stress_dir = build_dir / "stress"
+    shutil.rmtree(stress_dir, ignore_errors=True)
+    stress_dir.mkdir(parents=True)
+
+    suite = ET.Element("testsuite", name="stress", package="stress")
+    records = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_stress_job, seed, build_dir, stress_dir, iterations, keep)
+                   for seed in range(first_seed, first_seed + seeds)]
+        for future in futures:
+            record, xml = future.result()
+            records.append(record)
+            status = "PASS" if record["passed"] else "FAIL"
+            print(f"[stress] seed {record['seed']:>8} {status} cycles={record['cycles']} "
+                  f"{record['runtime_s']:.1f}s")
+            case = ET.SubElement(suite, "testcase", name=f"{STRESS_TEST}[{record['seed']}]",
+                                 classname=target.module, time=str(record["runtime_s"]))
+            if not record["passed"]:
+                ET.SubElement(case, "failure", message=record["repro"])
+
+    failures = [r for r in records if not r["passed"]]
+    summary = {"test": STRESS_TEST, "iterations": iterations, "seeds": seeds,
+               "failed": len(failures), "records": records}
+    with open(stress_dir / "stress.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    if junit:
+        merged = ET.Element("testsuites", name="results")
+        merged.append(suite)
+        ET.indent(merged)
+        ET.ElementTree(merged).write(junit, encoding="utf-8", xml_declaration=True)
+
+    print(f"[stress] {seeds - len(failures)}/{seeds} seeds passed, "
+          f"summary in {stress_dir / 'stress.json'}")
+    for r in failures:
+        print(f"[stress] seed {r['seed']} failed, reproduce with: {r['repro']}")
+    if trace.window:
+        for r in failures:
+            xml = Path(r["log"]).parent / "results.xml"
+            if xml.is_file():
+                replay_window(STRESS_TARGET, xml, xml.parent, trace, STRESS_TEST,
+                              {"STRESS_ITERATIONS": str(iterations)}, vendor_flash)
+    return records
+
+
+def merge_junit(results, path):
+    """Merge the per-target cocotb results into one JUnit file, one testsuite per target."""
+    merged = ET.Element("testsuites", name="results")
+    for name, (xml, _, _) in results.items():
+        if xml is None:
+            # no results: the simulator crashed or the build failed
+            suite = ET.SubElement(merged, "testsuite", name=name, package=name)
+            case = ET.SubElement(suite, "testcase", name=name, classname=TARGETS[name].module)
+            ET.SubElement(case, "failure", message="no results.xml written")
+            continue
+        for suite in ET.parse(xml).getroot().iter("testsuite"):
+            suite.set("name", name)
+            suite.set("package", name)
+            merged.append(suite)
+    ET.indent(merged)
+    ET.ElementTree(merged).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="mem testbench runner")
+    parser.add_argument("targets", nargs="*", help=f"one of {', '.join(TARGETS)} (default: all)")
+    parser.add_argument("--vendor-flash", action="store_true",
+                        help="mem_top against the vendor W25Q128JVxIM.v model")
+    parser.add_argument("--timing", choices=PROFILES,
+                        help=f"flash timing profile (default: $TIMING_PROFILE or {DEFAULT_PROFILE})")
+    parser.add_argument("--read", choices=READ_MODES,
+                        help=f"flash read command (default: $READ_MODE or {DEFAULT_READ_MODE})")
+    parser.add_argument("--write-combine", action="store_true",
+                        help="merge adjacent WR_RES into one page program (default: $WRITE_COMBINE)")
+    parser.add_argument("--read-cache", action="store_true",
+                        help="2 line RD_KEY cache in mem_command_port (default: $READ_CACHE)")
+    parser.add_argument("--rebuild", action="store_true", help="ignore cached builds")
+    parser.add_argument("-t", "--testcase", help="run only this test (comma separated list)")
+    parser.add_argument("--seed", type=int, help="cocotb random seed")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="parallel processes (default: all cores, 1 runs in this process)")
+    parser.add_argument("--junit", default=str(TEST_DIR / "results.xml"),
+                        help="merged JUnit report (default: test/results.xml)")
+    parser.add_argument("--stress", type=int, metavar="SEEDS",
+                        help=f"seed-sharded {STRESS_TEST} regression over SEEDS seeds")
+    parser.add_argument("--first-seed", type=int, default=1, help="first stress seed (default 1)")
+    parser.add_argument("--stress-iterations", type=int, default=8,
+                        help="random_stress iterations per flow and seed (default 8)")
+    parser.add_argument("--keep", action="store_true", help="keep passing stress seed directories")
+    parser.add_argument("--trace", choices=("fst", "vcd"),
+                        help="trace build, waves in each test directory (default: untraced)")
+    parser.add_argument("--trace-scope", metavar="PATH",
+                        help="only trace below this hierarchy path, e.g. mem_vendor_test.top.spi")
+    parser.add_argument("--trace-window", type=int, metavar="CLOCKS",
+                        help="run untraced, replay failures traced with only the last CLOCKS "
+                             "clocks dumped (format from --trace, default fst)")
+    parser.add_argument("--list", action="store_true", help="list targets and exit")
+    args = parser.parse_args(argv)
+
+    if args.timing:
+        # read by build_config() and inherited by the test processes
+        os.environ["TIMING_PROFILE"] = args.timing
+    if args.read:
+        os.environ["READ_MODE"] = args.read
+    if args.write_combine:
+        os.environ["WRITE_COMBINE"] = "yes"
+    if args.read_cache:
+        os.environ["READ_CACHE"] = "yes"
+    try:
+        profile_name()
+        read_mode_name()
+    except ValueError as e:
+        parser.error(str(e))
+
+    trace = Trace(args.trace, args.trace_scope, args.trace_window)
+    # windowed mode: passing runs stay untraced, only failures are replayed with waves
+    run_trace = NO_TRACE if trace.window else trace
+
+    if args.stress:
+        records = run_stress(args.stress, args.jobs, args.first_seed, args.stress_iterations,
+                             args.vendor_flash, args.rebuild, args.keep, args.junit, trace)
+        return 1 if any(not r["passed"] for r in records) else 0
+
+    if args.list:
+        for name, t in TARGETS.items():
+            print(f"{name:<16}{t.toplevel:<20}{t.module}")
+        return 0
+
+    names = args.targets or DEFAULT_TARGETS
+    unknown = [n for n in names if n not in TARGETS]
+    if unknown:
+        parser.error(f"unknown target(s) {', '.join(unknown)}, see --list")
+
+    if args.jobs > 1 and len(names) > 1:
+        results = run_parallel(names, args.jobs, args.vendor_flash, args.rebuild,
+                               args.testcase, args.seed, run_trace)
+    else:
+        results = {name: run(name, args.vendor_flash, args.rebuild, args.testcase, args.seed,
+                             run_trace)
+                   for name in names}
+    merge_junit(results, args.junit)
+    if trace.window:
+        for name, (xml, _, fails) in results.items():
+            if fails and xml is not None:
+                replay_window(name, xml, xml.parent, trace, args.testcase,
+                              vendor_flash=args.vendor_flash)
+
+    failed = 0
+    for name, (_, tests, fails) in results.items():
+        print(f"{name:<16}{tests - fails}/{tests} passed")
+        failed += fails
+    print(f"JUnit report: {args.junit}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
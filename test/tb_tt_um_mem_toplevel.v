@@ -9,12 +9,23 @@
 
 module tb ();
 
-  // Dump the signals to a VCD file. You can view it with gtkwave or surfer.
+`ifdef TRACE
+  // Dump the signals to a VCD/FST file, trace builds only (make TRACE=fst|vcd).
+  // Dumping starts when test/trace_control.py raises trace_en.
+  // You can view it with gtkwave or surfer.
+  reg trace_en = 1'b0;
+
   initial begin
+`ifdef TRACE_FST
+    $dumpfile("tb.fst");
+`else
     $dumpfile("tb.vcd");
-    $dumpvars(0, tb);
+`endif
   end
 
+  always @(posedge trace_en) $dumpvars(0, tb);
+`endif
+
   // Wire up the inputs and outputs:
   reg clk;
   reg rst_n;
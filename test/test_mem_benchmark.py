@@ -0,0 +1,356 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# mem_top throughput benchmark.
+#
+# Runs the test_mem_top host flows (startup, then RD_KEY / RD_TEXT / WR_RES, and page sized
+# burst reads against the one block per command reads) as back-to-back streams of identical
+# transactions, once per host backpressure pattern in $BENCH_BACKPRESSURE
+# (comma separated backpressure.make_throttle() specs, default "none,bernoulli:0.5"), and
+# reports per case:
+#   clocks_per_txn      clocks between successive header starts (last one: until the dut is
+#                       idle again, for writes that includes the page program)
+#   host_bytes_per_clk  payload bytes moved on the host bus per clock
+#   qspi_busy           share of clocks with CS low
+#   qspi_data_share     share of SCLK cycles spent in a data phase
+#   frames / polls      QSPI frames and RDSR1 WIP polls per transaction
+#   stall_rate          share of cycles the host held VALID / READY low; stall_trace is the
+#                       exact pattern, BENCH_BACKPRESSURE=replay:<stall_trace> reruns it
+#   qspi_breakdown      clocks per transaction by QSPI phase (qspi_utilization.breakdown)
+#   savings             upper bounds of the clocks per transaction a faster SCLK, a 4-lane
+#                       address or no opcode gaps would save (qspi_utilization.savings)
+#   latency             host latency per flow of the case (common.LatencyMonitor)
+#
+# Results are written as JSON to $BENCH_JSON (default benchmark.json) so runs can be diffed
+# across RTL changes (mem_spi_controller divider, mem_txn_fsm states). With $BENCH_BASELINE
+# set to an earlier report the read and write cases are compared against it, e.g. the 0xEB
+# continuous read build against the 0x6B one (make benchmark_read_mode) or the write combining
+# build against one page program per WR_RES (make benchmark_write_combine) or the read cache
+# build on repeated key reads (make benchmark_read_cache).
+#
+# mem_top_divider_sweep sets each SCLK divider in $BENCH_DIVIDERS (default "2,3,4,6") with a
+# config write and reruns the cases without backpressure, reporting clocks and ns per
+# transaction, MB/s and the header to first / last byte latency of every flow, to
+# $BENCH_SWEEP_JSON (default benchmark_divider.json).
+
+import json
+import os
+import random
+
+import cocotb
+from cocotb.triggers import ClockCycles
+from cocotb.simtime import get_sim_time
+
+from flash_model import OPC_RDSR1
+from backpressure import make_throttle
+from qspi_utilization import CATEGORIES, breakdown, savings, format_breakdown
+from read_mode import read_mode_name
+from write_combine import write_combine_enabled
+from read_cache import read_cache_enabled
+from common import (
+    SCLK_DIVIDER_RESET, config_sclk_divider, LatencyMonitor, RD_KEY_AES_BYTES, RD_TEXT_AES_BYTES, RD_TEXT_SHA_BYTES, WR_AES_BYTES, WR_SHA_BYTES,
+    rd_key_aes_256b, rd_text_aes_128b, rd_text_sha_256b, wr_aes_generate_128b,
+    wr_sha_generate_256b, header_bytes, burst_header_bytes, resolve_path,
+)
+from test_mem_top import rst, setup_mem_top, wait_fsm_idle
+
+CLK_NS = 10
+TXNS_PER_CASE = int(os.environ.get("BENCH_TXNS", "8"))
+BENCH_JSON = os.environ.get("BENCH_JSON", "benchmark.json")
+BENCH_SEED = int(os.environ.get("BENCH_SEED", "1"))
+BENCH_BACKPRESSURE = os.environ.get("BENCH_BACKPRESSURE", "none,bernoulli:0.5").split(",")
+BENCH_BASELINE = os.environ.get("BENCH_BASELINE")
+BENCH_DIVIDERS = [int(d) for d in os.environ.get("BENCH_DIVIDERS", "2,3,4,6").split(",")]
+BENCH_SWEEP_JSON = os.environ.get("BENCH_SWEEP_JSON", "benchmark_divider.json")
+
+# name -> (header generator, payload bytes, is write, base address, burst blocks, same address)
+# burst cases read a page per command (header BURST bit), 0 blocks is one block per command;
+# same address cases repeat the first transaction (one key read again and again)
+CASES = {
+    "rd_key_aes_32B":    (rd_key_aes_256b,      RD_KEY_AES_BYTES,       False, 0x010000, 0,  False),
+    "rd_text_aes_16B":   (rd_text_aes_128b,     RD_TEXT_AES_BYTES,      False, 0x020000, 0,  False),
+    "rd_text_sha_32B":   (rd_text_sha_256b,     RD_TEXT_SHA_BYTES,      False, 0x030000, 0,  False),
+    "wr_aes_16B":        (wr_aes_generate_128b, WR_AES_BYTES,           True,  0x040000, 0,  False),
+    "wr_sha_32B":        (wr_sha_generate_256b, WR_SHA_BYTES,           True,  0x050000, 0,  False),
+    "burst_key_8x32B":   (rd_key_aes_256b,      8 * RD_KEY_AES_BYTES,   False, 0x060000, 8,  False),
+    "burst_text_16x16B": (rd_text_aes_128b,     16 * RD_TEXT_AES_BYTES, False, 0x070000, 16, False),
+    "rd_key_repeat_32B": (rd_key_aes_256b,      RD_KEY_AES_BYTES,       False, 0x080000, 0,  True),
+}
+
+
+def clocks_now():
+    return get_sim_time(unit="ns") / CLK_NS
+
+
+def qspi_stats(frames, t0, t1):
+    """CS low share, data share of SCLK cycles, frame and poll counts for frames in [t0, t1]."""
+    busy_ns = 0
+    sclk = 0
+    data_sclk = 0
+    polls = 0
+    for frame in frames:
+        busy_ns += min(frame.end, t1) - max(frame.start, t0)
+        sclk += frame.clocks
+        data_sclk += frame.data_clocks
+        polls += frame.opcode == OPC_RDSR1
+    return {
+        "qspi_busy": busy_ns / (t1 - t0) if t1 > t0 else 0.0,
+        "qspi_data_share": data_sclk / sclk if sclk else 0.0,
+        "frames": len(frames),
+        "polls": polls,
+    }
+
+
+async def run_case(dut, flash, bus, qspi, fsm_state, name, backpressure, bp_pass, divider):
+    gen, nbytes, write, base, blocks, same_addr = CASES[name]
+    throttle = make_throttle(backpressure)
+    payloads = [[random.randint(0, 255) for _ in range(nbytes)] for _ in range(TXNS_PER_CASE)]
+    # fresh (erased) pages for each backpressure pass
+    base += bp_pass * ((TXNS_PER_CASE * nbytes + 0xFFF) & ~0xFFF)
+    addrs = [base + i * nbytes for i in range(TXNS_PER_CASE)]
+    if same_addr:
+        addrs = addrs[:1] * TXNS_PER_CASE
+        payloads = payloads[:1] * TXNS_PER_CASE
+    if not write:
+        for addr, data in zip(addrs, payloads):
+            flash.backdoor.load(addr, data)
+
+    frames = qspi.subscribe()
+    latency = LatencyMonitor(dut, clk_ns=CLK_NS).start()
+    t0 = get_sim_time(unit="ns")
+    starts = []
+    for addr, data in zip(addrs, payloads):
+        starts.append(clocks_now())
+        if blocks:
+            await bus.driver.send_header(burst_header_bytes(gen(), addr, blocks))
+        else:
+            await bus.driver.send_header(header_bytes(gen(), addr))
+        if write:
+            await bus.driver.send(data, throttle=throttle)
+        else:
+            ack = cocotb.start_soon(bus.ack.expect_ack())
+            got = await bus.receiver.recv(nbytes, throttle=throttle)
+            await ack
+            assert got == data, f"{name} @ {addr:#08x}: expected {bytes(data).hex()} got {bytes(got).hex()}"
+    await wait_fsm_idle(dut, fsm_state)
+    t1 = get_sim_time(unit="ns")
+    qspi.unsubscribe(frames)
+    latency.stop()
+
+    if write:
+        for addr, data in zip(addrs, payloads):
+            got = flash.backdoor.dump(addr, nbytes)
+            assert list(got) == data, f"{name} @ {addr:#08x}: flash holds {bytes(got).hex()}"
+
+    per_txn = [b - a for a, b in zip(starts, starts[1:] + [t1 / CLK_NS])]
+    clocks = (t1 - t0) / CLK_NS
+    result = {
+        "case": name,
+        "backpressure": backpressure,
+        "txns": TXNS_PER_CASE,
+        "bytes_per_txn": nbytes,
+        "clocks": clocks,
+        "clocks_per_txn": clocks / TXNS_PER_CASE,
+        "clocks_per_txn_min": min(per_txn),
+        "clocks_per_txn_max": max(per_txn),
+        "host_bytes_per_clk": nbytes * TXNS_PER_CASE / clocks,
+        "stall_rate": throttle.stall_rate if throttle is not None else 0.0,
+        "stall_trace": throttle.trace_str() if throttle is not None else "",
+        "latency": latency.report(),
+    }
+    seen = []
+    while not frames.empty():
+        seen.append(frames.get_nowait())
+    stats = qspi_stats(seen, t0, t1)
+    result.update(qspi_busy=stats["qspi_busy"], qspi_data_share=stats["qspi_data_share"],
+                  frames_per_txn=stats["frames"] / TXNS_PER_CASE,
+                  polls_per_txn=stats["polls"] / TXNS_PER_CASE)
+    clocks_by_phase = breakdown(seen, t0, t1, CLK_NS, divider)
+    accounted = sum(clocks_by_phase[c] for c in CATEGORIES)
+    assert abs(accounted - clocks_by_phase["total"]) < 1e-6, \
+        f"{name}: QSPI breakdown covers {accounted} of {clocks_by_phase['total']} clocks"
+    result["qspi_breakdown"] = {k: v / TXNS_PER_CASE for k, v in clocks_by_phase.items()}
+    result["savings"] = {k: v / TXNS_PER_CASE
+                         for k, v in savings(clocks_by_phase, divider).items()}
+    return result
+
+
+def format_table(results):
+    lines = [f"{'case':<18}{'backpressure':<18}{'stall':>6}{'clk/txn':>10}{'min':>8}{'max':>8}"
+             f"{'B/clk':>8}{'cs busy':>9}{'data':>7}{'frames':>8}{'polls':>7}"]
+    for r in results:
+        bp = r['backpressure'] if len(r['backpressure']) <= 16 else r['backpressure'][:13] + "..."
+        lines.append(f"{r['case']:<18}{bp:<18}{r['stall_rate']:>6.2f}"
+                     f"{r['clocks_per_txn']:>10.1f}{r['clocks_per_txn_min']:>8.0f}"
+                     f"{r['clocks_per_txn_max']:>8.0f}{r['host_bytes_per_clk']:>8.3f}"
+                     f"{r['qspi_busy']:>9.2f}{r['qspi_data_share']:>7.2f}"
+                     f"{r['frames_per_txn']:>8.1f}{r['polls_per_txn']:>7.1f}")
+    return "\n".join(lines)
+
+
+def first_byte_p50(result):
+    """Median header to first byte clocks of a case, None without latency samples."""
+    for points in result.get("latency", {}).values():
+        if "first_byte" in points:
+            return points["first_byte"]["p50"]
+    return None
+
+
+def build_label(report):
+    """Read mode plus the build options of a report, e.g. 6b+wc+rc."""
+    label = report.get("read_mode", "6b")
+    if report.get("write_combine"):
+        label += "+wc"
+    if report.get("read_cache"):
+        label += "+rc"
+    return label
+
+
+def compare_cases(results, baseline, writes=False):
+    """Read (or write) cases of this run against the same case and backpressure in a baseline report."""
+    base = {(r["case"], r["backpressure"]): r for r in baseline["results"]}
+    rows = []
+    for r in results:
+        b = base.get((r["case"], r["backpressure"]))
+        if CASES[r["case"]][2] != writes or b is None:
+            continue
+        rows.append({
+            "case": r["case"],
+            "backpressure": r["backpressure"],
+            "baseline_clocks_per_txn": b["clocks_per_txn"],
+            "clocks_per_txn": r["clocks_per_txn"],
+            "speedup": b["clocks_per_txn"] / r["clocks_per_txn"],
+            "baseline_first_byte": first_byte_p50(b),
+            "first_byte": first_byte_p50(r),
+        })
+    return rows
+
+
+def format_comparison(rows, baseline_mode, mode):
+    lines = [f"{'case':<18}{'backpressure':<18}{baseline_mode:>10}{mode:>10}{'speedup':>9}"
+             f"{'1st byte':>10}{'1st byte':>10}"]
+    for r in rows:
+        bp = r['backpressure'] if len(r['backpressure']) <= 16 else r['backpressure'][:13] + "..."
+        first = [f"{c:>10.0f}" if c is not None else f"{'-':>10}"
+                 for c in (r.get('baseline_first_byte'), r.get('first_byte'))]
+        lines.append(f"{r['case']:<18}{bp:<18}{r['baseline_clocks_per_txn']:>10.1f}"
+                     f"{r['clocks_per_txn']:>10.1f}{r['speedup']:>9.2f}" + "".join(first))
+    return "\n".join(lines)
+
+
+def format_sweep(results):
+    lines = [f"{'divider':>7}{'sclk MHz':>10}  {'case':<18}{'clk/txn':>10}{'ns/txn':>10}"
+             f"{'MB/s':>8}"]
+    for r in results:
+        lines.append(f"{r['divider']:>7}{1000 / (2 * r['divider'] * CLK_NS):>10.1f}  "
+                     f"{r['case']:<18}{r['clocks_per_txn']:>10.1f}"
+                     f"{r['clocks_per_txn'] * CLK_NS:>10.0f}"
+                     f"{r['host_bytes_per_clk'] * 1000 / CLK_NS:>8.1f}")
+    return "\n".join(lines)
+
+
+async def start_bench(dut):
+    """setup_mem_top() at CLK_NS, then the startup sequence."""
+    random.seed(BENCH_SEED)
+    flash, bus, qspi = setup_mem_top(dut, CLK_NS)
+    await rst(dut, flash, qspi)
+    await ClockCycles(dut.clk, 10)
+    return flash, bus, qspi
+
+
+@cocotb.test(timeout_time=2000, timeout_unit='ms')
+async def mem_top_throughput(dut):
+    flash, bus, qspi = await start_bench(dut)
+    fsm_state = dut.top.fsm.state
+
+    divider = resolve_path(dut, "top.spi.divider")
+    sclk_divider = int(divider.value) if divider is not None else SCLK_DIVIDER_RESET
+    results = []
+    for bp_pass, backpressure in enumerate(BENCH_BACKPRESSURE):
+        for name in CASES:
+            results.append(await run_case(dut, flash, bus, qspi, fsm_state, name, backpressure,
+                                          bp_pass, sclk_divider))
+    assert not flash.errors, f"Flash model reported errors: {flash.errors}"
+
+    report = {
+        "toplevel": "mem_vendor_test",
+        "clk_ns": CLK_NS,
+        "divider": int(divider.value) if divider is not None else None,
+        "seed": BENCH_SEED,
+        "read_mode": read_mode_name(),
+        "write_combine": write_combine_enabled(),
+        "read_cache": read_cache_enabled(),
+        "results": results,
+    }
+    if BENCH_BASELINE:
+        with open(BENCH_BASELINE) as f:
+            baseline = json.load(f)
+        report["baseline"] = {"file": BENCH_BASELINE,
+                              "build": build_label(baseline),
+                              "read_mode": baseline.get("read_mode", "6b"),
+                              "write_combine": baseline.get("write_combine", False),
+                              "read_cache": baseline.get("read_cache", False),
+                              "reads": compare_cases(results, baseline),
+                              "writes": compare_cases(results, baseline, writes=True)}
+    with open(BENCH_JSON, "w") as f:
+        json.dump(report, f, indent=2)
+    dut._log.info("Throughput benchmark\n" + format_table(results))
+    for backpressure in BENCH_BACKPRESSURE:
+        rows = [r for r in results if r["backpressure"] == backpressure]
+        dut._log.info(f"QSPI clocks per transaction, backpressure {backpressure}\n"
+                      + format_breakdown([(r["case"], r["qspi_breakdown"]) for r in rows]))
+    for r in results[:len(CASES)]:
+        ranked = sorted(r["savings"].items(), key=lambda kv: -kv[1])
+        dut._log.info(f"{r['case']}: saves up to "
+                      + ", ".join(f"{k} {v:.0f}" for k, v in ranked) + " clocks per transaction")
+    if BENCH_BASELINE:
+        dut._log.info(f"Read clocks per transaction against {BENCH_BASELINE}\n"
+                      + format_comparison(report["baseline"]["reads"],
+                                          report["baseline"]["build"], build_label(report)))
+        dut._log.info(f"Write clocks per transaction against {BENCH_BASELINE}\n"
+                      + format_comparison(report["baseline"]["writes"],
+                                          report["baseline"]["build"], build_label(report)))
+    dut._log.info(f"Results written to {os.path.abspath(BENCH_JSON)}")
+
+
+@cocotb.test(timeout_time=4000, timeout_unit='ms')
+async def mem_top_divider_sweep(dut):
+    flash, bus, qspi = await start_bench(dut)
+    fsm_state = dut.top.fsm.state
+    divider = dut.top.spi.divider
+
+    results = []
+    monitors = {}
+    for sweep_pass, sclk_divider in enumerate(BENCH_DIVIDERS):
+        # the controller takes the new divider between frames, the fsm is idle here
+        await bus.driver.send_header(config_sclk_divider(sclk_divider))
+        await ClockCycles(dut.clk, 10)
+        assert int(divider.value) == sclk_divider, \
+            f"SCLK divider {int(divider.value)} after the config write of {sclk_divider}"
+        monitor = LatencyMonitor(dut, clk_ns=CLK_NS).start()
+        for name in CASES:
+            result = await run_case(dut, flash, bus, qspi, fsm_state, name, "none",
+                                    sweep_pass, sclk_divider)
+            results.append({"divider": sclk_divider, **result})
+        monitor.stop()
+        assert not monitor.dropped, f"divider {sclk_divider}: {monitor.dropped} transactions never completed"
+        monitors[sclk_divider] = monitor
+    assert not flash.errors, f"Flash model reported errors: {flash.errors}"
+
+    report = {
+        "toplevel": "mem_vendor_test",
+        "clk_ns": CLK_NS,
+        "seed": BENCH_SEED,
+        "read_mode": read_mode_name(),
+        "write_combine": write_combine_enabled(),
+        "read_cache": read_cache_enabled(),
+        "dividers": BENCH_DIVIDERS,
+        "results": results,
+        "latency": {d: m.report() for d, m in monitors.items()},
+    }
+    with open(BENCH_SWEEP_JSON, "w") as f:
+        json.dump(report, f, indent=2)
+    dut._log.info("SCLK divider sweep\n" + format_sweep(results))
+    for sclk_divider, monitor in monitors.items():
+        dut._log.info(f"Latency in clocks, divider {sclk_divider}\n" + monitor.format_table())
+    dut._log.info(f"Results written to {os.path.abspath(BENCH_SWEEP_JSON)}")
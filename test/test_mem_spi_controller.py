@@ -24,24 +24,40 @@ async def SPI_no_addr(dut):
     dut._log.info(f"[{t} ns] Opcode {opcode:#02x}")
     return opcode
 
-async def SPI_opcode_addr(dut):
-    # Get opcode with addr
+async def SPI_opcode_addr(dut, quad_addr=False):
+    # Get opcode with addr, opcode always on IO0, addr on IO0 or on all 4 lanes (0xEB)
     dut._log.info("Opcode Addr Sample")
     await FallingEdge(dut.out_cs_n)
     data = [] 
-    for _ in range(4):
+    for i in range(4):
+        quad = quad_addr and i > 0
         byte = 0
-        for _ in range(8):
+        for _ in range(2 if quad else 8):
             await FallingEdge(dut.out_sclk)
             await RisingEdge(dut.out_sclk)
+            if quad:
+                byte = (byte << 4) | (int(dut.out_io.value) & 0xf)
+                assert int(dut.io_ena.value) == 0b1111, f"uio_oe expected 0b1111 got {int(dut.io_ena.value):#06b}"
+                continue
             byte = (byte << 1) | int(int(dut.out_io.value) & 0b0001)
             if(dut.qed.value == 0):
                 assert int(dut.io_ena.value) == 0b1101, f"uio_oe expected 0b1101 got {int(dut.io_ena.value):#04b}"
             else:
-                assert int(dut.io_ena.value) == 0b0001, f"uio_oe expected 0b1101 got {int(dut.io_ena.value):#04b}"
+                assert int(dut.io_ena.value) == 0b0001, f"uio_oe expected 0b0001 got {int(dut.io_ena.value):#04b}"
         data.append(byte)
     return data
 
+def header_sclks(quad_addr):
+    # SCLK cycles of opcode + 24 bit address
+    return 8 + (6 if quad_addr else 24)
+
+async def header_clocks(dut):
+    # clk cycles from CS low to the first read byte handed to the fsm
+    await FallingEdge(dut.out_cs_n)
+    t0 = get_sim_time(unit='ns')
+    await RisingEdge(dut.out_rx_valid)
+    return (get_sim_time(unit='ns') - t0) / 10
+
 async def check_qspi_idle(dut, cycles=10):
     """ 
     Expect io_ena   after out_cs_n high
@@ -125,10 +141,10 @@ async def get_data(dut):
     # dut._log.info(f"[{t} ns] data from dut {int(dut.out_rx_data.value):#08b}")
     return int(dut.out_rx_data.value)
 
-async def quad_out_sample(dut):
+async def quad_out_sample(dut, quad_addr=False):
     dut._log.info("Quad Output Sample Start")  
     await FallingEdge(dut.out_cs_n)
-    for _ in range(8+24):
+    for _ in range(header_sclks(quad_addr)):
         await FallingEdge(dut.out_sclk)
         await RisingEdge(dut.out_sclk)
     data=[] 
@@ -140,6 +156,8 @@ async def quad_out_sample(dut):
             
             byte = (byte << 4) | (int(dut.out_io.value) & 0xf)
             await RisingEdge(dut.out_sclk)
+            # all 4 lanes driven for the data
+            assert int(dut.io_ena.value) == 0b1111, f"uio_oe expected 0b1111 got {int(dut.io_ena.value):#06b}"
         t = get_sim_time(unit='ns')
         dut._log.info(f" byte {i+1} sent @ [{t} ns]")
         data.append(byte)
@@ -161,8 +179,8 @@ async def send_byte(dut, val, timeout_cycles=2000):
     await RisingEdge(dut.clk)
     dut.in_tx_valid.value = 0
 
-async def header_addr(dut,data):
-    # send header: 8'opcode + 24'addr
+async def header_addr(dut,data,quad_addr=False):
+    # send header: 8'opcode + 24'addr, addr on 4 lanes with quad_addr
     dut._log.info("Header Addr Start")   
     # input wire in_start, //start the transaction
     # input wire r_w, //1 is read, 0 is write
@@ -184,6 +202,11 @@ async def header_addr(dut,data):
         await RisingEdge(dut.clk)
         if dut.out_tx_ready.value == 1:
             i += 1
+            if i == 1 and quad_addr:
+                # quad_enable is not latched per byte, switch lanes once the opcode is out
+                dut.in_tx_valid.value = 0
+                await RisingEdge(dut.out_done)
+                dut.quad_enable.value = 1
 
     dut.in_tx_valid.value = 0 
     dut._log.info("Header Addr Complete")
@@ -217,11 +240,11 @@ async def quad_out(dut,data):
     await RisingEdge(dut.clk)
     dut._log.info("Quad Output Complete")  
 
-async def quad_in(dut,data):
+async def quad_in(dut,data,quad_addr=False):
     # qspi quad input, dut sample on falling edge
     dut._log.info("Quad Input Start")   
     await FallingEdge(dut.out_cs_n)
-    for _ in range(8+24):
+    for _ in range(header_sclks(quad_addr)):
         await RisingEdge(dut.out_sclk)
     a = 1
     for i in data:
@@ -247,12 +270,35 @@ async def spi(dut):
     await wr_wr_do_do(dut)
     await wr_rd_do_io_in(dut)
     await wr_wr_do_io_in(dut)
+    await wr_rd_do_io_in(dut, quad_addr=True)
+    # lane muxing of the controller only: the W25Q128JV has no write with a 4 lane address
+    # (0x32 keeps it on IO0), so this frame matches no real flash command
+    await wr_wr_do_io_in(dut, quad_addr=True)
     await check_qspi_idle(dut)
     dut._log.info("SPI Done")
 
+@cocotb.test(timeout_time= 100,timeout_unit='us')
+async def spi_quad_addr_cycles(dut):
+    # same read with the address on IO0 (0x6B) and on 4 lanes (0xEB): the 4 lane address
+    # saves 18 SCLK cycles, 2 * DIVIDER clk each, and nothing else changes
+    dut._log.info("SPI Quad Addr Cycles Start")
+    cocotb.start_soon(Clock(dut.clk, 10, 'ns').start())
+    # spi left qed set, rst checks the standard spi pins
+    dut.qed.value = 0
+    await rst(dut)
+    single = await wr_rd_do_io_in(dut)
+    quad = await wr_rd_do_io_in(dut, quad_addr=True)
+    divider = int(dut.divider.value)
+    saved = (header_sclks(False) - header_sclks(True)) * 2 * divider
+    dut._log.info(f"CS low to first byte: 1 lane addr {single:.0f} clk, 4 lane addr {quad:.0f} clk")
+    assert single - quad == saved, f"4 lane addr saved {single - quad:.0f} clk, expected {saved}"
+    dut._log.info("SPI Quad Addr Cycles Done")
+
 async def rst(dut):
     dut._log.info("Reset Start")
 
+    # SCLK divider of mem_top after reset (mem_command_port SCLK_DIVIDER)
+    dut.in_divider.value = 3
     await RisingEdge(dut.clk)
     dut.rst_n.value = 1
     await RisingEdge(dut.clk)
@@ -351,16 +397,18 @@ async def wr_wr_do_do(dut):
     await RisingEdge(dut.clk)      
     dut._log.info("Sinlge Pin WR WR Done")
 
-async def wr_rd_do_io_in(dut):
-    # 8+24 single pin output + 8 dummy + 
+async def wr_rd_do_io_in(dut, quad_addr=False):
+    # 8+24 single pin output (8+6 with the 4 lane addr) + quad input, returns the clk
+    # cycles from CS low to the first byte
     dut._log.info("Single Pin Opcode Quad Input Start")
     header = [random.randint(0,255), 0x65,0x43,0x21]
     data = [random.randint(0, 255) for _ in range(8)]
     
-    header_task = cocotb.start_soon(SPI_opcode_addr(dut))
-    quad_in_task = cocotb.start_soon(quad_in(dut,data))
+    header_task = cocotb.start_soon(SPI_opcode_addr(dut, quad_addr))
+    quad_in_task = cocotb.start_soon(quad_in(dut,data,quad_addr))
+    clocks_task = cocotb.start_soon(header_clocks(dut))
 
-    await header_addr(dut,header)
+    await header_addr(dut,header,quad_addr)
     got_header = await header_task
 
     dut.in_start.value = 1
@@ -392,17 +440,18 @@ async def wr_rd_do_io_in(dut):
 
 
     dut._log.info("Single Pin Opcode Quad Input Done")
+    return await clocks_task
 
-async def wr_wr_do_io_in(dut):
+async def wr_wr_do_io_in(dut, quad_addr=False):
     dut._log.info("Single Pin Opcode Quad Output Start")
     # shift opcode + write sr with 1 byte data
     # assume no back pressure
     header = [random.randint(0,255), 0x65,0x43,0x21]
     data = [random.randint(0, 255) for _ in range(8)]
 
-    header_task = cocotb.start_soon(SPI_opcode_addr(dut))
-    qo_sample_task = cocotb.start_soon(quad_out_sample(dut))
-    await header_addr(dut,header)
+    header_task = cocotb.start_soon(SPI_opcode_addr(dut, quad_addr))
+    qo_sample_task = cocotb.start_soon(quad_out_sample(dut, quad_addr))
+    await header_addr(dut,header,quad_addr)
     got_header = await header_task
 
     await quad_out(dut,data)
@@ -72,6 +72,18 @@
 #    - Host ready/valid randomized each byte. QSPI pins ONLY driven by mem.
 #    - Pass if no mismatches and vendor model reports no errors.
 
+# 6.1) Write combining stress (WRITE_COMBINE build merges, default build does not)
+#    - Fill whole pages with back to back 16B/32B WR_RES at consecutive addresses,
+#      now and then a read or an idle gap longer than the hold timeout in between.
+#    - Expect: every 0x32 frame carries the writes since the last page start, read or
+#      timeout (one frame per WR_RES without WRITE_COMBINE), flash and read back match.
+
+# 6.2) Read cache hit/miss (READ_CACHE build hits, default build always misses)
+#    - RD_KEY at more key addresses than cache lines (one unaligned), RD_TEXT of the same
+#      bytes and WR_RES over some of them, in random order.
+#    - Expect: host data always matches the flash, a RD_KEY without a QSPI read frame is a
+#      hit, hit and miss counts equal read_cache.ReadCacheModel.
+
 # 7) Full smoke test (startup + normal ops)
 #    - Reset, let startup FSM finish (reuse test 1 checks).
 #    - Then:
@@ -115,7 +127,7 @@
 # 
 #  To tt output ctrl
 #  uio_oe[3:0]
-import cocotb,random
+import cocotb,random,os
 from cocotb.clock import Clock
 from cocotb.triggers import (
     RisingEdge,
@@ -127,195 +139,256 @@ from cocotb.triggers import (
 )
 from cocotb.simtime import get_sim_time
 from cocotb.types import Logic
+from flash_model import W25Q128Model, OPC_MODE_RESET, XIP_MODE
+from qspi_monitor import QspiMonitor
+from trace_control import start_trace
+from timing_profiles import current_profile
+from read_mode import current_read_mode
+from write_combine import WC_HOLD, write_combine_enabled
+from read_cache import ReadCacheModel
+from txn_fsm_model import IDLE
+from backpressure import make_throttle
+from common import (
+    RD_KEY_AES_BYTES, RD_TEXT_AES_BYTES, RD_TEXT_SHA_BYTES, WR_AES_BYTES, WR_SHA_BYTES,
+    rd_key_aes_256b, rd_text_aes_128b, rd_text_sha_256b, wr_aes_generate_128b,
+    wr_sha_generate_256b, invalid, randomized_data, err_watchdog, header_bytes,
+    burst_header_bytes, HostBus, LatencyMonitor,
+)
 
-RD_DUMMY = 8
+# flash read command of the build (read_mode.py): 0x6B, or 0xEB in continuous read mode
+READ_MODE = current_read_mode()
+FLASH_READ = READ_MODE.opcode
+RD_DUMMY = READ_MODE.dummy_clocks
+# WRITE_COMBINE build (write_combine.py): adjacent WR_RES in a page share one page program
+WRITE_COMBINE = write_combine_enabled()
 
 NUM_PAGES = 65536
 PAGESIZE  = 256
 FLASH_BYTES = NUM_PAGES * PAGESIZE  # 16,777,216
 MAX_POLLS = 1024 # arbitrarily from rolling dice
 
-RD_KEY_AES_BYTES = 32
-RD_TEXT_AES_BYTES = 16
-RD_TEXT_SHA_BYTES = 32
-
-WR_AES_BYTES = 16
-WR_SHA_BYTES = 32
-
 KEY_BASE  = 0x000300
 
-def rd_key_aes_256b():
-    enc   = random.randint(0,1)
-    src   = 0b10        # AES
-    dest  = 0b00        # MEM
-    opcode = 0b00       # RD_KEY
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def rd_text_aes_128b():
-    enc   = random.randint(0,1)
-    src   = 0b10
-    dest  = 0b00
-    opcode = 0b01       # RD_TEXT
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def rd_text_sha_256b():
-    enc   = 0            # SHA ignores enc/dec
-    src   = 0b01         # SHA
-    dest  = 0b00         # MEM
-    opcode = 0b01        # RD_TEXT
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def wr_aes_generate_128b():
-    enc = random.randint(0,1)
-    src = 0b00                          
-    dest = 0b10
-    opcode = 0b10                       # WR_RES
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def wr_sha_generate_256b():
-    enc = random.randint(0,1)
-    src = 0b00                         
-    dest = 0b01
-    opcode = 0b10                       # WR_RES
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def invalid():
-    enc = random.randint(0,1)
-    reserved = 0
-    opcode = 11
-    dest  = random.choice([0b01, 0b10, 0b11])
-    src   = random.choice([0b00, 0b11])
-    return (enc<<7)|(reserved<<6)|(dest<<4)|(src<<2)|opcode
-
-def randomized_data():
-    data = random.randint(0,255)
-    return data
+# clock period of the tests, ns (100 MHz)
+CLK_NS = 10
+
+# flash model checkpoints of full_smoke: right after the startup sequence and at the end
+STARTUP_SNAPSHOT = os.path.join("sim_build", "flash_startup.img")
+END_SNAPSHOT = os.path.join("sim_build", "flash_end.img")
+
+# iterations per flow of random_stress (seed-sharded regression: runner.py --stress)
+STRESS_ITERATIONS = int(os.environ.get("STRESS_ITERATIONS", "8"))
+# host VALID/READY stall pattern of random_stress, a backpressure.make_throttle() spec
+STRESS_BACKPRESSURE = os.environ.get("STRESS_BACKPRESSURE", "bernoulli:0.5")
+# pages filled by write_combine_stress
+WC_PAGES = int(os.environ.get("WC_PAGES", "4"))
+# per flow latency histograms of a test go to sim_build/latency_<test>.json (removed by clean)
+LATENCY_JSON = os.path.join("sim_build", "latency_{}.json")
+
+def report_latency(dut, latency, test):
+    path = LATENCY_JSON.format(test)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    latency.write_json(path)
+    dut._log.info(f"Host latency (clocks after header accept), {latency.dropped} dropped\n"
+                  + latency.format_table())
+    dut._log.info(f"Latency histograms written to {os.path.abspath(path)}")
+
+def setup_mem_top(dut, clk_ns=CLK_NS, watchdog=True):
+    """Clock, trace, flash model, host bus and QSPI monitor (and err watchdog) before rst."""
+    cocotb.start_soon(Clock(dut.clk, clk_ns, "ns").start())
+    start_trace(dut)
+    # python flash model on the QSPI pins
+    flash = W25Q128Model(dut)
+    flash.start()
+    bus = HostBus(dut)
+    # frame level QSPI monitor shared by the checkers
+    qspi = QspiMonitor(dut)
+    qspi.start()
+    if watchdog:
+        cocotb.start_soon(err_watchdog(dut, "err", state="top.fsm.state"))
+    return flash, bus, qspi
 
 @cocotb.test(timeout_time= 500,timeout_unit='ms')
 async def mem_top(dut):
     dut._log.info("Mem Module Level Start")
 
-    # Set the clock period to 10 ns (100 MHz)
-    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
-    await full_smoke(dut)
+    # full_smoke resets and watches err itself
+    flash, bus, qspi = setup_mem_top(dut, watchdog=False)
+    latency = LatencyMonitor(dut).start()
+    await full_smoke(dut, flash, bus, qspi)
+    assert not flash.errors, f"Flash model reported errors: {flash.errors}"
+    if READ_MODE.quad_address:
+        # back to back reads (burst_read) stay in continuous read mode
+        assert flash.xip_reads, "No continuous read mode frames without opcode"
+        dut._log.info(f"{flash.xip_reads} continuous read mode frames")
+    report_latency(dut, latency, "mem_top")
 
     dut._log.info("Mem Module Level Pass")
 
 
-async def SPI_no_addr(dut):
-        # Get opcode without addr
-        dut._log.info("SPI Opcode Collect")
-        await FallingEdge(dut.CS)
-        opcode = 0x00   
-        for _ in range(8):
-            await FallingEdge(dut.SCLK)
-            await RisingEdge(dut.SCLK)
-            opcode = (opcode << 1) | int(dut.IO0.value)
-        t = get_sim_time(units="ns")
-        dut._log.info(f"[{t} ns] Opcode {opcode:#02x}")
-        return opcode
-
-async def SPI_no_addr_no_print(dut):
-        # Get opcode without addr
-        await FallingEdge(dut.CS)
-        opcode = 0x00   
-        for _ in range(8):
-            await FallingEdge(dut.SCLK)
-            await RisingEdge(dut.SCLK)
-            opcode = (opcode << 1) | int(dut.IO0.value)
-        return opcode
-
-async def timeout_monitor(dut):
-    while True:
-        await RisingEdge(dut.clk)
+@cocotb.test(timeout_time= 500,timeout_unit='ms')
+async def mem_top_random_stress(dut):
+    # startup + random_stress only, one seed per run of the seed-sharded regression
+    flash, bus, qspi = setup_mem_top(dut)
+    await rst(dut, flash, qspi)
+    latency = LatencyMonitor(dut).start()
+    await random_stress(dut, flash, bus, STRESS_ITERATIONS, STRESS_BACKPRESSURE)
+    assert not flash.errors, f"Flash model reported errors: {flash.errors}"
+    # every stress transaction completes: 3 flows x iterations, reads and writes
+    assert not latency.dropped, f"{latency.dropped} transactions never completed"
+    done = sum(len(h["last_byte"]) for h in latency.samples.values())
+    assert done == 5 * STRESS_ITERATIONS, f"Latency monitor saw {done} of {5 * STRESS_ITERATIONS} transactions"
+    report_latency(dut, latency, "mem_top_random_stress")
 
-        # Wait until reset is a known 1
-        if (not dut.rst_n.value.is_resolvable) or int(dut.rst_n.value) == 0:
-            continue
 
-        # Ignore unknown err (X/Z) during settle
-        if not dut.err.value.is_resolvable:
-            continue
+@cocotb.test(timeout_time= 500,timeout_unit='ms')
+async def mem_top_write_combine(dut):
+    # startup + write_combine_stress, in both builds (runner.py mem_top --write-combine)
+    flash, bus, qspi = setup_mem_top(dut)
+    await rst(dut, flash, qspi)
+    await write_combine_stress(dut, flash, bus, qspi, WC_PAGES)
+    assert not flash.errors, f"Flash model reported errors: {flash.errors}"
 
-        assert int(dut.err.value) == 0, "Timeout Triggered"
-
-async def SPI_addr(dut):
-        # not used
-        # Get opcode with addr
-        dut._log.info("SPI Opcode Collect")
-        await FallingEdge(dut.CS)
-        opcode = 0x00   
-        for _ in range(8):
-            await RisingEdge(dut.SCLK)
-            opcode = (opcode << 1) | int(dut.IO0.value)
-        t = get_sim_time(units="ns")
-        dut._log.info(f"[{t} ns] Opcode {opcode:#02x}")
-
-        addr = 0
-        for _ in range(24):
-            await RisingEdge(dut.SCLK)
-            addr = (addr << 1) | int(dut.IO0.value)
-
-        # Timestamp
-        t = get_sim_time(units="ns")
-        dut._log.info(f"[{t} ns] Opcode = 0x{opcode:02X}, Addr = 0x{addr:06X}") 
-        return opcode, addr
-
-async def opcode_monitor(dut, opcode_log):
-    # not used
-    """Runs forever, logging the first opcode byte of each SPI transaction."""
+
+@cocotb.test(timeout_time= 500,timeout_unit='ms')
+async def mem_top_read_cache(dut):
+    # startup + read_cache_hit_miss, in both builds (runner.py mem_top --read-cache)
+    flash, bus, qspi = setup_mem_top(dut)
+    await rst(dut, flash, qspi)
+    await read_cache_hit_miss(dut, flash, bus, qspi)
+    assert not flash.errors, f"Flash model reported errors: {flash.errors}"
+
+
+@cocotb.test(timeout_time= 500,timeout_unit='ms')
+async def mem_top_wip_timing(dut):
+    # WIP waits against the timing profile ($TIMING_PROFILE, timing_profiles.py): power on
+    # wait before the first command, only RDSR1 while a page program is busy, WIP clear seen
+    # within one poll interval. runner.py --timing datasheet-typ|datasheet-max for real delays.
+    timing = current_profile().fsm
+    flash, bus, qspi = setup_mem_top(dut, CLK_NS)
+
+    startup = qspi.subscribe()
+    await rst(dut, flash, qspi)
+    first = startup.get_nowait()
+    qspi.unsubscribe(startup)
+    assert first.start >= timing["power_on"] * CLK_NS, \
+        f"First command at {first.start} ns, before the {timing['power_on']} clock power on wait"
+
+    # write, then read it back: the read is the command that waits for WIP
+    addr = 0x020000
+    data = [randomized_data() for _ in range(WR_AES_BYTES)]
+    frames = qspi.subscribe()
+    await bus.driver.send_header(header_bytes(wr_aes_generate_128b(), addr))
+    await bus.driver.send(data)
+    t_read = get_sim_time(unit="ns")
+    await bus.driver.send_header(header_bytes(rd_text_aes_128b(), addr))
+    ack = cocotb.start_soon(bus.ack.expect_ack())
+    got = await bus.receiver.recv(RD_TEXT_AES_BYTES)
+    await ack
+    assert got == data, f"Read back {bytes(got).hex()} expected {bytes(data).hex()}"
+    qspi.unsubscribe(frames)
+
+    seen = []
+    while not frames.empty():
+        seen.append(frames.get_nowait())
+    program = next(i for i, f in enumerate(seen) if f.opcode == 0x32)
+    read = next(i for i, f in enumerate(seen) if f.opcode == FLASH_READ)
+    busy_end = seen[program].end + flash.t_page_program_ns
+    # only status polls while the page program is busy
+    for frame in seen[program + 1:read]:
+        assert frame.opcode == 0x05, \
+            f"Opcode {frame.opcode:#04x} at {frame.start} ns while page program busy until {busy_end} ns"
+    assert seen[read].start >= busy_end, \
+        f"Read at {seen[read].start} ns while page program busy until {busy_end} ns"
+    # WIP clear noticed within one poll interval (plus the poll frames and gaps)
+    poll = seen[read - 1]
+    late = seen[read].start - max(busy_end, t_read)
+    slack = timing["page_program"] * CLK_NS + 3 * (poll.end - poll.start) + 200
+    assert late <= slack, f"Read started {late} ns after WIP cleared, expected <= {slack} ns"
+    dut._log.info(f"Page program {flash.t_page_program_ns} ns, {read - program - 1} polls, "
+                  f"read {late} ns after WIP cleared")
+
+    # busy fast paths: model and monitor must still agree on every poll
+    assert qspi.polls == flash.polls, f"Monitor saw {qspi.polls} RDSR1 polls, flash {flash.polls}"
+    assert not flash.errors, f"Flash model reported errors: {flash.errors}"
+
+
+async def snapshot_round_trip(dut, flash):
+    """Restore the startup checkpoint (erased, QE set), then the end state taken just before."""
+    image = flash.memory.read(0, FLASH_BYTES)
+    sr2, xip = flash.sr2, flash.xip
+    flash.save_snapshot(END_SNAPSHOT)
+
+    flash.restore_snapshot(STARTUP_SNAPSHOT)
+    await check_flash_erased(dut, flash)
+    assert flash.quad_enabled and not flash.xip, "Startup checkpoint: QE clear or in continuous read mode"
+
+    flash.restore_snapshot(END_SNAPSHOT)
+    assert flash.memory.read(0, FLASH_BYTES) == image, "Flash array differs after restoring the end checkpoint"
+    assert (flash.sr2, flash.xip) == (sr2, xip), \
+        f"Restored sr2/xip {flash.sr2:#04x}/{flash.xip}, saved {sr2:#04x}/{xip}"
+    dut._log.info("Snapshot round trip PASSED.")
+
+async def check_flash_erased(dut, flash):
+    """Assert that every byte in the flash model is 0xFF."""
+    dut._log.info("Checking full flash array erased...")
+
+    ranges = flash.memory.diff(0, 0xFF)
+    assert not ranges, "Flash not erased, first mismatching ranges:\n" + \
+        flash.memory.describe_diff(ranges, 0xFF)
+
+    dut._log.info("Erase check PASSED.")
+
+async def wait_fsm_idle(dut, fsm_state, timeout_cycles=100_000):
+    # writes finish inside the dut (page program + WIP polls) after the host is done
+    clk_rise = RisingEdge(dut.clk)
+    for _ in range(timeout_cycles):
+        if int(fsm_state.value) == IDLE and dut.CS.value == 1:
+            return
+        await clk_rise
+    raise AssertionError(f"mem_txn_fsm not idle after {timeout_cycles} clocks")
+
+
+async def next_frame_after_polls(frames, log=None):
+    """Next QSPI frame that is not an RDSR1 (0x05) WIP poll or a continuous read mode reset (0xFF)."""
     while True:
-        # Wait for transaction start
-        await FallingEdge(dut.CS)
-
-        # Wait 8 bits of opcode on IO0 (mode 0, sample at rising)
-        opcode = 0
-        for _ in range(8):
-            await FallingEdge(dut.SCLK)
-            await RisingEdge(dut.SCLK)
-            bit = int(dut.IO0.value)
-            opcode = (opcode << 1) | bit
-
-        opcode_log.append(opcode)
-
-        # Now wait for CS to go high again (end of transaction)
-        await RisingEdge(dut.CS)
-
-async def check_flash_erased(dut, flash,samples=1024):
-    """Assert that every byte in the vendor model is 0xFF."""
-    dut._log.info(f"Checking flash erased with {samples} samples...")
-
-    size = 65536 * 256  # 16,777,216
-
-    for _ in range(samples):
-        addr = random.randrange(size)
-        val = int(flash.memory[addr].value)
-        val = int(flash.memory[addr].value)
-        assert val == 0xFF, f"Flash not erased: memory[{addr:#08x}] = {val:#04x}, expected 0xFF"
-
-    dut._log.info("Sample erase check PASSED.")
-
-async def preload_key_region(dut, data, base_addr):
-    """Write RD_KEY_AES_BYTES[] into the vendor flash model at base_addr."""
-    dut._log.info(f"Preloading key region at 0x{base_addr:06x}")
-    for i in range(len(data)):
-        dut.flash.memory[base_addr + i].value = data[i]
-    # small delay to let simulator settle
-    await Timer(1, "ns")
-    # for i in range(32):
-    #     got = dut.flash.memory[base_addr+i].value.to_unsigned()
-
-async def expect_ack(dut):
-        await RisingEdge(dut.ACK_VALID)
-        assert int(dut.MODULE_SOURCE_ID.value) & 0b11 == 0b00,f"MODULE_SOURCE_ID expect 0b00 got {int(dut.MODULE_SOURCE_ID.value) & 0b11:#02b}"
-        dut.ACK_READY.value = 1
-        await FallingEdge(dut.ACK_VALID)
-        dut.ACK_READY.value = 0  
-
-async def expect_no_ack(dut,cycle = 1000):
-    for _ in range(cycle):
-        assert dut.ACK_VALID.value == 0, f"ACK_VALID expect 0 got {dut.ACK_VALID.value}"
-        await RisingEdge(dut.clk)
+        frame = await frames.get()
+        if log is not None:
+            log.info(str(frame))
+        if frame.opcode not in (0x05, OPC_MODE_RESET):
+            return frame
+
+def check_quad_write_frame(frame, addr, data):
+    assert frame.opcode == 0x32, f"Opcode expected 0x32 got {frame.opcode:#04x}"
+    assert frame.addr == addr, f"Page program addr expected {addr:#08x} got {frame.addr:#08x}"
+    for oe in frame.opcode_oe + frame.addr_oe:
+        assert oe == 0b0001, f"uio_oe[3:0] expect 0b0001 got {oe:#06b}"
+    # QSPI Output
+    assert len(frame.data_oe) == len(data) * 2, \
+        f"Quad write expected {len(data) * 2} data clocks got {len(frame.data_oe)}"
+    for oe in frame.data_oe:
+        assert oe == 0b1111, f"uio_oe[3:0] expect 0b1111 got {oe:#06b}"
+    assert list(frame.data) == list(data), f"Quad write data mismatch: {frame.data.hex()}"
+
+def check_quad_read_frame(frame, addr, length):
+    assert frame.opcode == FLASH_READ, f"Opcode expected {FLASH_READ:#04x} got {frame.opcode:#04x}"
+    assert frame.addr == addr, f"Quad read addr expected {addr:#08x} got {frame.addr:#08x}"
+    # continuous read frames (0xEB after an 0xEB) have no opcode phase
+    for oe in frame.opcode_oe:
+        assert oe == 0b0001, f"uio_oe[3:0] expect 0b0001 got {oe:#06b}"
+    addr_oe = 0b1111 if READ_MODE.quad_address else 0b0001
+    for oe in frame.addr_oe + frame.mode_oe:
+        assert oe == addr_oe, f"uio_oe[3:0] expect {addr_oe:#06b} got {oe:#06b}"
+    if READ_MODE.quad_address:
+        assert frame.mode == XIP_MODE, f"Mode bits expected {XIP_MODE:#04x} got {frame.mode}"
+    # dummy
+    assert frame.dummy == RD_DUMMY
+    for oe in frame.dummy_oe:
+        assert oe == 0b0000, f"uio_oe[3:0] expect 0b0000 got {oe:#06b}"
+    # QSPI Input
+    assert len(frame.data) >= length, f"Quad read expected {length} bytes got {len(frame.data)}"
+    for oe in frame.data_oe:
+        assert oe == 0b0000, f"uio_oe[3:0] expect 0b0000 got {oe:#06b}"
 
 async def check_qspi_idle(dut, cycles=10):
     """ 
@@ -332,64 +405,7 @@ async def check_qspi_idle(dut, cycles=10):
         oe = int(dut.uio_oe.value) & 0xF
         assert oe == 0x0, f"Idle: uio_oe[3:0] expected 0000, got {oe:04b}"
 
-async def send_header(dut, header_bytes):
-    if not header_bytes:
-        return
-
-    dut._log.info(f"Header Opcode 0x{header_bytes[0]:02x}")
-
-    dut.VALID_IN.value = 1
-    i = 0
-
-    # Drive data with setup time before the sampling edge
-    await FallingEdge(dut.clk)
-
-    while i < len(header_bytes):
-        dut.DATA_IN.value = header_bytes[i]
-
-        # READY sampled during the cycle BEFORE the rising edge
-        ready = int(dut.READY_IN.value)
-        
-        await RisingEdge(dut.clk)
-
-        if ready:
-            i += 1
-            await FallingEdge(dut.clk)  # align next data update to falling edge
-
-    dut.VALID_IN.value = 0
-
-async def send_write_payload(dut, data):
-    i = 0
-    while i < len(data):
-        # randomized backpressure bus sending
-        host_valid = random.randint(0, 1)
-        dut.VALID_IN.value = host_valid
-        if host_valid:
-            dut.DATA_IN.value = data[i]
-
-        await RisingEdge(dut.clk)
-        if host_valid and int(dut.READY_IN.value):
-            i += 1
-
-    dut.VALID_IN.value = 0
-
-async def recv_read_payload(dut, length):
-    out = []
-    while len(out) < length:
-        # randomized back pressure bus receiving
-        host_ready = random.randint(0, 1)
-        dut.READY.value = host_ready
-        await RisingEdge(dut.clk)
-
-        if host_ready == 1 and int(dut.VALID.value) == 1:
-            out.append(int(dut.DATA.value))
-    dut.READY.value = 0
-    dut._log.info(f"All {length} Bytes Captured ")
-    return out
-
-
-
-async def rst(dut):
+async def rst(dut, flash, qspi):
     # 1) Startup sequence
     #    Stimulus:
     #      - Apply reset, then just run clock until startup is expected to finish.
@@ -400,19 +416,24 @@ async def rst(dut):
         #      - See repeated 05h reads until SR1.WIP == 0.
         #      - See 35h read of SR2 and, if QE was 0, 06h + 31h write setting QE=1.
     #      - Finally: flash contents all 0xFF, SR2.QE == 1, SR1.WIP == 0.
-    async def spi_only_di_do():
+    async def spi_only_di_do(frames):
         # check only di do pins are driven/ uio oe correctness before seeing WRSR2 opcode(quad enable)
-        await FallingEdge(dut.CS)
-
         while True:
-            opcode = await SPI_no_addr_no_print(dut)
-            if opcode == 0x31: 
+            frame = await frames.get()
+            if frame.opcode == 0x31:
+                qspi.unsubscribe(frames)
                 return
-            assert dut.IO2.value == 1, f"IO2 expected 1 got {dut.IO2.value}" 
-            assert dut.IO3.value == 1, f"IO3 expected 1 got {dut.IO3.value}"
-            oe = int(dut.uio_oe.value) & 0xF
-            # IO2/IO3 must not be driven
-            assert (oe & 0b1100) == 0b1100, f"SPI mode: IO2/3 driven must be high, uio_oe={oe:04b}"
+            for io, oe in zip(frame.io, frame.oe):
+                assert io & 0b1100 == 0b1100, f"IO3/IO2 expected 1 got {io:#06b} in {frame}"
+                # IO2/IO3 must not be driven
+                assert (oe & 0b1100) == 0b1100, f"SPI mode: IO2/3 driven must be high, uio_oe={oe:04b}"
+
+    frames = qspi.subscribe()
+
+    async def next_opcode():
+        frame = await frames.get()
+        dut._log.info(f"[{frame.start} ns] Opcode {frame.opcode:#02x}")
+        return frame.opcode
 
 
     dut._log.info("Startup Flow Start")
@@ -451,23 +472,28 @@ async def rst(dut):
     dut._log.info(f"[{t} ns] IO check complete")
     # start up flow opcode check
     # coroutine spi only di do
-    spi_task = cocotb.start_soon(spi_only_di_do())
+    spi_task = cocotb.start_soon(spi_only_di_do(qspi.subscribe()))
+
 
+    # continuous read mode reset, the flash may still be in it after a controller reset
+    if READ_MODE.quad_address:
+        opcode = await next_opcode()
+        assert opcode == OPC_MODE_RESET, f"Opcode expected 0xFF got {opcode:#02x}"
 
     # WREN
-    opcode = await SPI_no_addr(dut)
+    opcode = await next_opcode()
     assert opcode == 0x06, f"Opcode expected 0x06 got {opcode:#02x}"
 
     # SW RST
-    opcode = await SPI_no_addr(dut)
+    opcode = await next_opcode()
     assert opcode == 0x66, f"Opcode expected 0x66 got {opcode:#02x}"
 
-    opcode = await SPI_no_addr(dut)
+    opcode = await next_opcode()
     assert opcode == 0x99, f"Opcode expected 0x99 got {opcode:#02x}"
     dut._log.info("SW RST Done")
     # while still in wip poll
     while True:
-        opcode = await SPI_no_addr(dut)
+        opcode = await next_opcode()
         if opcode == 0x05:
             continue
         # global unlock wren
@@ -475,25 +501,21 @@ async def rst(dut):
         break
 
     # global unlock
-    opcode = await SPI_no_addr(dut)
+    opcode = await next_opcode()
     assert opcode == 0x98, f"Opcode expected 0x98 got {opcode:#02x}"
     
     # chip erase
 
-    opcode = await SPI_no_addr(dut)
+    opcode = await next_opcode()
     assert opcode == 0x06, f"Opcode expected 0x06 got {opcode:#02x}"
 
-    opcode = await SPI_no_addr(dut)
+    opcode = await next_opcode()
     assert opcode == 0xC7 or opcode == 0x60, f"Opcode expected 0xC7/0x60 got {opcode:#02x}"
     # read SR2 - QE enable
     saw_05 = False
 
     for _ in range(MAX_POLLS):
-        try:
-            # SPI_no_addr waits for a full transaction (CS low, bits shifted, CS high)
-            opcode = await SPI_no_addr(dut)
-        except SimTimeoutError:
-            raise cocotb.result.TestFailure("Timed out waiting for status opcode after chip erase")
+        opcode = await next_opcode()
 
         if opcode == 0x05:
             saw_05 = True
@@ -502,11 +524,11 @@ async def rst(dut):
             # Got SR2 read
             break
         else:
-            raise cocotb.result.TestFailure(f"Unexpected opcode {opcode:#02x} during erase-polling; "
+            raise AssertionError(f"Unexpected opcode {opcode:#02x} during erase-polling; "
                 "expected 0x05 (RDSR1) or 0x35 (RDSR2)")
     else:
         # Loop exhausted without seeing 0x35
-        raise cocotb.result.TestFailure("Never saw 0x35 (RDSR2) after chip erase")
+        raise AssertionError("Never saw 0x35 (RDSR2) after chip erase")
 
     if not saw_05:
         dut._log.warning("Did not see any 0x05 RDSR1 polls before 0x35 (RDSR2)")
@@ -514,25 +536,26 @@ async def rst(dut):
     dut._log.info("Status polling → RDSR2 (0x35) observed")
         
 
-    opcode = await SPI_no_addr(dut)
+    opcode = await next_opcode()
     assert opcode == 0x06, f"Opcode expected 0x06 got {opcode:#02x}"
 
-    opcode = await SPI_no_addr(dut)
+    opcode = await next_opcode()
     assert opcode == 0x31, f"Opcode expected 0x31 got {opcode:#02x}"
 
-    # Mem Model Status Reg Check
-    for _ in range(200):
+    # Mem Model Status Reg Check, after the write status busy time of the timing profile
+    for _ in range(200 + flash.t_write_sr_ns // 10):
         await RisingEdge(dut.clk)
-    assert (int(dut.flash.status_reg.value) & 0b11 ) == 0, \
-        f"Mem Model SR1[1:0] expected 0b00 got {(int(dut.flash.status_reg.value) & 0b11 ):#02b}"
-    assert ((int(dut.flash.status_reg.value)>>9) & 0b1 ) == 1, \
-        f"Mem Model SR2[1] expected 0b1 got {(int(dut.flash.status_reg.value>>9) & 0b1):#02b}"
+    assert (flash.status_reg & 0b11 ) == 0, \
+        f"Mem Model SR1[1:0] expected 0b00 got {(flash.status_reg & 0b11 ):#02b}"
+    assert ((flash.status_reg>>9) & 0b1 ) == 1, \
+        f"Mem Model SR2[1] expected 0b1 got {((flash.status_reg>>9) & 0b1):#02b}"
     # Mem Model Flash Array Clear Check
-    await check_flash_erased(dut,dut.flash)
+    await check_flash_erased(dut,flash)
+    qspi.unsubscribe(frames)
 
     dut._log.info("Startup Flow Complete")
 
-async def basic_read_write_ack(dut):
+async def basic_read_write_ack(dut, flash, bus, qspi):
 # 2) Basic functional read/write via host
 # 2.1) AES write 128b + read back
 #    - Host sends WR_RES(AES, addr=A), streams 16 known bytes data_aes[0..15].
@@ -562,123 +585,36 @@ async def basic_read_write_ack(dut):
         dut._log.info("AES Write 128b Read Back Start")
         # randomized data   aes wr opcode   addr:0x000000 from [23:0]
         data = [randomized_data() for _ in range(WR_AES_BYTES)]
-        inputsequence = [wr_aes_generate_128b(),0x00,0x01,0x00]
+        await bus.driver.send_header(header_bytes(wr_aes_generate_128b(), 0x000100))
 
-        # Bus valid high
-        dut.VALID_IN.value = 1
-        for i in inputsequence:
-            dut.DATA_IN.value = i
-            await RisingEdge(dut.clk)
-        # deassert valid
-        dut.VALID_IN.value = 0
-
-        async def bus_mem_aeswr():
-            j = 0
-            dut.VALID_IN.value = 1
-            # for _ in range(len(data)):
-            #     dut._log.info(f"Byte {j}: {data[j]:#02x}")
-            #     j += 1
-            # j = 0
-            # input data write
-            while j <len(data):
-                dut.DATA_IN.value = data[j]
-                await RisingEdge(dut.clk)
-                
-                if dut.READY_IN.value == 1:
-                    # dut._log.info(f"Byte {j}: {data[j]:#02x} fed")
-                    j += 1
-            dut.VALID_IN.value = 0
-
-        async def qspi_uio_oe_wraes():
-            # tt uio_oe check
-            dut._log.info("Waiting for WIP=0 in vendor status_reg...")
-            cycles = 6000
-            for _ in range(cycles): 
-                opcode = await SPI_no_addr(dut)
-                if opcode == 0x05:
-                    continue
-
-                if opcode == 0x06:
-                    break
-            else:
-                raise AssertionError("Timed out waiting for WIP=0/ WREN ")
-
-            
-            await FallingEdge(dut.CS)
-            for _ in range(8+24):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 1,f"uio_oe[3:0] expect 0b0001 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            # QSPI Output
-            for _ in range(WR_AES_BYTES*2):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 0b1111,f"uio_oe[3:0] expect 0b1111 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            await RisingEdge(dut.CS)
+        async def qspi_uio_oe_wraes(frames):
+            # tt uio_oe check: WIP polls, WREN, then the quad page program
+            frame = await next_frame_after_polls(frames)
+            assert frame.opcode == 0x06, f"Opcode expected 0x06 (WREN) got {frame.opcode:#04x}"
+            check_quad_write_frame(await frames.get(), 0x000100, data)
+            qspi.unsubscribe(frames)
 
         # coroutine qspi uio oe and bus input monitor
-        process = cocotb.start_soon(bus_mem_aeswr())
-        await qspi_uio_oe_wraes()
+        process = cocotb.start_soon(bus.driver.send(data))
+        await qspi_uio_oe_wraes(qspi.subscribe())
         await process
         
         # aes rd text  
-        # read opcode generate
-        inputsequence = [rd_text_aes_128b(),0x00,0x01,0x00]
-        # Bus valid high
-        dut.VALID_IN.value = 1
-        # shift opcode
-        for i in inputsequence:
-            dut.DATA_IN.value = i
-            await RisingEdge(dut.clk) 
-        # deassert valid
-        dut.VALID_IN.value = 0       
-        # bus ready
-        dut.READY.value = 1
-        await RisingEdge(dut.clk)
+        await bus.driver.send_header(header_bytes(rd_text_aes_128b(), 0x000100))
+
+        async def qspi_uio_oe_rdaes(frames):
+            # tt uio_oe check: WIP polls, then the quad read
+            check_quad_read_frame(await next_frame_after_polls(frames), 0x000100, RD_TEXT_AES_BYTES)
+            qspi.unsubscribe(frames)
 
-        async def mem_bus_aesrd():
-            dut.READY.value = 1
-            j = 0
-            while j < len(data):
-                await RisingEdge(dut.clk)
-                if dut.VALID.value == 1:
-                    got = int(dut.DATA.value)
-                    exp = data[j]
-                    assert got == exp,f"Expected data {exp:#04x}, got {got:#04x}"
-                    j+=1
-            dut.READY.value = 0
-
-        async def qspi_uio_oe_rdaes():
-            # tt uio_oe check            
-            dut._log.info("Waiting for WIP=0 in vendor status_reg...")
-            cycles = 6000
-            for _ in range(cycles): 
-                await RisingEdge(dut.clk)
-                if int(dut.flash.status_reg.value) & 0b1 == 0:
-                    opcode = await SPI_no_addr_no_print(dut)
-                    assert opcode == 0x05, f"Expect opcode 0x05 got {opcode:#02x}"
-                    break
-            else:
-                raise AssertionError("Timed out waiting for WIP=0 in status_reg")            
-            
-                                
-            await FallingEdge(dut.CS)
-            for _ in range(8+24):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 1,f"uio_oe[3:0] expect 0b0001 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            # dummy
-            for _ in range(RD_DUMMY):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 0,f"uio_oe[3:0] expect 0b0000 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            # QSPI Input
-            for _ in range(RD_TEXT_AES_BYTES*2):
-                await RisingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 0,f"uio_oe[3:0] expect 0b0000 got {int(dut.uio_oe.value) & 0xf:#04b}"            
         # ack coroutine
-        ack_task = cocotb.start_soon(expect_ack(dut))
+        ack_task = cocotb.start_soon(bus.ack.expect_ack())
         # coroutine qspi uio oe and mem to bus
-        process = cocotb.start_soon(mem_bus_aesrd())
-        await qspi_uio_oe_rdaes()
-        await process
+        process = cocotb.start_soon(bus.receiver.recv(len(data)))
+        await qspi_uio_oe_rdaes(qspi.subscribe())
+        got = await process
         await ack_task
+        assert got == data, f"RD_TEXT AES: got {bytes(got).hex()} expected {bytes(data).hex()}"
 
         dut._log.info("AES Write 128b Read Back Complete")
 
@@ -687,118 +623,36 @@ async def basic_read_write_ack(dut):
         dut._log.info("SHA Write 256b Read Back Start")
         # randomized data   aes wr opcode   addr:0x000100 from [23:0]
         data = [randomized_data() for _ in range(WR_SHA_BYTES)]
-        inputsequence = [wr_sha_generate_256b(),0x00,0x02,0x00]
+        await bus.driver.send_header(header_bytes(wr_sha_generate_256b(), 0x000200))
 
-        # Bus valid high
-        dut.VALID_IN.value = 1
-        for i in inputsequence:
-            dut.DATA_IN.value = i
-            await RisingEdge(dut.clk)
+        async def qspi_uio_oe_wrsha(frames):
+            # tt uio_oe check: WIP polls, WREN, then the quad page program
+            frame = await next_frame_after_polls(frames)
+            assert frame.opcode == 0x06, f"Opcode expected 0x06 (WREN) got {frame.opcode:#04x}"
+            check_quad_write_frame(await frames.get(), 0x000200, data)
+            qspi.unsubscribe(frames)
 
-        # deassert valid
-        dut.VALID_IN.value = 0
-
-        async def bus_mem_shawr():
-            j = 0
-            dut.VALID_IN.value = 1
-            # input data write
-            while j <len(data):
-                dut.DATA_IN.value = data[j]
-                await RisingEdge(dut.clk)
-
-                if dut.READY_IN.value == 1:
-                    j += 1
-            dut.VALID_IN.value = 0
-
-        async def qspi_uio_oe_wrsha():
-            # tt uio_oe check
-            dut._log.info("Waiting for WIP=0 in vendor status_reg...")
-            cycles = 6000
-            for _ in range(cycles): 
-                opcode = await SPI_no_addr(dut)
-                if opcode == 0x05:
-                    continue
-
-                if opcode == 0x06:
-                    break
-            else:
-                raise AssertionError("Timed out waiting for WIP=0/ WREN ")
-            
-            await FallingEdge(dut.CS)
-            for _ in range(8+24):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 1,f"uio_oe[3:0] expect 0b0001 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            # QSPI Output
-            for _ in range(WR_SHA_BYTES*2):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 0b1111,f"uio_oe[3:0] expect 0b1111 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            await RisingEdge(dut.CS)
-
- 
         # coroutine qspi uio oe and bus input monitor
-        process = cocotb.start_soon(bus_mem_shawr())
-        await qspi_uio_oe_wrsha()
+        process = cocotb.start_soon(bus.driver.send(data))
+        await qspi_uio_oe_wrsha(qspi.subscribe())
         await process
 
-        # aes rd text  
-        # read opcode generate
-        inputsequence = [rd_text_sha_256b(),0x00,0x02,0x00]
-        # Bus valid high
-        dut.VALID_IN.value = 1
-        # shift opcode
-        for i in inputsequence:
-            dut.DATA_IN.value = i
-            await RisingEdge(dut.clk)
-        # deassert valid
-        dut.VALID_IN.value = 0      
-        # bus ready
-        dut.READY.value = 1
-        await RisingEdge(dut.clk)
+        # sha rd text  
+        await bus.driver.send_header(header_bytes(rd_text_sha_256b(), 0x000200))
+
+        async def qspi_uio_oe_rdsha(frames):
+            # tt uio_oe check: WIP polls, then the quad read
+            check_quad_read_frame(await next_frame_after_polls(frames), 0x000200, RD_TEXT_SHA_BYTES)
+            qspi.unsubscribe(frames)
 
-        async def mem_bus_shard():
-            dut.READY.value = 1
-            j = 0
-            while j < len(data):
-                await RisingEdge(dut.clk)
-                if dut.VALID.value == 1:
-                    got = int(dut.DATA.value)
-                    exp = data[j]
-                    assert got == exp,f"Expected data {exp:#04x}, got {got:#04x}"
-                    j+=1
-            dut.READY.value = 0
-
-        async def qspi_uio_oe_rdsha():
-            # tt uio_oe check            
-            dut._log.info("Waiting for WIP=0 in vendor status_reg...")
-            cycles = 6000
-            for _ in range(cycles): 
-                await RisingEdge(dut.clk)
-                if int(dut.flash.status_reg.value) & 0b1 == 0:
-                    opcode = await SPI_no_addr_no_print(dut)
-                    assert opcode == 0x05, f"Expect opcode 0x05 got {opcode:#02x}"
-                    break
-            else:
-                raise AssertionError("Timed out waiting for WIP=0 in status_reg")  
-                                
-            await FallingEdge(dut.CS)
-            for _ in range(8+24):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 1,f"uio_oe[3:0] expect 0b0001 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            # dummy
-            for _ in range(RD_DUMMY):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 0,f"uio_oe[3:0] expect 0b0000 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            # QSPI Input
-            for _ in range(RD_TEXT_SHA_BYTES*2):
-                await RisingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 0,f"uio_oe[3:0] expect 0b0000 got {int(dut.uio_oe.value) & 0xf:#04b}"            
         # ack coroutine
-        ack_task = cocotb.start_soon(expect_ack(dut))
+        ack_task = cocotb.start_soon(bus.ack.expect_ack())
         # coroutine qspi uio oe and mem to bus
-        process = cocotb.start_soon(mem_bus_shard())
-        await qspi_uio_oe_rdsha()
-        await process
+        process = cocotb.start_soon(bus.receiver.recv(len(data)))
+        await qspi_uio_oe_rdsha(qspi.subscribe())
+        got = await process
         await ack_task
+        assert got == data, f"RD_TEXT SHA: got {bytes(got).hex()} expected {bytes(data).hex()}"
 
         dut._log.info("SHA Write 256b Read Back Complete")
 
@@ -807,69 +661,21 @@ async def basic_read_write_ack(dut):
         dut._log.info("AES 256 Read Back Start")
         # randomized data   aes wr opcode   addr:0x000200 from [23:0]
         data = [randomized_data() for _ in range(RD_KEY_AES_BYTES)]
-        await preload_key_region(dut,data,KEY_BASE)
-        # aes rd text  
-        # read opcode generate
-        inputsequence = [rd_key_aes_256b(),0x00,0x03,0x00]
-        # Bus valid high
-        dut.VALID_IN.value = 1
-        # shift opcode
-        for i in inputsequence:
-            dut.DATA_IN.value = i
-            await RisingEdge(dut.clk) 
-        
-        # deassert valid
-        dut.VALID_IN.value = 0    
-        # bus ready
-        dut.READY.value = 1
-        await RisingEdge(dut.clk)
+        flash.backdoor.load(KEY_BASE, data)
+        await bus.driver.send_header(header_bytes(rd_key_aes_256b(), KEY_BASE))
 
-        async def mem_bus_aesrd_key():
-            dut.READY.value = 1
-            j = 0
-            while j < len(data):
-                await RisingEdge(dut.clk)
-                if dut.VALID.value == 1:
-                    got = int(dut.DATA.value)
-                    exp = data[j]
-                    assert got == exp,f"Expected data {exp:#04x}, got {got:#04x}"
-                    j+=1
-            dut.READY.value = 0
-
-        async def qspi_uio_oe_rdaes_key():
-            # tt uio_oe check            
-            dut._log.info("Waiting for WIP=0 in vendor status_reg...")
-            cycles = 6000
-            for _ in range(cycles): 
-                await RisingEdge(dut.clk)
-                if int(dut.flash.status_reg.value) & 0b1 == 0:
-                    opcode = await SPI_no_addr_no_print(dut)
-                    assert opcode == 0x05, f"Expect opcode 0x05 got {opcode:#02x}"
-                    break
-            else:
-                raise AssertionError("Timed out waiting for WIP=0 in status_reg")  
-                                
-            await FallingEdge(dut.CS)
-            for _ in range(8+24):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 1,f"uio_oe[3:0] expect 0b0001 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            # dummy
-            for _ in range(RD_DUMMY):
-                await FallingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 0,f"uio_oe[3:0] expect 0b0000 got {int(dut.uio_oe.value) & 0xf:#04b}"
-            # QSPI Input
-            for _ in range(RD_KEY_AES_BYTES*2):
-                await RisingEdge(dut.SCLK)
-                assert int(dut.uio_oe.value) & 0xf == 0,f"uio_oe[3:0] expect 0b0000 got {int(dut.uio_oe.value) & 0xf:#04b}"            
-
-            # ack coroutine
-        
-        ack_task = cocotb.start_soon(expect_ack(dut))
+        async def qspi_uio_oe_rdaes_key(frames):
+            # tt uio_oe check: WIP polls, then the quad read
+            check_quad_read_frame(await next_frame_after_polls(frames), KEY_BASE, RD_KEY_AES_BYTES)
+            qspi.unsubscribe(frames)
+
+        ack_task = cocotb.start_soon(bus.ack.expect_ack())
         # coroutine qspi uio oe and mem to bus
-        process = cocotb.start_soon(mem_bus_aesrd_key())
-        await qspi_uio_oe_rdaes_key()
-        await process
+        process = cocotb.start_soon(bus.receiver.recv(len(data)))
+        await qspi_uio_oe_rdaes_key(qspi.subscribe())
+        got = await process
         await ack_task
+        assert got == data, f"RD_KEY AES: got {bytes(got).hex()} expected {bytes(data).hex()}"
 
         dut._log.info("AES 256b Read Complete")
 
@@ -881,7 +687,41 @@ async def basic_read_write_ack(dut):
     await check_qspi_idle(dut)
     dut._log.info("Basic Read/Write/Ack Flow Complete")
 
-async def busy_WIP(dut):
+async def burst_read(dut, flash, bus, qspi):
+# 2.4) Burst read: header bit 6 + block count beat
+#    - Preload a page, read it back as N consecutive blocks with one command.
+#    - Expect: one read frame (opcode, address, dummy once) carrying all N blocks,
+#      the host sees every byte, one ack at the end.
+    dut._log.info("Burst Read Test Start")
+    base = 0x070000
+    page = [randomized_data() for _ in range(PAGESIZE)]
+    flash.backdoor.load(base, page)
+    # (header, blocks, block bytes): a full page of AES keys / AES text, 3 SHA blocks, and
+    # 17 AES text blocks (beat 0x10, above 4 bits) capped at the page
+    cases = [
+        (rd_key_aes_256b, 8, RD_KEY_AES_BYTES),
+        (rd_text_aes_128b, 16, RD_TEXT_AES_BYTES),
+        (rd_text_sha_256b, 3, RD_TEXT_SHA_BYTES),
+        (rd_text_aes_128b, 17, RD_TEXT_AES_BYTES),
+    ]
+    for gen, blocks, block in cases:
+        length = min(blocks * block, PAGESIZE)
+        addr = base + PAGESIZE - length
+        frames = qspi.subscribe()
+        await bus.driver.send_header(burst_header_bytes(gen(), addr, blocks))
+        ack = cocotb.start_soon(bus.ack.expect_ack())
+        got = await bus.receiver.recv(length)
+        await ack
+        expected = page[PAGESIZE - length:]
+        assert got == expected, f"Burst read {blocks}x{block}B @ {addr:#08x}: got {bytes(got).hex()}"
+        frame = await next_frame_after_polls(frames)
+        qspi.unsubscribe(frames)
+        check_quad_read_frame(frame, addr, length)
+        assert list(frame.data[:length]) == expected, "Burst read: QSPI data differs from host data"
+        await check_qspi_idle(dut)
+    dut._log.info("Burst Read Test Complete")
+
+async def busy_WIP(dut, flash, bus, qspi):
     # 4) Busy / serialization (using WIP)
     #   - Start long WR_RES(SHA 256b) at addr=B.
     #   - Before it finishes, host tries another command (e.g. RD_KEY(AES) at C).
@@ -893,46 +733,19 @@ async def busy_WIP(dut):
     async def sha_wr():
         dut._log.info("SHA Write 256B at 0x000300 start")
         data = [randomized_data() for _ in range(WR_SHA_BYTES)]
-        header = [wr_sha_generate_256b(), 0x00, 0x03, 0x00]  # addr = 0x000300
-
-        # send 4-beat header
-        dut.VALID_IN.value = 1
-        for b in header:
-            dut.DATA_IN.value = b
-            await RisingEdge(dut.clk)
-        dut.VALID_IN.value = 0
-
-        async def bus_mem_shawr():
-            j = 0
-            dut.VALID_IN.value = 1
-            while j < len(data):
-                dut.DATA_IN.value = data[j]
-                await RisingEdge(dut.clk)
-                if dut.READY_IN.value == 1:
-                    j += 1
-            dut.VALID_IN.value = 0
-
-        # ack coroutine for the SHA write
-        await bus_mem_shawr()
+        await bus.driver.send_header(header_bytes(wr_sha_generate_256b(), 0x000300))
+        await bus.driver.send(data)
 
         dut._log.info("SHA WR_RES command + payload sent")
 
 
     async def send_aes_rd_key_cmd():
         dut._log.info("Issuing AES RD_KEY command while flash may be busy")
-        header = [rd_key_aes_256b(), 0x00, 0x04, 0x00]  # addr = 0x000400
-
-        dut.VALID_IN.value = 1
-        for b in header:
-            dut.DATA_IN.value = b
-            await RisingEdge(dut.clk)
-        dut.VALID_IN.value = 0
-
+        await bus.driver.send_header(header_bytes(rd_key_aes_256b(), 0x000400))
         # dont care returned data
-        dut.READY.value = 1
-        # ack
-        await expect_ack(dut)
-        dut.READY.value = 0
+        ack = cocotb.start_soon(bus.ack.expect_ack())
+        await bus.receiver.recv(RD_KEY_AES_BYTES)
+        await ack
 
     async def monitor_qspi_while_busy():
         # wait until flash becomes busy
@@ -940,17 +753,19 @@ async def busy_WIP(dut):
         cycles = 6000
         for _ in range(cycles): 
             await RisingEdge(dut.clk)
-            if int(dut.flash.status_reg.value) & 0b1 == 1:
+            if flash.status_reg & 0b1 == 1:
                 break
         else:
             raise AssertionError("Timed out waiting for  WIP=1 in status_reg")  
 
         dut._log.info("WIP==1; now monitoring QSPI opcodes (expect only 0x05)")
 
-        # while busy, every SPI_no_addr() we see must be a 0x05 status read
-        while int(dut.flash.status_reg.value) & 0b1 == 1:
-            opcode = await SPI_no_addr_no_print(dut)
-            assert opcode == 0x05, f"Unexpected opcode {opcode:#04x} while WIP==1; expected 0x05 (RDSR1 only)"
+        # while busy, every frame we see must be a 0x05 status read
+        frames = qspi.subscribe()
+        while flash.status_reg & 0b1 == 1:
+            frame = await frames.get()
+            assert frame.opcode == 0x05, f"Unexpected opcode {frame.opcode:#04x} while WIP==1; expected 0x05 (RDSR1 only)"
+        qspi.unsubscribe(frames)
 
         dut._log.info("WIP returned to 0, QSPI busy-monitor done")
 
@@ -961,7 +776,7 @@ async def busy_WIP(dut):
     cycles = 1000
     for _ in range(cycles):
         await RisingEdge(dut.clk)
-        if int(dut.flash.status_reg.value) & 0b1 == 1:
+        if flash.status_reg & 0b1 == 1:
                 break
     else:
         raise AssertionError("Timed out waiting for WIP=1 in status_reg")  
@@ -975,7 +790,7 @@ async def busy_WIP(dut):
 
     dut._log.info("Busy WIP Test Complete")
 
-async def invalid_opcode(dut):
+async def invalid_opcode(dut, bus):
 # 5) Invalid / garbage commands
 #    - Host sends random illegal headers (your invalid() generator).
 #    Expect:
@@ -985,13 +800,7 @@ async def invalid_opcode(dut):
     dut._log.info("Invalid Opcode Test Start")
 
     # invalid opcode with addr 0x777777
-    header = [invalid(),0x77,0x77,0x77]
-    # send 4-beat header
-    dut.VALID_IN.value = 1
-    for b in header:
-        dut.DATA_IN.value = b
-        await RisingEdge(dut.clk)
-    dut.VALID_IN.value = 0
+    await bus.driver.send_header(header_bytes(invalid(), 0x777777))
 
     async def invalid_output_monitor(cycles=200):
         for _ in range(cycles):
@@ -1007,7 +816,7 @@ async def invalid_opcode(dut):
 
     dut._log.info("Invalid Opcode Test Complete")
 
-async def random_stress(dut):
+async def random_stress(dut, flash, bus, iterations=8, backpressure="bernoulli:0.5"):
 # 6) Random stress vs vendor-model scoreboard
 #    - Maintain Python array expected_mem[] mirroring vendor model.
 #    - Loop 8 times:
@@ -1023,24 +832,27 @@ async def random_stress(dut):
 #    - Host ready/valid randomized each byte. QSPI pins ONLY driven by mem.
 #    - Pass if no mismatches and vendor model reports no errors.  
     dut._log.info("Random Stress Test Start")
-    # fixed addr 
+    # one region per flow, 4KB apart unless the iterations need more room
+    region = max(0x1000, (iterations * RD_KEY_AES_BYTES + 0xFFF) & ~0xFFF)
     aes_addr = 0x001000
-    sha_addr = 0x002000
-    aes_key_addr = 0x003000
+    sha_addr = aes_addr + region
+    aes_key_addr = sha_addr + region
+    valid_throttle = make_throttle(backpressure)
+    ready_throttle = make_throttle(backpressure)
     
     async def wr_sha_backpressure_rd(addr):
         # randomized data
         data = [randomized_data() for _ in range(WR_SHA_BYTES)]
         header = [wr_sha_generate_256b(),(addr)&0xff,(addr>>8)&0xff,(addr>>16)&0xff]
 
-        await send_header(dut,header)
-        await send_write_payload(dut,data)
+        await bus.driver.send_header(header)
+        await bus.driver.send(data, throttle=valid_throttle)
 
         header = [rd_text_sha_256b(),(addr)&0xff,(addr>>8)&0xff,(addr>>16)&0xff]
 
-        await send_header(dut,header)
-        rd_ack_task = cocotb.start_soon(expect_ack(dut))
-        got = await recv_read_payload(dut,WR_SHA_BYTES)
+        await bus.driver.send_header(header)
+        rd_ack_task = cocotb.start_soon(bus.ack.expect_ack())
+        got = await bus.receiver.recv(WR_SHA_BYTES, throttle=ready_throttle)
         await rd_ack_task
         for i, (exp, g) in enumerate(zip(data, got)):
             assert g == exp, f"SHA backpressure mismatch @byte {i}: exp {exp:#04x}, got {g:#04x}"
@@ -1053,15 +865,15 @@ async def random_stress(dut):
         data = [randomized_data() for _ in range(WR_AES_BYTES)]
         header = [wr_aes_generate_128b(),(addr)&0xff,(addr>>8)&0xff,(addr>>16)&0xff]
 
-        await send_header(dut,header)
-        await send_write_payload(dut,data)
+        await bus.driver.send_header(header)
+        await bus.driver.send(data, throttle=valid_throttle)
 
 
         header = [rd_text_aes_128b(),(addr)&0xff,(addr>>8)&0xff,(addr>>16)&0xff]
 
-        await send_header(dut,header)
-        rd_ack_task = cocotb.start_soon(expect_ack(dut))
-        got = await recv_read_payload(dut,WR_AES_BYTES)
+        await bus.driver.send_header(header)
+        rd_ack_task = cocotb.start_soon(bus.ack.expect_ack())
+        got = await bus.receiver.recv(WR_AES_BYTES, throttle=ready_throttle)
         await rd_ack_task
         for i, (exp, g) in enumerate(zip(data, got)):
             assert g == exp, f"AES backpressure mismatch @byte {i}: exp {exp:#04x}, got {g:#04x}"
@@ -1072,15 +884,12 @@ async def random_stress(dut):
     async def preload_aes_backpressure_rd(addr):
         # randomized data
         data = [randomized_data() for _ in range(RD_KEY_AES_BYTES)]
-        await preload_key_region(dut,data,addr)
-        # for i in range (RD_KEY_AES_BYTES):
-        #     got = dut.flash.memory[aes_key_addr+i].value.to_unsigned()
-        #     dut._log.info(f"Preaload {aes_key_addr+i :#06x}: {got:#02x}")
+        flash.backdoor.load(addr, data)
         header = [rd_key_aes_256b(),(addr)&0xff,(addr>>8)&0xff,(addr>>16)&0xff]   
-        await send_header(dut,header)     
+        await bus.driver.send_header(header)     
 
-        rd_key_ack_task = cocotb.start_soon(expect_ack(dut))
-        got = await recv_read_payload(dut,RD_KEY_AES_BYTES)
+        rd_key_ack_task = cocotb.start_soon(bus.ack.expect_ack())
+        got = await bus.receiver.recv(RD_KEY_AES_BYTES, throttle=ready_throttle)
         await rd_key_ack_task
         for i, (exp, g) in enumerate(zip(data, got)):
             assert g == exp, f"AES preload backpressure mismatch @byte {i}: exp {exp:#04x}, got {g:#04x}"
@@ -1088,19 +897,165 @@ async def random_stress(dut):
         next_aes_key_addr = addr + RD_KEY_AES_BYTES
         return next_aes_key_addr
 
-    for _ in range(8):
+    for _ in range(iterations):
         aes_addr = await wr_aes_backpressure_rd(aes_addr)
     dut._log.info(f"AES WR-RD backpressure complete, current address: {aes_addr:#06x}")
-    for _ in range(8):
+    for _ in range(iterations):
         sha_addr = await wr_sha_backpressure_rd(sha_addr)
     dut._log.info(f"SHA WR-RD backpressure complete, current address: {sha_addr:#06x}")
-    for _ in range(8):        
+    for _ in range(iterations):
         aes_key_addr = await preload_aes_backpressure_rd(aes_key_addr)
     dut._log.info(f"AES Preload-RD backpressure complete, current address: {aes_key_addr:#06x}")   
+    if valid_throttle is not None:
+        dut._log.info(f"Backpressure {backpressure}: VALID stalled {valid_throttle.stall_rate:.2f}, "
+                      f"READY stalled {ready_throttle.stall_rate:.2f} of cycles")
 
     dut._log.info("Random Stress Test Complete")
 
-async def full_smoke(dut):
+async def write_combine_stress(dut, flash, bus, qspi, pages=4, backpressure="bernoulli:0.5"):
+# 6.1) Write combining stress
+#    - Per page: random 16B (AES) / 32B (SHA) WR_RES at consecutive addresses up to the
+#      page end, host VALID stalls on the data. Between two writes sometimes a 16B read of
+#      the page start (flush by command) or an idle gap (flush by timeout).
+#    - Page read back as one burst, flash array compared at the end.
+#    - Every 0x32 frame checked against the expected merged segment.
+    dut._log.info("Write Combining Stress Test Start")
+    base = 0x0A0000
+    valid_throttle = make_throttle(backpressure)
+    # (addr, data) of the page programs expected on the pins
+    segments = []
+    expected = []
+    frames = qspi.subscribe()
+    start = get_sim_time(unit="ns")
+    writes = 0
+    for p in range(pages):
+        page_addr = base + p * PAGESIZE
+        page = []
+        flushed = True
+        while len(page) < PAGESIZE:
+            addr = page_addr + len(page)
+            if page and random.random() < 0.15:
+                # read of the page start: raises CS on the open program first
+                await bus.driver.send_header(header_bytes(rd_text_aes_128b(), page_addr))
+                ack = cocotb.start_soon(bus.ack.expect_ack())
+                got = await bus.receiver.recv(RD_TEXT_AES_BYTES)
+                await ack
+                assert got == page[:RD_TEXT_AES_BYTES], \
+                    f"Read @ {page_addr:#08x} between writes: got {bytes(got).hex()}"
+                flushed = True
+            elif page and random.random() < 0.15:
+                # idle past the hold timeout: the program closes on its own
+                await ClockCycles(dut.clk, 4 * WC_HOLD)
+                flushed = True
+            sha = PAGESIZE - len(page) >= WR_SHA_BYTES and random.random() < 0.5
+            length = WR_SHA_BYTES if sha else WR_AES_BYTES
+            data = [randomized_data() for _ in range(length)]
+            gen = wr_sha_generate_256b if sha else wr_aes_generate_128b
+            await bus.driver.send_header(header_bytes(gen(), addr))
+            await bus.driver.send(data, throttle=valid_throttle)
+            writes += 1
+            if WRITE_COMBINE and not flushed:
+                segments[-1][1].extend(data)
+            else:
+                segments.append((addr, list(data)))
+            flushed = False
+            page += data
+        # whole page back in one burst read, which also closes the last program
+        await bus.driver.send_header(burst_header_bytes(rd_key_aes_256b(), page_addr,
+                                                        PAGESIZE // RD_KEY_AES_BYTES))
+        ack = cocotb.start_soon(bus.ack.expect_ack())
+        got = await bus.receiver.recv(PAGESIZE)
+        await ack
+        assert got == page, f"Page {page_addr:#08x} read back differs"
+        expected += page
+    elapsed = get_sim_time(unit="ns") - start
+    qspi.unsubscribe(frames)
+
+    programs = []
+    while not frames.empty():
+        frame = frames.get_nowait()
+        if frame.opcode == 0x32:
+            programs.append(frame)
+    assert len(programs) == len(segments), \
+        f"{len(programs)} page programs for {len(segments)} expected segments"
+    for frame, (addr, data) in zip(programs, segments):
+        check_quad_write_frame(frame, addr, data)
+    dump = flash.backdoor.dump(base, pages * PAGESIZE)
+    assert list(dump) == expected, "Flash array differs from the written pages"
+    dut._log.info(f"{writes} WR_RES in {len(programs)} page programs over {pages} pages, "
+                  f"{elapsed / 10:.0f} clocks incl. read back")
+    dut._log.info("Write Combining Stress Test Complete")
+
+async def read_cache_hit_miss(dut, flash, bus, qspi, ops=64):
+# 6.2) Read cache hit/miss
+#    - Keys preloaded at KEY_BASE, 4 RD_KEY addresses for 2 lines so lines get evicted.
+#    - WR_RES program into the same bytes (the flash only clears bits), so a stale line
+#      would return old data.
+#    - WR_RES at page offsets 0xE0/0xF0: a 32B program at 0xF0 wraps onto the line at the
+#      page start, opened with a directed fill, hit, wrapping write, refill.
+    dut._log.info("Read Cache Hit/Miss Test Start")
+    fsm_state = dut.top.fsm.state
+    page = [randomized_data() for _ in range(PAGESIZE)]
+    flash.backdoor.load(KEY_BASE, page)
+    offsets = [0x00, 0x20, 0x40, 0x10]
+    wr_offsets = list(range(0, 0x80, 0x10)) + [0xE0, 0xF0] * 3
+    directed = [("key", 0x00), ("key", 0x00), ("sha", 0xF0), ("key", 0x00)]
+    model = ReadCacheModel()
+    hits = misses = 0
+    for i in range(ops):
+        frames = qspi.subscribe()
+        if i < len(directed):
+            kind, off = directed[i]
+        else:
+            choice = random.random()
+            kind = "key" if choice < 0.7 else "text" if choice < 0.8 else random.choice(["sha", "aes"])
+            off = random.choice(offsets if kind in ("key", "text") else wr_offsets)
+        if kind == "key":
+            await bus.driver.send_header(header_bytes(rd_key_aes_256b(), KEY_BASE + off))
+            ack = cocotb.start_soon(bus.ack.expect_ack())
+            got = await bus.receiver.recv(RD_KEY_AES_BYTES)
+            await ack
+            assert got == page[off:off + RD_KEY_AES_BYTES], \
+                f"RD_KEY @ {KEY_BASE + off:#08x}: got {bytes(got).hex()}"
+            expect_hit = model.read(KEY_BASE + off)
+        elif kind == "text":
+            # RD_TEXT bypasses the cache
+            await bus.driver.send_header(header_bytes(rd_text_aes_128b(), KEY_BASE + off))
+            ack = cocotb.start_soon(bus.ack.expect_ack())
+            got = await bus.receiver.recv(RD_TEXT_AES_BYTES)
+            await ack
+            assert got == page[off:off + RD_TEXT_AES_BYTES], \
+                f"RD_TEXT @ {KEY_BASE + off:#08x}: got {bytes(got).hex()}"
+            expect_hit = False
+        else:
+            length = WR_SHA_BYTES if kind == "sha" else WR_AES_BYTES
+            data = [randomized_data() for _ in range(length)]
+            gen = wr_sha_generate_256b if kind == "sha" else wr_aes_generate_128b
+            await bus.driver.send_header(header_bytes(gen(), KEY_BASE + off))
+            await bus.driver.send(data)
+            # the page program wraps to the page start
+            for k, d in enumerate(data):
+                page[(off + k) % PAGESIZE] &= d
+            model.write(KEY_BASE + off, length)
+            expect_hit = None
+        await wait_fsm_idle(dut, fsm_state)
+        qspi.unsubscribe(frames)
+        if expect_hit is None:
+            continue
+        reads = 0
+        while not frames.empty():
+            reads += frames.get_nowait().opcode == FLASH_READ
+        assert reads == (0 if expect_hit else 1), \
+            f"{reads} read frames, expected a cache {'hit' if expect_hit else 'miss'}"
+        hits += reads == 0
+        misses += reads != 0
+    assert list(flash.backdoor.dump(KEY_BASE, PAGESIZE)) == page, "Flash differs from the key page"
+    assert not model.enabled or hits, "No read cache hits"
+    dut._log.info(f"Read cache: {hits} hits, {misses} misses "
+                  f"(model {model.hits} RD_KEY hits, {model.misses} RD_KEY misses)")
+    dut._log.info("Read Cache Hit/Miss Test Complete")
+
+async def full_smoke(dut, flash, bus, qspi):
 # 7) Full smoke test (startup + normal ops)
 #    - Reset, let startup FSM finish (reuse test 1 checks).
 #    - Then:
@@ -1108,20 +1063,27 @@ async def full_smoke(dut):
 #        * SHA WR 256b + SHA RD 256b compare.
 #    - Ensures whole stack (CMD + FSM + QSPI + flash model) works end-to-end.
     dut._log.info("Full Smoke Test Start")
-    cocotb.start_soon(timeout_monitor(dut))
-    await rst(dut)
+    cocotb.start_soon(err_watchdog(dut, "err", state="top.fsm.state"))
+    await rst(dut, flash, qspi)
+    # checkpoint the post-startup flash image
+    os.makedirs(os.path.dirname(STARTUP_SNAPSHOT), exist_ok=True)
+    flash.save_snapshot(STARTUP_SNAPSHOT)
     # 2. Basic functional read/write + ack + uio_oe checks
     # dut.top.fsm.state.value = 10
-    await basic_read_write_ack(dut)
+    await basic_read_write_ack(dut, flash, bus, qspi)
+    await burst_read(dut, flash, bus, qspi)
 
     # 3. Busy / WIP serialization (while busy only 0x05 should appear)
-    await busy_WIP(dut)
+    if flash.t_page_program_ns:
+        await busy_WIP(dut, flash, bus, qspi)
+    else:
+        dut._log.info("Busy WIP Test skipped, page program never sets WIP in this timing profile")
 
     # 4. Invalid / garbage opcode – confirm no QSPI traffic, no ack, no read data
-    await invalid_opcode(dut)
+    await invalid_opcode(dut, bus)
 
     # 5. Random stress: AES/SHA/ AES key with random data + random backpressure
-    await random_stress(dut)
+    await random_stress(dut, flash, bus)
 
     # 6.idle check at the end
     await ClockCycles(dut.clk, 20)
@@ -1130,4 +1092,7 @@ async def full_smoke(dut):
     assert dut.VALID.value == 0, "End-of-smoke: no data driving bus"    
     await check_qspi_idle(dut)
 
+    # 7. flash model save/restore, nothing drives the flash any more
+    await snapshot_round_trip(dut, flash)
+
     dut._log.info("Full Smoke Test Complete")
\ No newline at end of file
@@ -11,6 +11,7 @@
 # RD_KEY_1
 #     - RD_KEY, 32B, no backpressure
 #     - Check: WIP poll, READ+addr, 8 dummy, 32 bytes to CU, back to IDLE
+#       (READ_MODE=eb: 0xEB + quad addr + mode, 4 dummy; later reads only addr + mode)
 # RD_TEXT_AES1
 #     - RD_TEXT (AES, 16B), no backpressure
 # RD_TEXT_SHA1
@@ -49,62 +50,34 @@ from cocotb.triggers import (
     ClockCycles,
     with_timeout,
 )
+from common import (
+    RD_KEY_AES_BYTES, RD_TEXT_AES_BYTES, RD_TEXT_SHA_BYTES, WR_AES_BYTES, WR_SHA_BYTES,
+    rd_key_aes_256b, rd_text_aes_128b, rd_text_sha_256b, wr_aes_generate_128b,
+    wr_sha_generate_256b, invalid, randomized_data, err_watchdog, wait_signal_high,
+)
+from txn_fsm_model import TxnFsmScoreboard, state_name, RECEIVE_DATA, SEND_DATA, PP_HOLD
+from backpressure import as_throttle
+from read_mode import current_read_mode
+from write_combine import write_combine_enabled
 
-RD_KEY_AES_BYTES = 32
-RD_TEXT_AES_BYTES = 16
-RD_TEXT_SHA_BYTES = 32
 FLASH_PP = 0x32
-FLASH_READ = 0x6b
-WR_AES_BYTES = 16
-WR_SHA_BYTES = 32
-
-def rd_key_aes_256b():
-    enc   = random.randint(0,1)
-    src   = 0b10        # AES
-    dest  = 0b00        # MEM
-    opcode = 0b00       # RD_KEY
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def rd_text_aes_128b():
-    enc   = random.randint(0,1)
-    src   = 0b10
-    dest  = 0b00
-    opcode = 0b01       # RD_TEXT
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def rd_text_sha_256b():
-    enc   = 0            # SHA ignores enc/dec
-    src   = 0b01         # SHA
-    dest  = 0b00         # MEM
-    opcode = 0b01        # RD_TEXT
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def wr_aes_generate_128b():
-    enc = random.randint(0,1)
-    src = 0b00                          
-    dest = 0b10
-    opcode = 0b10                       # WR_RES
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def wr_sha_generate_256b():
-    enc = random.randint(0,1)
-    src = 0b00                         
-    dest = 0b01
-    opcode = 0b10                       # WR_RES
-    return (enc<<7)|(0<<6)|(dest<<4)|(src<<2)|opcode
-
-def invalid():
-    enc = random.randint(0,1)
-    reserved = 0
-    opcode = 11
-    dest  = random.choice([0b01, 0b10, 0b11])
-    src   = random.choice([0b00, 0b11])
-    return (enc<<7)|(reserved<<6)|(dest<<4)|(src<<2)|opcode
-
-def randomized_data():
-    data = random.randint(0,255)
-    return data
-
+# read command of the build (read_mode.py): 0x6B, or 0xEB in continuous read mode, where
+# reads after the first skip the WIP poll and the opcode and a write first sends 0xFF
+READ_MODE = current_read_mode()
+FLASH_READ = READ_MODE.opcode
+XIP_MODE = 0xA0
+OPC_MODE_RESET = 0xFF
+# dummy bytes the spi controller hands over: 8 clocks on one lane, or 4 clocks on 4 lanes
+DUMMY_BYTES = READ_MODE.dummy_clocks // (2 if READ_MODE.quad_address else 8)
+# WRITE_COMBINE build (write_combine.py): page programs stay open for a following WR_RES
+WRITE_COMBINE = write_combine_enabled()
+RANDOM_CYCLES = 30000
+
+class FlashSide:
+    """Flash side state of one test's scripted flows."""
+    def __init__(self):
+        # dut is in continuous read mode
+        self.xip = False
 
 async def spi_random_cycle(dut):
     cycles = random.randint(16,20)
@@ -171,14 +144,6 @@ async def rd_sr(dut,exp:int,data):
     dut.in_spi_valid.value = 0
     dut.in_spi_data.value = 0   
     
-async def timeout_monitor(dut):
-    # all time coroutine to make sure it never hits timeout
-    while True:
-        await RisingEdge(dut.clk)
-        if dut.rst_n.value == 0:
-            continue
-        assert dut.err_flag .value == 0, f"Timeout Triggered"
-
 async def wr_sr(dut,exp_opcode:int,exp_data:int):
     # emualate write status reg,shift 2 byte out 
     await RisingEdge(dut.out_spi_valid)
@@ -220,12 +185,13 @@ async def wr_sr(dut,exp_opcode:int,exp_data:int):
 
 # write data flow 
 async def fsm_spi_output(dut, data, backpressure):
+    throttle = as_throttle(backpressure)
     i = 0
     dut.in_spi_ready.value = 0
     dut.in_spi_done.value  = 0
 
     while i < len(data):
-        if backpressure and random.randint(0, 1) == 0:
+        if throttle is not None and not throttle():
             dut.in_spi_ready.value = 0
         else:
             dut.in_spi_ready.value = 1
@@ -245,12 +211,13 @@ async def fsm_spi_output(dut, data, backpressure):
     dut.in_spi_done.value  = 0
 
 async def cu_fsm_input(dut, data, backpressure):
+    throttle = as_throttle(backpressure)
     dut.in_cu_valid.value = 0
     dut.in_cu_data.value  = 0
 
     for byte in data:
         while True:
-            if backpressure and random.randint(0, 1) == 0:
+            if throttle is not None and not throttle():
                 dut.in_cu_valid.value = 0
             else:
                 dut.in_cu_valid.value = 1
@@ -266,11 +233,12 @@ async def cu_fsm_input(dut, data, backpressure):
 # read data flow
 async def fsm_cu_output(dut,data,backpressure):
     # scoreboard for data flow from fsm to cu
+    throttle = as_throttle(backpressure)
     i =  0
     dut.in_cu_ready.value = 0
     while i < len(data):
 
-        if backpressure and random.randint(0, 1) == 0:
+        if throttle is not None and not throttle():
             dut.in_cu_ready.value = 0
         else:
             dut.in_cu_ready.value = 1
@@ -290,13 +258,14 @@ async def fsm_cu_output(dut,data,backpressure):
 
 async def spi_fsm_input(dut,data,backpressure):
     # data input from cu to fsm (with back pressure)
+    throttle = as_throttle(backpressure)
     i = 0
     dut.in_spi_valid.value = 0
     dut.in_spi_data.value  = 0
     dut.in_spi_done.value  = 0
     for byte in data:
         # backpressure
-        while backpressure and random.randint(0, 1) == 0:
+        while throttle is not None and not throttle():
             dut.in_spi_valid.value = 0
             await RisingEdge(dut.clk)
 
@@ -328,12 +297,16 @@ async def header_send(dut,opcode,addr):
     await RisingEdge(dut.clk)
     dut.in_cu_valid.value = 0
 
-async def header_check(dut,opcode,addr):
-    # check header coroutine
+async def header_check(dut,opcode,addr,mode=None):
+    # check header coroutine, opcode None: address only (continuous read mode)
     dut.in_spi_ready.value = 0
     dut.in_spi_done.value  = 0
     # turn opcode and addr into a list
     header = [opcode,(addr >> 16) & 0xff, (addr>>8) & 0xff, addr & 0xff]
+    if opcode is None:
+        header = header[1:]
+    if mode is not None:
+        header.append(mode)
     i = 0
     while i < len(header):
         # always ready 
@@ -351,13 +324,35 @@ async def header_check(dut,opcode,addr):
     # done with header
     dut.in_spi_ready.value = 0    
 
+async def read_command(dut,flash,addr):
+    # wip poll, opcode + address (+ mode bits) and the dummy bytes of a read;
+    # in continuous read mode only address + mode
+    if not flash.xip:
+        await rd_sr(dut,0x05,0xff)
+        await RisingEdge(dut.clk)
+        await rd_sr(dut,0x05,0xf0)
+
+    mode = XIP_MODE if READ_MODE.quad_address else None
+    await header_check(dut,None if flash.xip else FLASH_READ,addr,mode)
+    flash.xip = READ_MODE.quad_address
+    # dummy is read
+    await RisingEdge(dut.clk)
+    assert dut.r_w.value == 1, f"r_w expect 1 got {dut.r_w.value}"
+    dut.in_spi_valid.value = 0
+    dut.in_spi_data.value = 0
+    await spi_random_cycle(dut)
+    dut.in_spi_valid.value = 1
+    await ClockCycles(dut.clk,DUMMY_BYTES)
+
+async def leave_xip(dut,flash):
+    # a write in continuous read mode starts with the mode reset
+    if flash.xip:
+        await spi_wr(dut,OPC_MODE_RESET)
+        flash.xip = False
+
 async def wait_for_done(dut, timeout_cycles=1000):
     # wait for done signal
-    for _ in range(timeout_cycles):
-        if int(dut.in_fsm_done.value):
-            return
-        await RisingEdge(dut.clk)
-    assert False, "in_fsm_done never asserted"
+    assert await wait_signal_high(dut, "in_fsm_done", timeout_cycles), "in_fsm_done never asserted"
 
 async def opcode_monitor(dut, opcode_log):
     """Runs forever, logging the first opcode byte of each SPI transaction."""
@@ -376,15 +371,67 @@ async def fsm(dut):
     
     # Set the clock period to 10 ns (100 MHz)
     cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
-    await rst(dut)
-    await write_flow(dut)
-    await read_flow(dut)
+    # python reference model checks every cycle of the scripted flows as well
+    scoreboard = TxnFsmScoreboard(dut)
+    scoreboard.start()
+    flash = FlashSide()
+    await rst(dut,flash)
+    await write_flow(dut,flash)
+    await read_flow(dut,flash)
     await invalid_opcode(dut)
-    await read_flow_bp(dut)
-    await write_flow_bp(dut)
+    await read_flow_bp(dut,flash)
+    await write_flow_bp(dut,flash)
+    dut._log.info(f"Scoreboard matched {scoreboard.checked} cycles")
     dut._log.info("FSM Pass")
 
-async def rst(dut):
+@cocotb.test(timeout_time= 20,timeout_unit='ms')
+async def fsm_random_scoreboard(dut):
+    # random CU/SPI handshakes, WIP responses and headers every cycle;
+    # no expectations are scripted, the reference model predicts every output
+    dut._log.info("FSM Random Scoreboard Start")
+    cocotb.start_soon(Clock(dut.clk, 10, "ns").start())
+    scoreboard = TxnFsmScoreboard(dut)
+    scoreboard.start()
+
+    headers = [rd_key_aes_256b, rd_text_aes_128b, rd_text_sha_256b,
+               wr_aes_generate_128b, wr_sha_generate_256b, invalid]
+    dut.rst_n.value = 0
+    await ClockCycles(dut.clk,5)
+    dut.rst_n.value = 1
+
+    clk_rise = RisingEdge(dut.clk)
+    merges = 0
+    for _ in range(RANDOM_CYCLES):
+        dut.in_spi_ready.value = random.random() < 0.5
+        dut.in_spi_done.value = random.random() < 0.25
+        dut.in_spi_valid.value = random.random() < 0.4
+        # WIP (bit 0) set on a few status reads only
+        dut.in_spi_data.value = (randomized_data() & 0xFE) | (random.random() < 0.15)
+        dut.in_cu_valid.value = random.random() < 0.3
+        dut.in_cu_data.value = random.choice(headers)() if random.random() < 0.5 else randomized_data()
+        dut.in_cu_ready.value = random.random() < 0.6
+        if WRITE_COMBINE and scoreboard.model.state == PP_HOLD and random.random() < 0.5:
+            # continue the open page program now and then, random addresses never do
+            r = scoreboard.model.r
+            dut.out_address.value = (r["addr_q"] & ~0xFF) | (r["pp_end"] & 0xFF)
+            dut.in_cu_data.value = random.choice((wr_aes_generate_128b, wr_sha_generate_256b))()
+        else:
+            dut.out_address.value = random.getrandbits(24)
+        dut.out_burst_len.value = random.getrandbits(8)
+        held = scoreboard.model.state == PP_HOLD
+        await clk_rise
+        merges += held and scoreboard.model.state == SEND_DATA
+
+    visits = {state_name(s): n for s, n in enumerate(scoreboard.visits) if n}
+    dut._log.info(f"Scoreboard matched {scoreboard.checked} cycles, states entered: {visits}")
+    assert scoreboard.visits[RECEIVE_DATA] and scoreboard.visits[SEND_DATA], \
+        "random stream never reached a read or a write"
+    if WRITE_COMBINE:
+        dut._log.info(f"{merges} WR_RES merged into an open page program")
+        assert merges, "no WR_RES continued an open page program"
+    dut._log.info("FSM Random Scoreboard Pass")
+
+async def rst(dut,flash):
     dut._log.info("Reset start")
 
 
@@ -393,7 +440,7 @@ async def rst(dut):
     dut.rst_n.value = 0
     await ClockCycles(dut.clk,5)
     dut.rst_n.value = 1
-    timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
+    timeout_check_task = cocotb.start_soon(err_watchdog(dut, "err_flag", state="state"))
     # // CU
     # output wire out_cu_ready,
     # input wire in_cu_valid,
@@ -433,6 +480,7 @@ async def rst(dut):
     dut.in_cu_data.value = 0
     # dut.out_fsm_enc_type.value = 0
     dut.out_address.value = 0   
+    dut.out_burst_len.value = 0
     dut.in_spi_done.value = 0
     dut.in_spi_ready.value = 1
     dut.in_spi_valid.value = 0   
@@ -450,6 +498,10 @@ async def rst(dut):
     assert dut.quad_enable.value == 0,f"out_spi_valid expecpted 0 got {dut.quad_enable.value}"
 
     # start up flow starts
+    # mode reset, the flash may be in continuous read mode from before
+    flash.xip = False
+    if READ_MODE.quad_address:
+        await spi_wr(dut,OPC_MODE_RESET)
     # wren 
     await spi_wr(dut,0x06)
 
@@ -499,7 +551,7 @@ async def rst(dut):
 
     dut._log.info("Reset Pass, Now in Normal Flow IDLE")    
 
-async def write_flow(dut):
+async def write_flow(dut,flash):
     # write flow without backpressure
     dut._log.info("Write Flow Start")
     async def wr_aes_no_bp():
@@ -507,9 +559,8 @@ async def write_flow(dut):
         opcode = wr_aes_generate_128b()
         addr = 0x123456
         data = [randomized_data() for _ in range(WR_AES_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
+        await leave_xip(dut,flash)
         # wip poll + wren 
         await rd_sr(dut,0x05,0xff)
         await RisingEdge(dut.clk)
@@ -532,9 +583,8 @@ async def write_flow(dut):
         opcode = wr_sha_generate_256b()
         addr = 0x123456
         data = [randomized_data() for _ in range(WR_SHA_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
+        await leave_xip(dut,flash)
         # wip poll + wren 
         await rd_sr(dut,0x05,0xff)
         await RisingEdge(dut.clk)
@@ -558,7 +608,7 @@ async def write_flow(dut):
 
     dut._log.info("Write Flow Pass")   
 
-async def read_flow(dut):
+async def read_flow(dut,flash):
     # read flow without backpressure
     dut._log.info("Read Flow Start")
     async def rd_txt_aes_no_bp():
@@ -566,25 +616,9 @@ async def read_flow(dut):
         opcode = rd_text_aes_128b()
         addr = 0xabcdef
         data = [randomized_data() for _ in range(RD_TEXT_AES_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
-        # wip poll 
-        await rd_sr(dut,0x05,0xff)
-        await RisingEdge(dut.clk)
-        await rd_sr(dut,0x05,0xf0)
-        
-        header_check_task = cocotb.start_soon(header_check(dut,FLASH_READ,addr))
-        await header_check_task
-        # dummy is read
-        # 1  dummy
-        await RisingEdge(dut.clk)
-        assert dut.r_w.value == 1, f"r_w expect 1 got {dut.r_w.value}"
-        dut.in_spi_valid.value = 0
-        dut.in_spi_data.value = 0        
-        await spi_random_cycle(dut)
-        dut.in_spi_valid.value = 1
-        await RisingEdge(dut.clk)
+        # wip poll, read header, dummy
+        await read_command(dut,flash,addr)
         # data flow
         data_check_task = cocotb.start_soon(fsm_cu_output(dut,data,0))
         await spi_fsm_input(dut,data,0)
@@ -598,25 +632,9 @@ async def read_flow(dut):
         opcode = rd_text_sha_256b()
         addr = 0xabcdef
         data = [randomized_data() for _ in range(RD_TEXT_SHA_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
-        # wip poll 
-        await rd_sr(dut,0x05,0xff)
-        await RisingEdge(dut.clk)
-        await rd_sr(dut,0x05,0xf0)
-        
-        header_check_task = cocotb.start_soon(header_check(dut,FLASH_READ,addr))
-        await header_check_task
-        # dummy is read
-        # 1  dummy
-        await RisingEdge(dut.clk)
-        assert dut.r_w.value == 1, f"r_w expect 1 got {dut.r_w.value}"
-        dut.in_spi_valid.value = 0
-        dut.in_spi_data.value = 0        
-        await spi_random_cycle(dut)
-        dut.in_spi_valid.value = 1
-        await RisingEdge(dut.clk)
+        # wip poll, read header, dummy
+        await read_command(dut,flash,addr)
         # data flow
         data_check_task = cocotb.start_soon(fsm_cu_output(dut,data,0))
         await spi_fsm_input(dut,data,0)
@@ -630,25 +648,9 @@ async def read_flow(dut):
         opcode = rd_key_aes_256b()
         addr = 0xabcdef
         data = [randomized_data() for _ in range(RD_KEY_AES_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
-        # wip poll 
-        await rd_sr(dut,0x05,0xff)
-        await RisingEdge(dut.clk)
-        await rd_sr(dut,0x05,0xf0)
-        
-        header_check_task = cocotb.start_soon(header_check(dut,FLASH_READ,addr))
-        await header_check_task
-        # dummy is read
-        # 1  dummy
-        await RisingEdge(dut.clk)
-        assert dut.r_w.value == 1, f"r_w expect 1 got {dut.r_w.value}"
-        dut.in_spi_valid.value = 0
-        dut.in_spi_data.value = 0        
-        await spi_random_cycle(dut)
-        dut.in_spi_valid.value = 1
-        await RisingEdge(dut.clk)
+        # wip poll, read header, dummy
+        await read_command(dut,flash,addr)
         # data flow
         data_check_task = cocotb.start_soon(fsm_cu_output(dut,data,0))
         await spi_fsm_input(dut,data,0)
@@ -674,7 +676,7 @@ async def invalid_opcode(dut):
         assert dut.in_start.value == 0, f"in_start expects 0 got {dut.in_start.value}"
     dut._log.info("Invalid Opcode Pass")
 
-async def read_flow_bp(dut):
+async def read_flow_bp(dut,flash):
     # read flow with backpressure
     dut._log.info("Read Flow With Back Pressure Start")
     async def rd_txt_aes_bp():
@@ -682,25 +684,9 @@ async def read_flow_bp(dut):
         opcode = rd_text_aes_128b()
         addr = 0xabcdef
         data = [randomized_data() for _ in range(RD_TEXT_AES_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
-        # wip poll 
-        await rd_sr(dut,0x05,0xff)
-        await RisingEdge(dut.clk)
-        await rd_sr(dut,0x05,0xf0)
-        
-        header_check_task = cocotb.start_soon(header_check(dut,FLASH_READ,addr))
-        await header_check_task
-        # dummy is read
-        # 1  dummy
-        await RisingEdge(dut.clk)
-        assert dut.r_w.value == 1, f"r_w expect 1 got {dut.r_w.value}"
-        dut.in_spi_valid.value = 0
-        dut.in_spi_data.value = 0        
-        await spi_random_cycle(dut)
-        dut.in_spi_valid.value = 1
-        await RisingEdge(dut.clk)
+        # wip poll, read header, dummy
+        await read_command(dut,flash,addr)
         # data flow
         data_check_task = cocotb.start_soon(fsm_cu_output(dut,data,1))
         await spi_fsm_input(dut,data,1)
@@ -714,25 +700,9 @@ async def read_flow_bp(dut):
         opcode = rd_text_sha_256b()
         addr = 0xabcdef
         data = [randomized_data() for _ in range(RD_TEXT_SHA_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
-        # wip poll 
-        await rd_sr(dut,0x05,0xff)
-        await RisingEdge(dut.clk)
-        await rd_sr(dut,0x05,0xf0)
-        
-        header_check_task = cocotb.start_soon(header_check(dut,FLASH_READ,addr))
-        await header_check_task
-        # dummy is read
-        # 1  dummy
-        await RisingEdge(dut.clk)
-        assert dut.r_w.value == 1, f"r_w expect 1 got {dut.r_w.value}"
-        dut.in_spi_valid.value = 0
-        dut.in_spi_data.value = 0        
-        await spi_random_cycle(dut)
-        dut.in_spi_valid.value = 1
-        await RisingEdge(dut.clk)
+        # wip poll, read header, dummy
+        await read_command(dut,flash,addr)
         # data flow
         data_check_task = cocotb.start_soon(fsm_cu_output(dut,data,1))
         await spi_fsm_input(dut,data,1)
@@ -746,25 +716,9 @@ async def read_flow_bp(dut):
         opcode = rd_key_aes_256b()
         addr = 0xabcdef
         data = [randomized_data() for _ in range(RD_KEY_AES_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
-        # wip poll 
-        await rd_sr(dut,0x05,0xff)
-        await RisingEdge(dut.clk)
-        await rd_sr(dut,0x05,0xf0)
-        
-        header_check_task = cocotb.start_soon(header_check(dut,FLASH_READ,addr))
-        await header_check_task
-        # dummy is read
-        # 1  dummy
-        await RisingEdge(dut.clk)
-        assert dut.r_w.value == 1, f"r_w expect 1 got {dut.r_w.value}"
-        dut.in_spi_valid.value = 0
-        dut.in_spi_data.value = 0        
-        await spi_random_cycle(dut)
-        dut.in_spi_valid.value = 1
-        await RisingEdge(dut.clk)
+        # wip poll, read header, dummy
+        await read_command(dut,flash,addr)
         # data flow
         data_check_task = cocotb.start_soon(fsm_cu_output(dut,data,1))
         await spi_fsm_input(dut,data,1)
@@ -778,7 +732,7 @@ async def read_flow_bp(dut):
     await rd_key_aes_bp()
     dut._log.info("Read Flow With Back Pressure Pass")
 
-async def write_flow_bp(dut):
+async def write_flow_bp(dut,flash):
     # write flow with backpressure
     dut._log.info("Write Flow With Back Pressure Start")
     async def wr_aes_bp():
@@ -786,9 +740,8 @@ async def write_flow_bp(dut):
         opcode = wr_aes_generate_128b()
         addr = 0x123456
         data = [randomized_data() for _ in range(WR_AES_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
+        await leave_xip(dut,flash)
         # wip poll + wren 
         await rd_sr(dut,0x05,0xff)
         await RisingEdge(dut.clk)
@@ -811,9 +764,8 @@ async def write_flow_bp(dut):
         opcode = wr_sha_generate_256b()
         addr = 0x123456
         data = [randomized_data() for _ in range(WR_SHA_BYTES)]
-        # timeout coroutine
-        timeout_check_task = cocotb.start_soon(timeout_monitor(dut))
         await header_send(dut,opcode,addr)
+        await leave_xip(dut,flash)
         # wip poll + wren 
         await rd_sr(dut,0x05,0xff)
         await RisingEdge(dut.clk)
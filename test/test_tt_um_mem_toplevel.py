@@ -5,6 +5,8 @@ import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles
 
+from trace_control import start_trace
+
 
 @cocotb.test()
 async def test_project(dut):
@@ -13,6 +15,7 @@ async def test_project(dut):
     # Set the clock period to 10 us (100 KHz)
     clock = Clock(dut.clk, 10, units="us")
     cocotb.start_soon(clock.start())
+    start_trace(dut)
 
     # Reset
     dut._log.info("Reset")
@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Named flash timing profiles.
+#
+# A profile fixes both sides of every WIP wait: the mem_txn_fsm poll intervals (chosen at
+# build time by a define) and the busy times of the python flash model (read from
+# $TIMING_PROFILE at run time). runner.py --timing and make TIMING= set both.
+#
+#   zero-latency   no power on wait, WIP never set, polls back to back: functional runs
+#   fast           the SIMULATION constants (default), short waits but every poll path taken
+#   datasheet-typ  synthesis poll intervals, W25Q128JV typical tPP / tW / tRST
+#   datasheet-max  synthesis poll intervals, datasheet maximums: the FSM poll timeouts
+#                  (pp_max, wrsr_max, rst_t_max) are checked against the real worst case
+#
+# The datasheet profiles poll every 1000 clocks after a reset, not the synthesis 100:
+# rst_t_max (3) polls of 100 clocks give up before tRST (30 us) ends.
+#
+# Chip erase only runs in the startup sequence and takes 40 s typical, it keeps the fast
+# timing in every profile. The vendor verilog flash model has its own fixed timings.
+
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class TimingProfile:
+    # verilog define selecting the mem_txn_fsm constants, None for the SIMULATION ones
+    define: str
+    # TxnFsmModel arguments, the mem_txn_fsm localparams in clocks
+    fsm: dict
+    # W25Q128Model arguments, WIP busy times in ns
+    flash: dict
+
+
+_FAST_FSM = dict(power_on=200, page_program=400, write_sr=1000, chip_erase_t=2000, rst_t=100)
+_DATASHEET_FSM = dict(power_on=2_000_000, page_program=40_000, write_sr=1_000_000,
+                      chip_erase_t=2000, rst_t=1000)
+_FAST_ERASE_NS = 50_000
+
+PROFILES = {
+    "zero-latency": TimingProfile(
+        "TIMING_ZERO_LATENCY",
+        dict(power_on=0, page_program=0, write_sr=0, chip_erase_t=0, rst_t=0),
+        dict(t_reset_ns=0, t_page_program_ns=0, t_write_sr_ns=0, t_chip_erase_ns=0)),
+    "fast": TimingProfile(
+        None, _FAST_FSM,
+        dict(t_reset_ns=1_000, t_page_program_ns=10_000, t_write_sr_ns=1_000,
+             t_chip_erase_ns=_FAST_ERASE_NS)),
+    "datasheet-typ": TimingProfile(
+        "TIMING_DATASHEET", _DATASHEET_FSM,
+        dict(t_reset_ns=30_000, t_page_program_ns=400_000, t_write_sr_ns=10_000_000,
+             t_chip_erase_ns=_FAST_ERASE_NS)),
+    "datasheet-max": TimingProfile(
+        "TIMING_DATASHEET", _DATASHEET_FSM,
+        dict(t_reset_ns=30_000, t_page_program_ns=3_000_000, t_write_sr_ns=15_000_000,
+             t_chip_erase_ns=_FAST_ERASE_NS)),
+}
+
+DEFAULT_PROFILE = "fast"
+
+
+def profile_name():
+    name = os.environ.get("TIMING_PROFILE") or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"unknown TIMING_PROFILE {name!r}, expected one of {', '.join(PROFILES)}")
+    return name
+
+
+def current_profile():
+    """Profile selected by $TIMING_PROFILE (default fast)."""
+    return PROFILES[profile_name()]
@@ -0,0 +1,45 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Runtime waveform control for trace builds.
+#
+# Waves are off by default. A trace build (make TRACE=fst|vcd, runner.py --trace fst|vcd)
+# compiles the `ifdef TRACE block of mem_vendor_test / tb: the dump file is opened and
+# $dumpvars runs on the first rise of trace_en, so nothing is written before python asks.
+# (verilator ignores $dumpoff/$dumpon and the $dumpvars scope; the scope filter is a
+# tracing_off/tracing_on control file generated from TRACE_SCOPE at build time.)
+#
+# start_trace() raises trace_en:
+#   TRACE_START_NS unset   dump the whole run
+#   TRACE_START_NS=t       dump only from absolute sim time t on; runner.py --trace-window N
+#                          replays a failing run with t = failure time - N clocks, so the
+#                          waveform holds just the last N cycles before the failure
+#
+# Untraced builds have no trace_en and start_trace() is a no-op.
+
+import os
+
+import cocotb
+from cocotb.triggers import Timer
+from cocotb.simtime import get_sim_time
+
+from common import resolve_path
+
+
+def start_trace(dut, enable="trace_en"):
+    """Start dumping now, or at TRACE_START_NS. Returns the pending task, if any."""
+    trace_en = resolve_path(dut, enable)
+    if trace_en is None:
+        return None
+    start = int(float(os.environ.get("TRACE_START_NS", "0")))
+    now = get_sim_time(unit="ns")
+    if start <= now:
+        trace_en.value = 1
+        return None
+    return cocotb.start_soon(_trace_from(trace_en, round(start - now)))
+
+
+async def _trace_from(trace_en, delay_ns):
+    await Timer(delay_ns, unit="ns")
+    trace_en.value = 1
+
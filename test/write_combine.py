@@ -0,0 +1,27 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Write combining of mem_txn_fsm.
+#
+# Chosen at build time by a define, the tests read $WRITE_COMBINE to know what to expect on
+# the QSPI pins. runner.py --write-combine and make WC=yes set both.
+#
+#   off  (default) every WR_RES is its own 0x32 page program, CS goes high after its data.
+#   on   the page program stays open (CS low, SCLK stopped) for WC_HOLD clocks after its
+#        last byte. A WR_RES that continues it (next address, same 256B page) streams its
+#        data into the same frame. Any other command or the timeout raises CS, the flash
+#        then programs everything sent under that CS at once.
+
+import os
+
+DEFINE = "WRITE_COMBINE"
+
+# clocks an open page program waits for the next WR_RES (wc_hold in mem_txn_fsm.v)
+WC_HOLD = 64
+
+PAGE_BYTES = 256
+
+
+def write_combine_enabled():
+    """Write combining selected by $WRITE_COMBINE (default off)."""
+    return os.environ.get("WRITE_COMBINE", "").lower() not in ("", "0", "no", "off")